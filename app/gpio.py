@@ -0,0 +1,77 @@
+"""GPIO input pipeline for the jukebox interface.
+
+pigpio calls its callbacks on its own thread, where it isn't safe to touch Qt widgets. Button presses are
+instead pushed onto a queue and handled on the GUI thread: a queued signal wakes the GUI thread, which drains
+the queue, drops presses that are too close together (switch bounce the glitch filter let through, or
+mashing), and passes the rest on.
+
+Each press is traced (see src/tracing.py) from pigpio's callback onwards, if a tracer is given.
+"""
+import queue
+import threading
+from collections.abc import Callable
+from PySide6 import QtCore
+from src.tracing import Tracer
+
+# pigpio ticks are microseconds, wrapping around at 2^32
+TICK_WRAP = 1 << 32
+
+class GpioEvents(QtCore.QObject):
+    """Marshals GPIO presses from pigpio's callback thread onto the GUI thread.
+    """
+    wake = QtCore.Signal()
+
+    def __init__(self, handler : Callable, debounce : int = 50000, tracer : Tracer = None):
+        """Must be created on the GUI thread.
+
+        :param handler: called on the GUI thread with the GPIO pin and trace (None if not tracing) of each accepted press
+        :type handler: Callable
+        :param debounce: minimum time (in µs) between accepted presses of the same pin, defaults to 50000
+        :type debounce: int, optional
+        :param tracer: tracer to trace each press with, defaults to None (not traced)
+        :type tracer: Tracer, optional
+        """
+        super().__init__()
+        self.handler = handler
+        self.debounce = debounce
+        self.tracer = tracer
+        self.events = queue.SimpleQueue()
+        self.scheduled = threading.Event()
+        self.last_press = {}
+        self.wake.connect(self.drain, QtCore.Qt.ConnectionType.QueuedConnection)
+
+    def callback(self, gpio : int, _level : int, tick : int):
+        """Records a press. Runs on pigpio's callback thread, so only touches the queue.
+
+        :param gpio: GPIO pin that changed
+        :type gpio: int
+        :param _level: new level of the pin
+        :type _level: int
+        :param tick: time of the change (in µs since boot)
+        :type tick: int
+        """
+        trace = self.tracer.start("press", "gpio callback") if self.tracer else None
+        self.events.put((gpio, tick, trace))
+        # Several presses arriving before the GUI thread wakes up are handled by a single drain
+        if not self.scheduled.is_set():
+            self.scheduled.set()
+            self.wake.emit()
+
+    def drain(self):
+        """Handles every queued press, in order, on the GUI thread.
+        """
+        self.scheduled.clear()
+        while True:
+            try:
+                gpio, tick, trace = self.events.get_nowait()
+            except queue.Empty:
+                return
+            if trace:
+                trace.mark("gui thread")
+            last = self.last_press.get(gpio)
+            if last is not None and (tick - last) % TICK_WRAP < self.debounce:
+                if trace:
+                    trace.finish("debounced")
+                continue
+            self.last_press[gpio] = tick
+            self.handler(gpio, trace)
@@ -0,0 +1,303 @@
+"""Marquee (scrolling text) animation for the jukebox interface.
+
+Every song title too long for its label is scrolled by a single shared timer, rather than each label
+creating a new timer for every step. Each title waits at the start, scrolls to the end at a constant speed,
+waits at the end, then jumps back to the start and repeats.
+
+Titles are rendered to a pixmap once, and scrolling just copies a different part of it to the screen, rather
+than laying out and rasterising the text again on every step.
+"""
+import threading
+from collections import OrderedDict
+from PySide6 import QtCore, QtGui, QtWidgets
+
+# Maximum number of rendered titles to keep (a page shows up to 24)
+PIXMAP_CACHE_SIZE = 64
+
+# Phases of a marquee
+WAIT_START = 0
+SCROLL = 1
+WAIT_END = 2
+
+class MarqueeState:
+    """Animation state of a single marquee.
+    """
+    __slots__ = ("target", "phase", "elapsed", "position")
+
+    def __init__(self, target):
+        """
+        :param target: what is being scrolled (e.g a label's QScrollBar), needing maximum() and setValue(int)
+        """
+        self.target = target
+        self.phase = WAIT_START
+        self.elapsed = 0
+        self.position = 0
+
+class MarqueeClock(QtCore.QObject):
+    """Single timer driving every marquee on screen.
+    """
+    def __init__(self, fps : int = 2, speed : float = 40, pause : int = 3000, parent : QtCore.QObject = None):
+        """
+        :param fps: frames per second to animate at, defaults to 2
+        :type fps: int, optional
+        :param speed: scrolling speed (in px/s), defaults to 40
+        :type speed: float, optional
+        :param pause: time (in ms) to wait at either end of the text, defaults to 3000
+        :type pause: int, optional
+        :param parent: parent QObject, defaults to None
+        :type parent: QtCore.QObject, optional
+        """
+        super().__init__(parent)
+        self.speed = speed
+        self.pause_time = pause
+        self.marquees = []
+        self.paused = False
+        self.timer = QtCore.QTimer(self)
+        self.timer.setTimerType(QtCore.Qt.TimerType.CoarseTimer)
+        self.timer.setInterval(round(1000/fps))
+        self.timer.timeout.connect(self.tick)
+        self.clock = QtCore.QElapsedTimer()
+
+    def add(self, target):
+        """Starts scrolling something, beginning with the wait at the start.
+
+        :param target: what to scroll (e.g a label's QScrollBar), needing maximum() and setValue(int)
+        """
+        target.setValue(0)
+        self.marquees.append(MarqueeState(target))
+        self.update_timer()
+
+    def clear(self):
+        """Stops scrolling everything (e.g when the page changes).
+        """
+        self.marquees.clear()
+        self.update_timer()
+
+    def pause(self):
+        """Freezes every marquee where it is (e.g when the screen is off).
+        """
+        self.paused = True
+        self.update_timer()
+
+    def resume(self):
+        """Carries on scrolling after pause.
+        """
+        self.paused = False
+        self.update_timer()
+
+    def update_timer(self):
+        """Only runs the timer while there is something to animate.
+        """
+        if self.marquees and not self.paused:
+            if not self.timer.isActive():
+                self.clock.start()
+                self.timer.start()
+        else:
+            self.timer.stop()
+
+    def tick(self):
+        """Advances every marquee by the time since the last frame.
+        """
+        # Measuring the real time passed keeps the speed constant even if frames are late
+        dt = self.clock.restart()
+        for marquee in self.marquees:
+            self.advance(marquee, dt)
+
+    def advance(self, marquee : MarqueeState, dt : int):
+        """Advances a single marquee.
+
+        :param marquee: state of the marquee
+        :type marquee: MarqueeState
+        :param dt: time passed (in ms)
+        :type dt: int
+        """
+        if marquee.phase == SCROLL:
+            maximum = marquee.target.maximum()
+            marquee.position = min(marquee.position + self.speed*dt/1000, maximum)
+            marquee.target.setValue(round(marquee.position))
+            if marquee.position >= maximum:
+                marquee.phase = WAIT_END
+                marquee.elapsed = 0
+            return
+        marquee.elapsed += dt
+        if marquee.elapsed < self.pause_time:
+            return
+        marquee.elapsed = 0
+        if marquee.phase == WAIT_START:
+            marquee.phase = SCROLL
+        else:
+            marquee.phase = WAIT_START
+            marquee.position = 0
+            marquee.target.setValue(0)
+
+class PixmapCache:
+    """Least recently used cache of rendered text.
+    """
+    def __init__(self, max_size : int = PIXMAP_CACHE_SIZE):
+        """
+        :param max_size: maximum number of pixmaps to keep, defaults to PIXMAP_CACHE_SIZE
+        :type max_size: int, optional
+        """
+        self.max_size = max_size
+        self.pixmaps = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, text : str, font : QtGui.QFont, height : int, foreground : QtGui.QColor, background : QtGui.QColor, ratio : float = 1) -> QtGui.QPixmap:
+        """Gets text rendered on a single line, rendering it if it isn't cached.
+
+        :param text: text to render
+        :type text: str
+        :param font: font to render it in
+        :type font: QtGui.QFont
+        :param height: height of the pixmap (in px), with the text centred vertically
+        :type height: int
+        :param foreground: colour of the text
+        :type foreground: QtGui.QColor
+        :param background: colour behind the text
+        :type background: QtGui.QColor
+        :param ratio: device pixel ratio of the screen, defaults to 1
+        :type ratio: float, optional
+        :return: the rendered text, as wide as the text
+        :rtype: QtGui.QPixmap
+        """
+        key = (text, font.key(), height, foreground.rgba(), background.rgba(), ratio)
+        with self.lock:
+            pixmap = self.pixmaps.get(key)
+            if pixmap is not None:
+                self.pixmaps.move_to_end(key)
+                return pixmap
+        pixmap = render_text(text, font, height, foreground, background, ratio)
+        with self.lock:
+            self.pixmaps[key] = pixmap
+            while len(self.pixmaps) > self.max_size:
+                self.pixmaps.popitem(last=False)
+        return pixmap
+
+    def clear(self):
+        """Forgets every rendered title.
+        """
+        with self.lock:
+            self.pixmaps.clear()
+
+def render_text(text : str, font : QtGui.QFont, height : int, foreground : QtGui.QColor, background : QtGui.QColor, ratio : float = 1) -> QtGui.QPixmap:
+    """Renders text on a single line.
+
+    :param text: text to render
+    :type text: str
+    :param font: font to render it in
+    :type font: QtGui.QFont
+    :param height: height of the pixmap (in px), with the text centred vertically
+    :type height: int
+    :param foreground: colour of the text
+    :type foreground: QtGui.QColor
+    :param background: colour behind the text
+    :type background: QtGui.QColor
+    :param ratio: device pixel ratio of the screen, defaults to 1
+    :type ratio: float, optional
+    :return: the rendered text, as wide as the text
+    :rtype: QtGui.QPixmap
+    """
+    width = max(QtGui.QFontMetrics(font).size(0, text).width(), 1)
+    pixmap = QtGui.QPixmap(round(width*ratio), round(height*ratio))
+    pixmap.setDevicePixelRatio(ratio)
+    pixmap.fill(background)
+    painter = QtGui.QPainter(pixmap)
+    painter.setFont(font)
+    painter.setPen(foreground)
+    painter.drawText(QtCore.QRect(0, 0, width, height), QtCore.Qt.AlignmentFlag.AlignLeft | QtCore.Qt.AlignmentFlag.AlignVCenter, text)
+    painter.end()
+    return pixmap
+
+# Shared by every marquee label, so titles seen on other pages are already rendered
+pixmap_cache = PixmapCache()
+
+class MarqueeLabel(QtWidgets.QWidget):
+    """Single line of text that can be scrolled horizontally, drawn from a pre-rendered pixmap.
+
+    Can be driven by a MarqueeClock, like a QScrollBar.
+    """
+    def __init__(self, font : QtGui.QFont, foreground : QtGui.QColor, background : QtGui.QColor, parent : QtWidgets.QWidget = None, cache : PixmapCache = None):
+        """
+        :param font: font of the text
+        :type font: QtGui.QFont
+        :param foreground: colour of the text
+        :type foreground: QtGui.QColor
+        :param background: colour behind the text
+        :type background: QtGui.QColor
+        :param parent: parent widget, defaults to None
+        :type parent: QtWidgets.QWidget, optional
+        :param cache: where rendered text is kept, defaults to None (the shared pixmap_cache)
+        :type cache: PixmapCache, optional
+        """
+        super().__init__(parent)
+        self.setFont(font)
+        self.foreground = foreground
+        self.background = background
+        self.cache = cache or pixmap_cache
+        self.label_text = ""
+        self.pixmap = None
+        self.offset = 0
+        # Every pixel is painted, so Qt doesn't need to clear the background first
+        self.setAttribute(QtCore.Qt.WidgetAttribute.WA_OpaquePaintEvent)
+
+    def text(self) -> str:
+        """
+        :return: the text being shown
+        :rtype: str
+        """
+        return self.label_text
+
+    def setText(self, text : str):
+        """Shows text, from its start.
+
+        :param text: text to show
+        :type text: str
+        """
+        self.label_text = text
+        self.offset = 0
+        self.render_text()
+
+    def render_text(self):
+        """Gets the pixmap of the text, at the label's current height.
+        """
+        self.pixmap = self.cache.get(self.label_text, self.font(), self.height(), self.foreground, self.background, self.devicePixelRatioF()) if self.label_text else None
+        self.update()
+
+    def maximum(self) -> int:
+        """
+        :return: how far the text can be scrolled (in px), 0 if it fits
+        :rtype: int
+        """
+        if self.pixmap is None:
+            return 0
+        return max(round(self.pixmap.width()/self.pixmap.devicePixelRatio()) - self.width(), 0)
+
+    def setValue(self, value : int):
+        """Scrolls the text.
+
+        :param value: how far to scroll (in px)
+        :type value: int
+        """
+        if value != self.offset:
+            self.offset = value
+            self.update()
+
+    def resizeEvent(self, event : QtGui.QResizeEvent):
+        """Renders the text again at the new height.
+        """
+        super().resizeEvent(event)
+        if event.size().height() != event.oldSize().height():
+            self.render_text()
+
+    def paintEvent(self, _event : QtGui.QPaintEvent):
+        """Copies the visible part of the rendered text to the screen.
+        """
+        painter = QtGui.QPainter(self)
+        text_end = 0
+        if self.pixmap is not None:
+            painter.drawPixmap(-self.offset, 0, self.pixmap)
+            text_end = round(self.pixmap.width()/self.pixmap.devicePixelRatio()) - self.offset
+        # Only the space after the text needs filling in
+        if text_end < self.width():
+            painter.fillRect(max(text_end, 0), 0, self.width() - max(text_end, 0), self.height(), self.background)
+        painter.end()
@@ -3,18 +3,30 @@
 Displays a rough interface in a picture of the jukebox frontage. Includes clickable buttons and scrolling
 song names.
 """
-from math import ceil
-from requests.exceptions import ReadTimeout
 import subprocess
 from functools import partial
 from collections.abc import Callable
 import sys
-import pigpio
-from PySide6 import QtWidgets, QtCore
 sys.path.append("../")  # Allows for below imports
-from app.app_ui import Ui_MainWindow
-from src.jukebox import Page
-from src.utils import request, PLAYLIST_ID, SONGS_PER_PAGE
+from src.boot import get_timeline
+timeline = get_timeline()  # Created first, so the imports below are timed
+with timeline.phase("import pigpio"):
+    import pigpio
+with timeline.phase("import PySide6"):
+    from PySide6 import QtWidgets, QtCore
+with timeline.phase("import jukebox"):
+    from app.app_ui import Ui_MainWindow
+    from app.gpio import GpioEvents
+    from app.marquee import MarqueeClock
+    from app.slots import find_slots
+    from app.workers import run_in_background
+    from src.context import get_context
+    from src.jukebox import Page
+    from src.playlist import get_playlist
+    from src.retry import RetryPolicy, backoff
+    from src.tracing import get_tracer, run_traced, Trace
+    from src import utils
+    from src.utils import request, api_url
 
 BUTTONS = {
     19: 1,
@@ -31,189 +43,323 @@ BUTTONS = {
     25: "forward"
 }
 
+# Minimum time (in µs) between presses of the same button, on top of the glitch filter
+DEBOUNCE_TIME = 50000
+
+# Creating pages is retried a few times in the background, then (if there are no pages to show) again and again
+# after a growing delay, until the network comes back
+PAGES_RETRY = RetryPolicy(max_attempts=3, deadline=15, base_delay=1)
+PAGES_BASE_DELAY = 5
+PAGES_MAX_DELAY = 60
+# Time (in ms) to wait before trying to show a page again after a failure
+RETRY_INTERVAL = 5000
+# Time (in ms) a page can take to load before the loading state is shown
+LOADING_DELAY = 150
+# Secret code that writes the traces of recent button presses to tracing.TRACE_FILE
+DUMP_TRACES_CODE = 98
+
 class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
     """Main GUI window.
     """
     def __init__(self):
         super().__init__()
-        self.setupUi(self)  # Creates ui based on app_ui.py
+        with timeline.phase("setupUi"):
+            self.setupUi(self)  # Creates ui based on app_ui.py
         self.chosen_num = ""
         self.button_list = self.buttons.findChildren(QtWidgets.QPushButton)
-        self.song_labels = self.findChildren(QtWidgets.QLabel, QtCore.QRegularExpression("^song"))
-        self.timers = QtCore.QObject()
+        self.gpio_buttons = {pin: self.buttons.findChild(QtWidgets.QPushButton, f"button{name}") for pin, name in BUTTONS.items()}
+        self.gpio_events = GpioEvents(self.gpio_press, DEBOUNCE_TIME, get_tracer())
+        self.press_trace = None  # Trace of the GPIO press being handled by button_click
+        self.page_trace = None  # Trace of the press that changed page, finished once the page is shown
+        self.slots = find_slots(self)
+        with timeline.phase("config"):
+            utils.get_config()
+        self.marquee = MarqueeClock(utils.MARQUEE_FPS, parent=self)
         self.playing = False
         self.off = False
-        self.create_pages()
+        self.pages = []
+        self.pending_page = None
         self.active_page = 0
-        self.pages[self.active_page].refresh()
-        self.page_load()
-        self.chosen_num = ""
+        self.recreating_pages = False  # Set while the pages are re-created after going off either end
+        self.failed_creates = 0
+        get_context().start()  # Reads the credentials and finds the device in the background, ready for the first song
+        self.create_pages()  # Loads in the background, showing the first page once done
         # Connect buttons to button_click function
         for button in self.button_list:
             button.clicked.connect(partial(self.button_click, button))
 
     def create_pages(self):
-        """Create pages of songs.
+        """Create pages of songs in the background, then show the active page.
         """
-        try:    
-            num_songs = request("GET", f"https://api.spotify.com/v1/playlists/{PLAYLIST_ID}")["tracks"]["total"]
-        except ReadTimeout:
-            create_pages()
-        num_pages = ceil(num_songs/SONGS_PER_PAGE)
-        self.pages = [Page(PLAYLIST_ID, i) for i in range(num_pages)]
-    
-    def page_load(self):
-        """Loads and displays the currently-selected page.
-        """
-        self.text_reset()
-        self.chosen_num = ""
-        song_titles = [song.title for song in self.pages[self.active_page].tracks]
-        for i,title in enumerate(song_titles):
-            # Change the text of each label to the appropriate song title
-            label = self.findChild(QtWidgets.QLabel, name=f"song{i}")
-            label.setText(title + " ")
-            label.adjustSize()  # Needed for the scrollbar to work properly
-            # Set up the label's scrollbar
-            scrollbar = label.parentWidget().parentWidget().parentWidget().horizontalScrollBar()
-            scrollbar.hide()
-            scrollbar_width = label.width()-label.parentWidget().parentWidget().parentWidget().width()
-            if scrollbar_width > 0:
-                scrollbar.setMaximum(scrollbar_width)  # Set maximum value (for some reason it doesn't automatically set it properly)
-                self.stop_text_scroll(scrollbar)
+        if not self.pages:
+            self.show_loading()
+        timeline.begin("create_pages")
+        run_in_background(PAGES_RETRY.call, self.fetch_pages, on_finished=self.pages_created, on_failed=self.pages_failed)
 
-    def text_reset(self):
-        """Clears all song titles from the screen.
+    def fetch_pages(self) -> list:
+        """Create pages of songs from the snapshot of the playlist (runs on a worker thread).
+
+        Checks the snapshot is up to date first, unless that is already being done in the background. On boot,
+        the cached snapshot is used straight away (and checked in the background) if there is one. Otherwise
+        only the number of tracks is fetched before showing the first page, with the rest downloaded in the background.
+
+        :return: the pages
+        :rtype: list
         """
-        for label in self.song_labels:
-            label.setText("")
+        playlist = get_playlist(utils.PLAYLIST_ID, load=False)
+        if not playlist.loaded and playlist.load_cached():
+            playlist.refresh_in_background()
+        elif not playlist.loaded:
+            playlist.fetch_total()
+            playlist.refresh_in_background()
+        elif not playlist.watching.is_set():
+            playlist.refresh()
+        if utils.PLAYLIST_CHECK_INTERVAL:
+            playlist.watch(utils.PLAYLIST_CHECK_INTERVAL)
+        num_pages = playlist.num_pages(utils.SONGS_PER_PAGE)
+        return [Page(utils.PLAYLIST_ID, i) for i in range(num_pages)]
 
-    def create_oneshot_timer(self, time : int):
-        """Creates a oneshot timer, links it to a callable and adds it to the list of timers.
+    def pages_created(self, pages : list):
+        """Switches to newly-created pages and shows the active page.
 
-        :param time: how long the timer should last
-        :type time: int
-        :param bind: function to call when the timer is done
-        :type bind: Callable
+        :param pages: the new pages
+        :type pages: list
         """
-        timer = QtCore.QTimer(self.timers)
-        timer.setInterval(time)
-        timer.setSingleShot(True)
-        return timer
+        timeline.end("create_pages")
+        # Going off the start wrapped around to the last of the old pages, so go to the last of the new ones
+        wrapped_to_last = self.recreating_pages and self.active_page > 0
+        self.pages = pages
+        self.recreating_pages = False
+        self.failed_creates = 0
+        if wrapped_to_last or self.active_page >= len(self.pages):
+            self.active_page = max(len(self.pages)-1, 0)
+        self.show_page()
 
-    def start_text_scroll(self, scrollbar : QtWidgets.QScrollBar, old_timer : QtCore.QTimer = None):
-        """Starts scrolling the songnames of the labels.
+    def pages_failed(self, error : Exception):
+        """Carries on with the old pages if creating new ones failed (e.g no network), or tries again later if there are none.
 
-        :param scrollbar: scrollbar attached to the label
-        :type scrollbar: QtWidgets.QScrollBar
+        :param error: what went wrong
+        :type error: Exception
         """
-        if old_timer:
-            old_timer.setParent(None)
-            old_timer.deleteLater()
-        scrollbar.setValue(scrollbar.value() + 20)
-        if scrollbar.value() < scrollbar.maximum():
-            timer = self.create_oneshot_timer(500)
-            timer.timeout.connect(partial(self.start_text_scroll, scrollbar, timer))
+        print(str(error))
+        if self.pages:
+            self.pages_created(self.pages)
         else:
-            timer = self.create_oneshot_timer(3000)
-            timer.timeout.connect(partial(self.stop_text_scroll, scrollbar, timer))
-        timer.start()
+            self.failed_creates += 1
+            QtCore.QTimer.singleShot(round(backoff(self.failed_creates - 1, PAGES_BASE_DELAY, PAGES_MAX_DELAY)*1000), self.create_pages)
+
+    def show_page(self):
+        """Refreshes the active page in the background, then displays it.
+        """
+        if not self.pages:
+            return
+        page = self.pages[self.active_page]
+        self.pending_page = page
+        # Only show the loading state if the page takes long enough to notice (it's usually already in memory)
+        QtCore.QTimer.singleShot(LOADING_DELAY, partial(self.show_loading, page))
+        run_in_background(self.fetch_page, page, on_finished=self.page_fetched, on_failed=partial(self.page_failed, page))
+
+    def fetch_page(self, page : Page) -> Page:
+        """Refreshes a page (runs on a worker thread).
+
+        :param page: the page to refresh
+        :type page: Page
+        :return: the refreshed page
+        :rtype: Page
+        """
+        with timeline.phase("first Page.refresh"):
+            page.refresh()
+        return page
+
+    def page_fetched(self, page : Page):
+        """Displays a refreshed page, unless the user has moved onto another page in the meantime.
+
+        :param page: the refreshed page
+        :type page: Page
+        """
+        if 0 <= self.active_page < len(self.pages) and page is self.pages[self.active_page]:
+            self.pending_page = None
+            self.page_load()
+
+    def page_failed(self, page : Page, error : Exception):
+        """Tries showing a page again later if it couldn't be fetched (after retrying, see jukebox.PAGE_RETRY).
+
+        :param page: the page that couldn't be fetched
+        :type page: Page
+        :param error: what went wrong
+        :type error: Exception
+        """
+        print(str(error))
+        if page is self.pending_page:
+            QtCore.QTimer.singleShot(RETRY_INTERVAL, partial(self.retry_page, page))
+
+    def retry_page(self, page : Page):
+        """Shows the active page again, unless the user has moved onto another page in the meantime.
 
-    def stop_text_scroll(self, scrollbar : QtWidgets.QScrollBar, old_timer : QtCore.QTimer = None):
-        """Resets label scrolling before beginning scroll again after 3 seconds.
+        :param page: the page that couldn't be fetched
+        :type page: Page
+        """
+        if page is self.pending_page:
+            self.show_page()
+
+    def show_loading(self, page : Page = None):
+        """Shows that songs are being loaded.
 
-        :param scrollbar: scrollbar attached to the label
-        :type scrollbar: QtWidgets.QScrollBar
+        :param page: only show the loading state if this page is still being loaded, defaults to None (always show it)
+        :type page: Page, optional
+        """
+        if page is not None and page is not self.pending_page:
+            return
+        self.marquee.clear()
+        self.text_reset()
+        self.slots[0].label.setText("Loading...")
+
+    def page_load(self):
+        """Loads and displays the currently-selected page. The first time, this completes boot (see boot.BootTimeline.finish).
         """
-        if old_timer:
-            old_timer.setParent(None)
-            old_timer.deleteLater()
-        scrollbar.setValue(0)
-        timer = self.create_oneshot_timer(3000)
-        timer.timeout.connect(partial(self.start_text_scroll, scrollbar, timer))
-        timer.start()
+        with timeline.phase("first page_load"):
+            self.marquee.clear()
+            self.text_reset()
+            self.chosen_num = ""
+            for slot, song in zip(self.slots, self.pages[self.active_page].tracks):
+                # Change the text of each label to the appropriate song title, scrolling it if it doesn't fit
+                if slot.set_text(song.title + " "):
+                    self.marquee.add(slot.label)
+        timeline.finish()
+        if self.page_trace:
+            self.page_trace.finish("page shown")
+            self.page_trace = None
+
+    def text_reset(self):
+        """Clears all song titles from the screen.
+        """
+        for slot in self.slots:
+            slot.clear()
 
     # Clicked Buttons
     def button_click(self, button : QtWidgets.QPushButton):
         """Handles button push event on main interface.
 
+        Each press is traced (see src/tracing.py) until it has been dealt with, e.g until the song picked is playing.
+
         :param button: button that has been pushed
         :type button: QtWidgets.QPushButton
         """
+        trace = self.press_trace
+        if trace:
+            trace.mark("button_click")
+        else:
+            trace = get_tracer().start("click", "button_click")
         if self.off:
             subprocess.call(['sh', '../../screen_on.sh'])
             self.off = False
+            self.marquee.resume()
+            trace.finish("screen on")
             return
         # Case where numbered button is pressed
         if button.text():
             self.chosen_num += button.text()
             if len(self.chosen_num)==2:
+                trace.mark("number entered")
                 chosen_track = int(self.chosen_num)
+                self.chosen_num = ""
                 # Reset buttons without doing anything if invalid number inputted
                 if chosen_track==69:
+                    trace.finish("close")
                     self.close()
                 elif chosen_track==99:
                     subprocess.call(['sh', '../../screen_off.sh'])
                     self.off = True
+                    self.marquee.pause()  # Nothing to see, so no point animating
+                    trace.finish("screen off")
+                elif chosen_track==DUMP_TRACES_CODE:
+                    trace.finish("dump traces")
+                    try:
+                        print(f"Wrote {get_tracer().dump()} traces.")
+                    except OSError as e:
+                        print(str(e))
                 # Pause/play if 00 entered
                 elif chosen_track==0:
                     if self.playing:
-                        request("PUT", "https://api.spotify.com/v1/me/player/pause")
+                        run_in_background(run_traced, trace, "paused", request, "PUT", api_url("/me/player/pause"))
                         self.playing = False
                     else:
-                        request("PUT", "https://api.spotify.com/v1/me/player/play")
+                        run_in_background(run_traced, trace, "resumed", request, "PUT", api_url("/me/player/play"))
                         self.playing = True
-                elif chosen_track >= len(self.pages[self.active_page].tracks):
-                    pass
+                elif self.recreating_pages:
+                    # The page shown is no longer the active one until the new pages are
+                    trace.finish("pages loading")
+                elif not self.pages or chosen_track >= len(self.pages[self.active_page].tracks):
+                    trace.finish("invalid number")
                 else:
-                    self.pages[self.active_page].tracks[chosen_track-1].play()
+                    run_in_background(self.pages[self.active_page].tracks[chosen_track-1].play, trace)
                     self.playing = True
-                self.chosen_num = ""
+            else:
+                trace.finish("digit")
         # Case where page forward/backward button is pressed
-        else:
-            self.clear_timers()
+        elif self.pages:
+            if self.page_trace:
+                self.page_trace.finish("superseded")
+            self.page_trace = trace
             if "forward" in button.objectName():
                 self.active_page += 1
-                if self.active_page == len(self.pages):
-                    self.create_pages()
-                if self.active_page >= len(self.pages):
-                    self.active_page = 0   
             else:
                 self.active_page -= 1
-                if self.active_page < 0:
+            # Going off either end wraps around straight away, and re-creates the pages (in case the playlist has
+            # changed) before showing the page
+            if self.active_page < 0 or self.active_page >= len(self.pages):
+                self.active_page %= len(self.pages)
+                if not self.recreating_pages:
+                    self.recreating_pages = True
                     self.create_pages()
-                    self.active_page = len(self.pages)-1
-                    self.page_load()
-                    return
-            self.pages[self.active_page].refresh()
-            self.page_load()
-    
-    def clear_timers(self):
-        """Stops and destroys all currently-active timers.
-        """
-        self.timers.deleteLater()
-        self.timers = QtCore.QObject()
+            else:
+                self.show_page()
+        else:
+            trace.finish("no pages")
     
-    def gpio_press(self, button, _,_2):
-        """Handles pressing of GPIO buttons.
+    def gpio_press(self, pin : int, trace : Trace = None):
+        """Handles pressing of GPIO buttons (on the GUI thread, via gpio_events).
+
+        :param pin: GPIO pin of the pressed button
+        :type pin: int
+        :param trace: trace of the press, defaults to None
+        :type trace: Trace, optional
         """
-        pressed = BUTTONS[button]
-        pressed_button = next(button for button in self.button_list if str(pressed) in button.objectName())
-        pressed_button.click()
+        self.press_trace = trace
+        try:
+            self.gpio_buttons[pin].click()
+        finally:
+            self.press_trace = None
 
 
-# Set up GPIO
-pi = pigpio.pi()
-for button in BUTTONS:
-    pi.set_mode(button, pigpio.INPUT)
-    pi.set_pull_up_down(button, pigpio.PUD_UP)
-    pi.set_glitch_filter(button, 1000)  # Deals with switch bounce
+def setup_gpio(window : MainWindow) -> pigpio.pi:
+    """Sets up the GPIO buttons, passing their presses on to the window.
 
-app = QtWidgets.QApplication(sys.argv)
+    :param window: the main window
+    :type window: MainWindow
+    :return: connection to the pigpio daemon
+    :rtype: pigpio.pi
+    """
+    pi = pigpio.pi()
+    for button in BUTTONS:
+        pi.set_mode(button, pigpio.INPUT)
+        pi.set_pull_up_down(button, pigpio.PUD_UP)
+        pi.set_glitch_filter(button, 1000)  # Deals with switch bounce
+        pi.callback(button, func=window.gpio_events.callback)
+    return pi
 
-window = MainWindow()
-# Connect buttons to functions
-for button in BUTTONS:
-    pi.callback(button, func=window.gpio_press)
+def main():
+    """Runs the jukebox interface.
+    """
+    with timeline.phase("QApplication"):
+        app = QtWidgets.QApplication(sys.argv)
+    with timeline.phase("MainWindow"):
+        window = MainWindow()
+    with timeline.phase("connect pigpio"):
+        setup_gpio(window)
+    with timeline.phase("show"):
+        window.show()
+    app.exec()
 
-window.show()
-app.exec()
+if __name__ == "__main__":
+    main()
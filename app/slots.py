@@ -0,0 +1,59 @@
+"""Song title slots of the jukebox interface.
+
+The labels showing song titles, and the scroll areas they sit in, never change once the interface has been
+set up. They are looked up once, and each label is swapped for a MarqueeLabel showing titles from pre-rendered
+pixmaps, so that showing a page only has to set text.
+"""
+from PySide6 import QtWidgets
+from app.marquee import MarqueeLabel
+
+class SongSlot:
+    """Place on the interface for a song title.
+    """
+    __slots__ = ("label", "scroll_area")
+
+    def __init__(self, song_label : QtWidgets.QLabel):
+        """Swaps the song label for a MarqueeLabel that looks the same, in the same place.
+
+        :param song_label: label showing the song title, from Ui_MainWindow
+        :type song_label: QtWidgets.QLabel
+        """
+        contents = song_label.parentWidget()
+        # song_label -> scroll area contents -> viewport -> scroll area
+        self.scroll_area = contents.parentWidget().parentWidget()
+        # MarqueeLabel does its own scrolling
+        self.scroll_area.horizontalScrollBar().hide()
+        song_label.ensurePolished()  # Applies the stylesheet to the palette
+        palette = song_label.palette()
+        self.label = MarqueeLabel(song_label.font(), palette.color(song_label.foregroundRole()), palette.color(song_label.backgroundRole()), contents)
+        contents.layout().replaceWidget(song_label, self.label)
+        song_label.hide()
+
+    def set_text(self, text : str) -> int:
+        """Shows text in the slot.
+
+        :param text: text to show
+        :type text: str
+        :return: how far the text needs scrolling to be seen in full (in px), 0 if it fits
+        :rtype: int
+        """
+        self.label.setText(text)
+        return self.label.maximum()
+
+    def clear(self):
+        """Removes the slot's text.
+        """
+        self.label.setText("")
+
+def find_slots(window : QtWidgets.QWidget) -> list:
+    """Looks up the song title slots of the interface, in order (song0, song1, ...).
+
+    :param window: window set up by Ui_MainWindow
+    :type window: QtWidgets.QWidget
+    :return: the slots
+    :rtype: list
+    """
+    slots = []
+    while song_label := window.findChild(QtWidgets.QLabel, name=f"song{len(slots)}"):
+        slots.append(SongSlot(song_label))
+    return slots
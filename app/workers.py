@@ -0,0 +1,75 @@
+"""Background workers for the jukebox interface.
+
+Runs blocking calls (e.g requests to the spotify web API) on a thread pool so that the GUI thread never
+waits on the network. Results and errors are delivered back to the GUI thread via Qt signals.
+"""
+import threading
+from collections.abc import Callable
+from PySide6 import QtCore
+
+class WorkerSignals(QtCore.QObject):
+    """Signals emitted by a worker. Created on the GUI thread, so connected slots run on the GUI thread.
+    """
+    finished = QtCore.Signal(object)
+    failed = QtCore.Signal(object)
+
+class Worker(QtCore.QRunnable):
+    """Runs a callable on the thread pool.
+    """
+    def __init__(self, fn : Callable, *args, **kwargs):
+        """
+        :param fn: callable to run
+        :type fn: Callable
+        """
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+
+    def run(self):
+        """Runs the callable, emitting finished with its result or failed with the exception it raised.
+        """
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Exception as e:
+            self.signals.failed.emit(e)
+        else:
+            self.signals.finished.emit(result)
+
+# Workers that haven't finished yet (the thread pool doesn't keep the python objects alive by itself)
+active = set()
+active_lock = threading.Lock()
+
+def run_in_background(fn : Callable, *args, on_finished : Callable = None, on_failed : Callable = None, **kwargs) -> Worker:
+    """Runs a callable on the global thread pool.
+
+    :param fn: callable to run
+    :type fn: Callable
+    :param on_finished: called on the GUI thread with the result, defaults to None
+    :type on_finished: Callable, optional
+    :param on_failed: called on the GUI thread with the exception if one is raised, defaults to printing it
+    :type on_failed: Callable, optional
+    :return: the worker
+    :rtype: Worker
+    """
+    worker = Worker(fn, *args, **kwargs)
+    if on_finished:
+        worker.signals.finished.connect(on_finished)
+    worker.signals.failed.connect(on_failed or (lambda e: print(str(e))))
+    # Released once the result has been delivered, rather than when run returns, so the signals outlive the queued delivery
+    worker.signals.finished.connect(lambda _: release(worker))
+    worker.signals.failed.connect(lambda _: release(worker))
+    with active_lock:
+        active.add(worker)
+    QtCore.QThreadPool.globalInstance().start(worker)
+    return worker
+
+def release(worker : Worker):
+    """Forgets about a worker once its result has been delivered.
+
+    :param worker: the finished worker
+    :type worker: Worker
+    """
+    with active_lock:
+        active.discard(worker)
@@ -0,0 +1,51 @@
+"""Helpers shared by the benchmarks in this directory.
+"""
+
+import os
+import json
+import shutil
+import tempfile
+
+PLAYLIST_ID = "benchmark"
+DEVICE_NAME = "Jukebox"
+
+def make_sandbox(spotify, songs_per_page : int = 20, root : str = None) -> str:
+    """Creates a throwaway copy of the jukebox's files (config, secrets, playlist cache) pointing at the fake server.
+
+    The jukebox reads these relative to the working directory, so it is run from the sandbox's app directory.
+
+    :param spotify: the fake server
+    :type spotify: FakeSpotify
+    :param songs_per_page: number of songs per page, defaults to 20
+    :type songs_per_page: int, optional
+    :param root: checkout of the jukebox whose src directory is copied in too, defaults to None (the code isn't copied)
+    :type root: str, optional
+    :return: the sandbox's app directory
+    :rtype: str
+    """
+    sandbox = tempfile.mkdtemp(prefix="jukebox-bench-")
+    if root:
+        shutil.copytree(os.path.join(root, "src"), os.path.join(sandbox, "src"), ignore=shutil.ignore_patterns("__pycache__", "*.db", "secrets.json"))
+    else:
+        os.makedirs(os.path.join(sandbox, "src"))
+    os.makedirs(os.path.join(sandbox, "app"))
+    config = {"client_id": "benchmark", "client_secret": "benchmark", "device_name": DEVICE_NAME, "playlist_id": PLAYLIST_ID,
+              "songs_per_page": songs_per_page, "api_url": spotify.api_url, "accounts_url": spotify.url}
+    with open(os.path.join(sandbox, "config.yaml"), "w", encoding="utf-8") as f:
+        json.dump(config, f)  # JSON is valid YAML
+    with open(os.path.join(sandbox, "src", "secrets.json"), "w", encoding="utf-8") as f:
+        json.dump({"access_token": "benchmark", "refresh_token": "benchmark"}, f)
+    return os.path.join(sandbox, "app")
+
+def percentile(values : list, p : float) -> float:
+    """Summarises values by one of their percentiles.
+
+    :param values: values to summarise
+    :type values: list
+    :param p: percentile (0-100)
+    :type p: float
+    :return: the nearest-rank percentile
+    :rtype: float
+    """
+    values = sorted(values)
+    return values[min(max(round(p/100*len(values)+0.5)-1, 0), len(values)-1)]
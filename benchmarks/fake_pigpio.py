@@ -0,0 +1,65 @@
+"""Stand-in for the pigpio module, so the interface can run without a Pi.
+
+Buttons are pressed with pi.press, which calls the registered callbacks from another thread, like pigpio's
+callback thread does.
+"""
+
+import time
+import threading
+
+INPUT = 0
+OUTPUT = 1
+PUD_OFF = 0
+PUD_DOWN = 1
+PUD_UP = 2
+FALLING_EDGE = 0
+RISING_EDGE = 1
+EITHER_EDGE = 2
+
+class _callback:
+    """Registered callback, which can be cancelled.
+    """
+    def __init__(self, pi : "pi", user_gpio : int, func):
+        self.pi = pi
+        self.gpio = user_gpio
+        self.func = func
+
+    def cancel(self):
+        self.pi.callbacks.remove(self)
+
+class pi:
+    """Fake connection to the pigpio daemon.
+    """
+    def __init__(self, host : str = None, port : int = None):
+        self.connected = True
+        self.modes = {}
+        self.callbacks = []
+
+    def set_mode(self, gpio : int, mode : int):
+        self.modes[gpio] = mode
+
+    def set_pull_up_down(self, gpio : int, pud : int):
+        pass
+
+    def set_glitch_filter(self, user_gpio : int, steady : int):
+        pass
+
+    def callback(self, user_gpio : int, edge : int = RISING_EDGE, func=None) -> _callback:
+        callback = _callback(self, user_gpio, func)
+        self.callbacks.append(callback)
+        return callback
+
+    def press(self, gpio : int):
+        """Presses a button, calling its callbacks on a separate thread and waiting for them.
+
+        :param gpio: GPIO pin of the button
+        :type gpio: int
+        """
+        tick = time.perf_counter_ns()//1000 % (1 << 32)
+        funcs = [callback.func for callback in self.callbacks if callback.gpio == gpio]
+        thread = threading.Thread(target=lambda: [func(gpio, 1, tick) for func in funcs], name="pigpio-callback")
+        thread.start()
+        thread.join()
+
+    def stop(self):
+        self.connected = False
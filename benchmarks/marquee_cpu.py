@@ -0,0 +1,135 @@
+"""Measures the CPU used by the scrolling song titles while the jukebox sits idle on a page.
+
+Compares the original approach (a new single-shot QTimer for every step of every title) with the shared
+MarqueeClock, scrolling either the original labels in scroll areas or MarqueeLabels drawn from pre-rendered
+pixmaps. Runs offscreen, so no display is needed. Run from this directory:
+
+    python marquee_cpu.py [--duration 600] [--fps 2] [--titles 7]
+"""
+
+import os
+import sys
+import time
+import argparse
+from functools import partial
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.append("../")  # Allows for below imports
+from PySide6 import QtWidgets, QtCore
+from app.app_ui import Ui_MainWindow
+from app.marquee import MarqueeClock
+from app.slots import find_slots
+
+TITLE = "A Song With A Title Far Too Long To Fit On The Label Number "
+
+class Window(QtWidgets.QMainWindow, Ui_MainWindow):
+    """Jukebox interface showing a page of long song titles.
+    """
+    def __init__(self, num_titles : int, pixmaps : bool = False):
+        super().__init__()
+        self.setupUi(self)
+        self.scrollbars = []
+        if pixmaps:
+            for slot in find_slots(self)[:num_titles]:
+                slot.set_text(f"{TITLE}{len(self.scrollbars)} ")
+                self.scrollbars.append(slot.label)
+            return
+        for i in range(num_titles):
+            label = self.findChild(QtWidgets.QLabel, name=f"song{i}")
+            label.setText(f"{TITLE}{i} ")
+            label.adjustSize()
+            scroll_area = label.parentWidget().parentWidget().parentWidget()
+            scrollbar = scroll_area.horizontalScrollBar()
+            scrollbar.hide()
+            scrollbar.setMaximum(label.width()-scroll_area.width())
+            self.scrollbars.append(scrollbar)
+
+class OneshotTimers:
+    """The original marquee implementation, creating a new timer for every step.
+    """
+    def __init__(self):
+        self.timers = QtCore.QObject()
+
+    def stop(self):
+        self.timers.deleteLater()
+
+    def create_oneshot_timer(self, time : int):
+        timer = QtCore.QTimer(self.timers)
+        timer.setInterval(time)
+        timer.setSingleShot(True)
+        return timer
+
+    def start_text_scroll(self, scrollbar, old_timer=None):
+        if old_timer:
+            old_timer.setParent(None)
+            old_timer.deleteLater()
+        scrollbar.setValue(scrollbar.value() + 20)
+        if scrollbar.value() < scrollbar.maximum():
+            timer = self.create_oneshot_timer(500)
+            timer.timeout.connect(partial(self.start_text_scroll, scrollbar, timer))
+        else:
+            timer = self.create_oneshot_timer(3000)
+            timer.timeout.connect(partial(self.stop_text_scroll, scrollbar, timer))
+        timer.start()
+
+    def stop_text_scroll(self, scrollbar, old_timer=None):
+        if old_timer:
+            old_timer.setParent(None)
+            old_timer.deleteLater()
+        scrollbar.setValue(0)
+        timer = self.create_oneshot_timer(3000)
+        timer.timeout.connect(partial(self.start_text_scroll, scrollbar, timer))
+        timer.start()
+
+def run(app : QtWidgets.QApplication, start, duration : float, num_titles : int, pixmaps : bool = False) -> float:
+    """Shows a page of long titles, scrolling them for a given time.
+
+    :param app: the application
+    :type app: QtWidgets.QApplication
+    :param start: function starting the scrolling given the window's scrollbars, returning a function to stop it
+    :type start: Callable
+    :param duration: how long to run for (in s)
+    :type duration: float
+    :param num_titles: number of scrolling titles
+    :type num_titles: int
+    :param pixmaps: whether to scroll MarqueeLabels rather than the original labels, defaults to False
+    :type pixmaps: bool, optional
+    :return: CPU time used, as a percentage of one core
+    :rtype: float
+    """
+    window = Window(num_titles, pixmaps)
+    window.show()
+    app.processEvents()
+    stop = start(window.scrollbars)
+    cpu_start = time.process_time()
+    QtCore.QTimer.singleShot(round(duration*1000), app.quit)
+    app.exec()
+    cpu = time.process_time() - cpu_start
+    stop()
+    window.close()
+    window.deleteLater()
+    app.processEvents()
+    return cpu/duration*100
+
+def start_timers(scrollbars : list):
+    marquee = OneshotTimers()
+    for scrollbar in scrollbars:
+        marquee.stop_text_scroll(scrollbar)
+    return marquee.stop
+
+def start_clock(fps : int, scrollbars : list):
+    marquee = MarqueeClock(fps)
+    for scrollbar in scrollbars:
+        marquee.add(scrollbar)
+    return marquee.clear
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=600, help="time (in s) to run each approach for")
+    parser.add_argument("--fps", type=int, default=2, help="frame rate of the MarqueeClock")
+    parser.add_argument("--titles", type=int, default=7, help="number of scrolling titles")
+    args = parser.parse_args()
+    app = QtWidgets.QApplication(sys.argv)
+    print(f"{args.titles} titles scrolling for {args.duration:g}s each")
+    print(f"{'oneshot timers':<24}{run(app, start_timers, args.duration, args.titles):>6.2f}% CPU")
+    print(f"{f'MarqueeClock ({args.fps}fps)':<24}{run(app, partial(start_clock, args.fps), args.duration, args.titles):>6.2f}% CPU")
+    print(f"{f'MarqueeLabel ({args.fps}fps)':<24}{run(app, partial(start_clock, args.fps), args.duration, args.titles, pixmaps=True):>6.2f}% CPU")
@@ -0,0 +1,68 @@
+"""Measures the memory used per track by the different ways the jukebox has stored a playlist.
+
+Run from this directory:
+
+    python memory.py [--tracks 50000]
+"""
+
+import sys
+import gc
+import argparse
+import tracemalloc
+sys.path.append("../")  # Allows for below imports
+from src.tracks import TrackTable
+
+class DictSong:
+    """Song as originally stored (one object with a __dict__ per track, kept alive by every Page).
+    """
+    def __init__(self, title : str, artist : str, uri : str):
+        self.title = title
+        self.artist = artist
+        self.uri = uri
+
+def synthetic_tracks(num_tracks : int) -> list:
+    """Generates a playlist's worth of (title, artist, uri) tuples, as parsed from the spotify web API.
+
+    Artists repeat (as they do in real playlists), titles and uris don't.
+
+    :param num_tracks: number of tracks to generate
+    :type num_tracks: int
+    :return: the tracks
+    :rtype: list
+    """
+    return [(f"Song Title Number {i} (Remastered)", f"Artist {i % (num_tracks//10 or 1)}", f"spotify:track:{i:022}") for i in range(num_tracks)]
+
+def measure(build, num_tracks : int) -> float:
+    """Measures the memory allocated by a storage method, per track.
+
+    The raw json-parsed strings are generated inside the measurement, then released by the storage methods
+    that don't keep them, so each result is the memory the stored playlist actually keeps alive.
+
+    :param build: function converting a list of tracks into the stored form
+    :type build: Callable
+    :param num_tracks: number of tracks
+    :type num_tracks: int
+    :return: bytes per track
+    :rtype: float
+    """
+    gc.collect()
+    tracemalloc.start()
+    stored = build(synthetic_tracks(num_tracks))
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del stored
+    return size/num_tracks
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tracks", type=int, default=50000, help="number of tracks in the synthetic playlist")
+    args = parser.parse_args()
+    methods = {
+        "Song objects": lambda tracks: [DictSong(*track) for track in tracks],
+        "tuples": lambda tracks: tracks,
+        "TrackTable": TrackTable,
+    }
+    print(f"{args.tracks} tracks")
+    for name, build in methods.items():
+        print(f"{name:<14}{measure(build, args.tracks):>8.1f} bytes/track")
@@ -0,0 +1,113 @@
+"""Measures how long the jukebox interface takes to show a page of songs.
+
+Compares the original page_load (looking up every label and scroll area, and relaying out each label with
+adjustSize) with the precomputed song slots (MarqueeLabels drawing pre-rendered titles). Each render is timed up to and including the repaint, and should
+fit well within one frame at 60fps (16.7ms). Runs offscreen, so no display is needed. Run from this directory:
+
+    python page_render.py [--renders 200] [--songs 20]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.append("../")  # Allows for below imports
+from PySide6 import QtWidgets, QtCore
+from app.app_ui import Ui_MainWindow
+from app.marquee import MarqueeClock
+from app.slots import find_slots
+
+FRAME_TIME = 1000/60
+WORDS = ["Love", "Night", "Song", "Blue", "Heart", "Dancing", "Forever", "The", "Of", "In", "Midnight", "Summer", "(Remastered 2011)", "Don't", "Stop"]
+
+class Window(QtWidgets.QMainWindow, Ui_MainWindow):
+    """Jukebox interface, with both ways of showing a page.
+    """
+    def __init__(self, slots : bool):
+        super().__init__()
+        self.setupUi(self)
+        self.marquee = MarqueeClock(parent=self)
+        self.song_labels = self.findChildren(QtWidgets.QLabel, QtCore.QRegularExpression("^song"))
+        self.slots = find_slots(self) if slots else []
+
+    def lookup_load(self, titles : list):
+        """The original page_load.
+        """
+        self.marquee.clear()
+        for label in self.song_labels:
+            label.setText("")
+        for i,title in enumerate(titles):
+            label = self.findChild(QtWidgets.QLabel, name=f"song{i}")
+            label.setText(title + " ")
+            label.adjustSize()
+            scrollbar = label.parentWidget().parentWidget().parentWidget().horizontalScrollBar()
+            scrollbar.hide()
+            scrollbar_width = label.width()-label.parentWidget().parentWidget().parentWidget().width()
+            if scrollbar_width > 0:
+                scrollbar.setMaximum(scrollbar_width)
+                self.marquee.add(scrollbar)
+
+    def slot_load(self, titles : list):
+        """page_load using the precomputed slots.
+        """
+        self.marquee.clear()
+        for slot in self.slots:
+            slot.clear()
+        for slot, title in zip(self.slots, titles):
+            if slot.set_text(title + " "):
+                self.marquee.add(slot.label)
+
+def random_title() -> str:
+    return " ".join(random.choice(WORDS) for _ in range(random.randint(1, 8)))
+
+def run(app : QtWidgets.QApplication, load, pages : list) -> list:
+    """Shows each page in turn, timing how long each takes to appear.
+
+    :param app: the application
+    :type app: QtWidgets.QApplication
+    :param load: method of a shown Window showing a page, given its song titles
+    :type load: Callable
+    :param pages: song titles of each page
+    :type pages: list
+    :return: time taken to set each page up, and to show it including layout and painting (in ms)
+    :rtype: tuple
+    """
+    load_times = []
+    frame_times = []
+    for titles in pages:
+        start = time.perf_counter()
+        load(titles)
+        loaded = time.perf_counter()
+        app.processEvents()  # Lays out and paints the page
+        load_times.append((loaded - start)*1000)
+        frame_times.append((time.perf_counter() - start)*1000)
+    return load_times, frame_times
+
+def summary(times : list) -> str:
+    times = sorted(times)
+    p95 = times[int(len(times)*0.95)]
+    return f"mean {statistics.mean(times):6.2f}ms  p95 {p95:6.2f}ms  max {times[-1]:6.2f}ms  ({p95/FRAME_TIME:.0%} of a frame at p95)"
+
+def report(name : str, times : tuple):
+    load_times, frame_times = times
+    print(f"{name:<24}page_load  {summary(load_times)}")
+    print(f"{'':<24}+ repaint  {summary(frame_times)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--renders", type=int, default=200, help="number of pages to show with each approach")
+    parser.add_argument("--songs", type=int, default=20, help="number of songs per page")
+    args = parser.parse_args()
+    random.seed(0)
+    app = QtWidgets.QApplication(sys.argv)
+    pages = [[random_title() for _ in range(args.songs)] for _ in range(args.renders)]
+    print(f"{args.renders} pages of {args.songs} songs")
+    for name, slots in (("lookups + adjustSize", False), ("precomputed slots", True)):
+        window = Window(slots)
+        window.show()
+        app.processEvents()
+        report(name, run(app, window.slot_load if slots else window.lookup_load, pages))
+        window.close()
@@ -0,0 +1,110 @@
+"""Measures the size and JSON parse time of playlist track responses with and without field filtering.
+
+Run from this directory:
+
+    python payload.py              # against the spotify web API, using the playlist in config.yaml
+    python payload.py --synthetic  # against locally-generated responses (no network or credentials needed)
+"""
+
+import sys
+import json
+import time
+import argparse
+from statistics import median
+sys.path.append("../")  # Allows for below imports
+from src.playlist import TRACK_FIELDS, TRACKS_PER_REQUEST, parse_tracks
+
+MARKETS = ["AD", "AE", "AG", "AL", "AM", "AO", "AR", "AT", "AU", "AZ", "BA", "BB", "BD", "BE", "BF", "BG", "BH", "BI", "BJ", "BN",
+           "BO", "BR", "BS", "BT", "BW", "BY", "BZ", "CA", "CD", "CG", "CH", "CI", "CL", "CM", "CO", "CR", "CV", "CW", "CY", "CZ",
+           "DE", "DJ", "DK", "DM", "DO", "DZ", "EC", "EE", "EG", "ES", "ET", "FI", "FJ", "FM", "FR", "GA", "GB", "GD", "GE", "GH",
+           "GM", "GN", "GQ", "GR", "GT", "GW", "GY", "HK", "HN", "HR", "HT", "HU", "ID", "IE", "IL", "IN", "IQ", "IS", "IT", "JM",
+           "JO", "JP", "KE", "KG", "KH", "KI", "KM", "KN", "KR", "KW", "KZ", "LA", "LB", "LC", "LI", "LK", "LR", "LS", "LT", "LU",
+           "LV", "LY", "MA", "MC", "MD", "ME", "MG", "MH", "MK", "ML", "MN", "MO", "MR", "MT", "MU", "MV", "MW", "MX", "MY", "MZ"]
+
+def synthetic_item(i : int) -> dict:
+    """Generates a playlist item shaped like a full (unfiltered) spotify web API response.
+
+    :param i: index of the track
+    :type i: int
+    :return: the playlist item
+    :rtype: dict
+    """
+    artist = {"external_urls": {"spotify": f"https://open.spotify.com/artist/artist{i:018}"}, "href": f"https://api.spotify.com/v1/artists/artist{i:018}",
+              "id": f"artist{i:018}", "name": f"Artist {i}", "type": "artist", "uri": f"spotify:artist:artist{i:018}"}
+    images = [{"height": size, "width": size, "url": f"https://i.scdn.co/image/ab67616d0000{size:04}{i:024}"} for size in (640, 300, 64)]
+    album = {"album_type": "album", "total_tracks": 12, "available_markets": MARKETS, "external_urls": {"spotify": f"https://open.spotify.com/album/album{i:019}"},
+             "href": f"https://api.spotify.com/v1/albums/album{i:019}", "id": f"album{i:019}", "images": images, "name": f"Album {i}",
+             "release_date": "1979-11-30", "release_date_precision": "day", "type": "album", "uri": f"spotify:album:album{i:019}", "artists": [artist]}
+    track = {"album": album, "artists": [artist], "available_markets": MARKETS, "disc_number": 1, "duration_ms": 215000, "explicit": False,
+             "external_ids": {"isrc": f"GBAAA79{i:05}"}, "external_urls": {"spotify": f"https://open.spotify.com/track/track{i:017}"},
+             "href": f"https://api.spotify.com/v1/tracks/track{i:017}", "id": f"track{i:017}", "is_local": False, "name": f"Song Number {i}",
+             "popularity": 64, "preview_url": None, "track_number": 3, "type": "track", "uri": f"spotify:track:track{i:017}", "episode": False, "track": True}
+    return {"added_at": "2024-01-01T00:00:00Z", "added_by": {"id": "jukebox", "type": "user"}, "is_local": False, "primary_color": None,
+            "track": track, "video_thumbnail": {"url": None}}
+
+def project(item : dict) -> dict:
+    """Reduces a playlist item to the fields in TRACK_FIELDS.
+
+    :param item: full playlist item
+    :type item: dict
+    :return: the filtered playlist item
+    :rtype: dict
+    """
+    track = item["track"]
+    return {"track": {"name": track["name"], "uri": track["uri"], "artists": [{"name": artist["name"]} for artist in track["artists"]]}}
+
+def synthetic_bodies() -> tuple:
+    """Generates a full and a filtered response body for one request's worth of tracks.
+
+    :return: (full body, filtered body)
+    :rtype: tuple
+    """
+    items = [synthetic_item(i) for i in range(TRACKS_PER_REQUEST)]
+    full = {"href": "https://api.spotify.com/v1/playlists/abc/tracks?offset=0&limit=100", "limit": TRACKS_PER_REQUEST, "next": None,
+            "offset": 0, "previous": None, "total": TRACKS_PER_REQUEST, "items": items}
+    filtered = {"total": TRACKS_PER_REQUEST, "items": [project(item) for item in items]}
+    return json.dumps(full).encode(), json.dumps(filtered).encode()
+
+def live_bodies() -> tuple:
+    """Downloads a full and a filtered response body for one request's worth of tracks from the spotify web API.
+
+    :return: (full body, filtered body)
+    :rtype: tuple
+    """
+    from src.utils import get_session, get_credentials, PLAYLIST_ID
+    url = f"https://api.spotify.com/v1/playlists/{PLAYLIST_ID}/tracks?limit={TRACKS_PER_REQUEST}&offset=0"
+    headers = {"Authorization": "Bearer " + get_credentials("../src/secrets.json").get()["access_token"]}
+    session = get_session(url)
+    full = session.get(url, headers=headers, timeout=10).content
+    filtered = session.get(url + f"&fields={TRACK_FIELDS}", headers=headers, timeout=10).content
+    return full, filtered
+
+def parse_time(body : bytes, repeats : int) -> float:
+    """Measures the median time taken to parse a response body into the jukebox's tracks.
+
+    :param body: response body
+    :type body: bytes
+    :param repeats: number of times to repeat the measurement
+    :type repeats: int
+    :return: median time in ms
+    :rtype: float
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        parse_tracks(json.loads(body)["items"])
+        times.append(time.perf_counter() - start)
+    return median(times)*1000
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--synthetic", action="store_true", help="use locally-generated responses instead of the spotify web API")
+    parser.add_argument("--repeats", type=int, default=200, help="number of times to repeat each parse")
+    args = parser.parse_args()
+    full, filtered = synthetic_bodies() if args.synthetic else live_bodies()
+    full_time = parse_time(full, args.repeats)
+    filtered_time = parse_time(filtered, args.repeats)
+    print(f"{'':<10}{'bytes':>10}{'parse (ms)':>12}")
+    print(f"{'full':<10}{len(full):>10}{full_time:>12.3f}")
+    print(f"{'filtered':<10}{len(filtered):>10}{filtered_time:>12.3f}")
+    print(f"{'ratio':<10}{len(full)/len(filtered):>9.1f}x{full_time/filtered_time:>11.1f}x")
@@ -0,0 +1,145 @@
+"""Benchmark of the search index (src/search.py) on a large playlist.
+
+Builds an index of synthetic tracks, whose titles and artists are made of made-up words drawn with a Zipf
+distribution (so a few words are very common, as "love" and "the" are in real titles), then times queries as
+they'd be typed: one or two words, the last of which is often only partly typed. Also times updating the index
+for a changed snapshot. Exits with an error if the 99th percentile query time is over --max-p99 (by default
+1ms, so searching keeps up with typing). Run from this directory:
+
+    python search.py [--tracks 50000] [--queries 2000] [--max-p99 1000] [--json results.json]
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+from statistics import median
+sys.path.append("../")  # Allows for below imports
+from src.search import SearchIndex
+from src.tracks import TrackTable
+from common import percentile
+
+SYLLABLES = ["la", "ve", "mo", "ri", "ka", "to", "ne", "so", "lu", "da", "mi", "ro", "be", "sha", "tri", "gon", "el", "an", "or", "is"]
+VOCABULARY_SIZE = 20000
+
+def make_words(rng : random.Random, count : int) -> list:
+    """
+    :param rng: random number generator
+    :type rng: random.Random
+    :param count: number of words
+    :type count: int
+    :return: distinct made-up words, of 1-4 syllables
+    :rtype: list
+    """
+    words = set()
+    while len(words) < count:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 4))))
+    return sorted(words)
+
+def make_tracks(rng : random.Random, num_tracks : int, first : int = 0) -> list:
+    """
+    :param rng: random number generator
+    :type rng: random.Random
+    :param num_tracks: number of tracks
+    :type num_tracks: int
+    :param first: number in the uri of the first track, defaults to 0
+    :type first: int, optional
+    :return: (title, artist, uri) of each track
+    :rtype: list
+    """
+    words = make_words(rng, VOCABULARY_SIZE)
+    rng.shuffle(words)  # So the most common words don't all start the same
+    weights = [1/rank for rank in range(1, len(words) + 1)]  # Zipf
+    artists = [" ".join(word.capitalize() for word in rng.choices(words, weights, k=2)) for _ in range(max(num_tracks//10, 1))]
+    return [(" ".join(word.capitalize() for word in rng.choices(words, weights, k=rng.randint(1, 6))), rng.choice(artists), f"spotify:track:{first + i:022}")
+            for i in range(num_tracks)]
+
+def make_queries(rng : random.Random, tracks : list, count : int) -> list:
+    """
+    :param rng: random number generator
+    :type rng: random.Random
+    :param tracks: the tracks
+    :type tracks: list
+    :param count: number of queries
+    :type count: int
+    :return: queries of 1-2 words from the tracks' titles and artists, the last partly typed (at least 2 letters) half the time
+    :rtype: list
+    """
+    queries = []
+    for _ in range(count):
+        title, artist, _ = rng.choice(tracks)
+        words = (title + " " + artist).lower().split()
+        start = rng.randrange(len(words))
+        query = words[start:start + rng.randint(1, 2)]
+        if rng.random() < 0.5:
+            query[-1] = query[-1][:rng.randint(min(2, len(query[-1])), len(query[-1]))]
+        queries.append(" ".join(query))
+    return queries
+
+def measure(num_tracks : int, num_queries : int) -> dict:
+    """
+    :param num_tracks: number of tracks in the playlist
+    :type num_tracks: int
+    :param num_queries: number of queries to time
+    :type num_queries: int
+    :return: build, query and update times
+    :rtype: dict
+    """
+    rng = random.Random(0)
+    tracks = make_tracks(rng, num_tracks)
+    table = TrackTable(tracks)
+    start = time.perf_counter()
+    index = SearchIndex(table)
+    build = time.perf_counter() - start
+    queries = make_queries(rng, tracks, num_queries)
+    times = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        matches = index.search(query)
+        times.append((time.perf_counter() - start)*1e6)
+        results.append(len(matches))
+    # New snapshots of the playlist: 1% more tracks added to the end (the usual change, indexing just those), then
+    # 1% removed and 1% added (rebuilding the index)
+    changes = max(num_tracks//100, 1)
+    appended = tracks + make_tracks(rng, changes, len(tracks))
+    changed = [track for i, track in enumerate(appended) if i % 100] + make_tracks(rng, changes, len(appended))
+    updates = {}
+    for name, snapshot in (("append", appended), ("remove and add", changed)):
+        snapshot = TrackTable(snapshot)
+        start = time.perf_counter()
+        indexed = index.update(snapshot)
+        updates[name] = {"time": time.perf_counter() - start, "indexed": indexed}
+    return {"tracks": num_tracks, "words": len(index.postings), "build": build, "updates": updates,
+            "queries": {"count": len(times), "p50": median(times), "p90": percentile(times, 90), "p99": percentile(times, 99),
+                        "max": max(times), "no matches": results.count(0)}}
+
+def report(results : dict):
+    """Prints the results.
+
+    :param results: results from measure
+    :type results: dict
+    """
+    print(f"{results['tracks']} tracks, {results['words']} distinct words")
+    print(f"build {results['build']*1000:.0f}ms")
+    for name, update in results["updates"].items():
+        print(f"update ({name}, {update['indexed']} tracks indexed) {update['time']*1000:.0f}ms")
+    queries = results["queries"]
+    print(f"{queries['count']} queries (µs): p50 {queries['p50']:.0f}, p90 {queries['p90']:.0f}, p99 {queries['p99']:.0f}, "
+          f"max {queries['max']:.0f} ({queries['no matches']} with no matches)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tracks", type=int, default=50000, help="number of tracks in the playlist")
+    parser.add_argument("--queries", type=int, default=2000, help="number of queries to time")
+    parser.add_argument("--max-p99", type=float, default=1000, help="99th percentile query time (in µs) over which the benchmark fails")
+    parser.add_argument("--json", help="file to also write the results to")
+    args = parser.parse_args()
+    results = measure(args.tracks, args.queries)
+    report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if results["queries"]["p99"] > args.max_p99:
+        sys.exit(f"FAILED: p99 query time {results['queries']['p99']:.0f}µs is over {args.max_p99:g}µs")
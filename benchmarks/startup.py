@@ -0,0 +1,102 @@
+"""Benchmark of the time taken to import the jukebox modules.
+
+Imports each module in a fresh interpreter a number of times, with the local fake spotify server
+(tests/fake_spotify.py) standing in for the web API, reporting how long the import takes, how many requests
+it makes and whether it works at all without a config.yaml. Any checkout of the jukebox can be measured
+(e.g an older commit, checked out with git worktree) to compare against. Run from this directory:
+
+    python startup.py [--runs 20] [--latency 0.05] [--root ../] [--json results.json]
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import subprocess
+from statistics import median
+sys.path.append(os.path.abspath("../tests"))  # Allows for below imports
+from fake_spotify import FakeSpotify
+from common import make_sandbox, PLAYLIST_ID, DEVICE_NAME
+
+MODULES = ["src.utils", "src.jukebox"]
+# Run in a fresh interpreter, printing how long (in s) the import took
+IMPORT_SCRIPT = """
+import sys, time, importlib
+sys.path.insert(0, "../")
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+print(time.perf_counter() - start)
+"""
+
+def time_import(app_dir : str, module : str) -> float:
+    """
+    :param app_dir: directory to run the jukebox from
+    :type app_dir: str
+    :param module: name of the module to import
+    :type module: str
+    :return: time (in s) the import took, None if it failed
+    :rtype: float
+    """
+    result = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT, module], cwd=app_dir, capture_output=True, text=True, check=False)
+    if result.returncode:
+        return None
+    return float(result.stdout.split()[-1])
+
+def measure(root : str, runs : int, latency : float) -> dict:
+    """Times importing each module, with and without a config.yaml.
+
+    :param root: checkout of the jukebox to measure
+    :type root: str
+    :param runs: number of times to import each module
+    :type runs: int
+    :param latency: time (in s) the fake server takes to answer each request
+    :type latency: float
+    :return: results for each module
+    :rtype: dict
+    """
+    results = {}
+    with FakeSpotify(playlists={PLAYLIST_ID: 100}, devices=[DEVICE_NAME], latency=latency) as spotify:
+        app_dir = make_sandbox(spotify, root=root)
+        for module in MODULES:
+            sent = len(spotify.requests)
+            times = [time_import(app_dir, module) for _ in range(runs)]
+            if None in times:
+                results[module] = {"failed": True}
+                continue
+            times = sorted(times)
+            results[module] = {"p50": median(times)*1000, "p90": times[int(0.9*(len(times)-1))]*1000, "max": times[-1]*1000,
+                               "requests": (len(spotify.requests) - sent)/runs}
+        os.remove(os.path.join(app_dir, "..", "config.yaml"))
+        for module in MODULES:
+            results[module]["without config"] = time_import(app_dir, module) is not None
+        shutil.rmtree(os.path.dirname(app_dir))
+    return results
+
+def report(results : dict):
+    """Prints a table of results.
+
+    :param results: results from measure
+    :type results: dict
+    """
+    print(f"{'module':<16}{'p50':>9}{'p90':>9}{'max':>9}  (ms){'requests':>10}{'no config.yaml':>16}")
+    for module, stats in results.items():
+        without_config = "imports" if stats["without config"] else "fails"
+        if stats.get("failed"):
+            print(f"{module:<16}{'import failed':>27}{'':>18}{without_config:>16}")
+            continue
+        print(f"{module:<16}{stats['p50']:>9.1f}{stats['p90']:>9.1f}{stats['max']:>9.1f}{'':>6}{stats['requests']:>10g}{without_config:>16}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20, help="number of times to import each module")
+    parser.add_argument("--latency", type=float, default=0.05, help="time (in s) the fake server takes to answer each request")
+    parser.add_argument("--root", default="../", help="checkout of the jukebox to measure")
+    parser.add_argument("--json", help="file to also write the results to")
+    args = parser.parse_args()
+    results = measure(os.path.abspath(args.root), args.runs, args.latency)
+    print(f"{args.runs} imports of each module, {args.latency*1000:g}ms server latency")
+    report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
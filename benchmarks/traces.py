@@ -0,0 +1,98 @@
+"""Analysis of traces of button presses, as written by the jukebox (see src/tracing.py).
+
+Press the secret dump code (98) on the jukebox to write the recent traces to src/traces.jsonl, copy the file
+off the Pi, then run from this directory:
+
+    python traces.py traces.jsonl [more.jsonl ...] [--target 300] [--outcome played] [--slowest 5]
+
+For each outcome (e.g "played", "page shown"), prints how long presses took from pigpio's callback to being
+dealt with, how many missed the target, and how long was spent between each pair of stages, so the slowest
+stage can be worked on.
+"""
+
+import json
+import argparse
+from common import percentile
+
+def load(filepaths : list) -> list:
+    """
+    :param filepaths: files of traces (one JSON object per line)
+    :type filepaths: list
+    :return: the traces, each only once (the same trace can be in several dumps)
+    :rtype: list
+    """
+    traces = {}
+    for filepath in filepaths:
+        with open(filepath, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    trace = json.loads(line)
+                    traces[(trace["started"], trace["id"])] = trace
+    return list(traces.values())
+
+def summarise(values : list) -> dict:
+    """
+    :param values: values to summarise
+    :type values: list
+    :return: count, mean, p50, p90, p99 and max of the values
+    :rtype: dict
+    """
+    return {"count": len(values), "mean": sum(values)/len(values), "p50": percentile(values, 50), "p90": percentile(values, 90),
+            "p99": percentile(values, 99), "max": max(values)}
+
+def breakdown(traces : list) -> dict:
+    """Works out the time spent between each pair of consecutive stages.
+
+    :param traces: traces with the same outcome
+    :type traces: list
+    :return: summary of the times (in ms) for each step (e.g "button_click -> number entered"), in the order they happen
+    :rtype: dict
+    """
+    steps = {}
+    for trace in traces:
+        stages = trace["stages"]
+        for before, after in zip(stages, stages[1:]):
+            steps.setdefault(f"{before['stage']} -> {after['stage']}", []).append(after["at"] - before["at"])
+    return {step: summarise(times) for step, times in steps.items()}
+
+def report(traces : list, target : float, slowest : int):
+    """Prints a summary of the traces, for each outcome.
+
+    :param traces: the traces
+    :type traces: list
+    :param target: time (in ms) each press should be dealt with in
+    :type target: float
+    :param slowest: number of the slowest traces to print the stages of
+    :type slowest: int
+    """
+    outcomes = {}
+    for trace in traces:
+        outcomes.setdefault(trace["outcome"], []).append(trace)
+    for outcome, outcome_traces in sorted(outcomes.items(), key=lambda item: -len(item[1])):
+        durations = [trace["duration"] for trace in outcome_traces]
+        stats = summarise(durations)
+        missed = sum(duration > target for duration in durations)
+        print(f"\n{outcome}: {stats['count']} presses, p50 {stats['p50']:.1f}ms, p90 {stats['p90']:.1f}ms, p99 {stats['p99']:.1f}ms, "
+              f"max {stats['max']:.1f}ms, {missed} over {target:g}ms")
+        print(f"  {'step':<44}{'mean':>9}{'p50':>9}{'p90':>9}{'max':>9}  (ms){'share':>8}")
+        for step, step_stats in breakdown(outcome_traces).items():
+            share = step_stats["mean"]*step_stats["count"]/sum(durations) if sum(durations) else 0
+            print(f"  {step:<44}{step_stats['mean']:>9.1f}{step_stats['p50']:>9.1f}{step_stats['p90']:>9.1f}{step_stats['max']:>9.1f}{'':>6}{share:>7.0%}")
+        for trace in sorted(outcome_traces, key=lambda trace: -trace["duration"])[:slowest]:
+            if trace["duration"] <= target:
+                break
+            stages = ", ".join(f"{stage['stage']} {stage['at']:.0f} ({stage['thread']})" for stage in trace["stages"])
+            print(f"  slow: #{trace['id']} at {trace['started']}, {trace['duration']:.0f}ms: {stages}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="+", help="files of traces dumped by the jukebox")
+    parser.add_argument("--target", type=float, default=300, help="time (in ms) each press should be dealt with in")
+    parser.add_argument("--outcome", help="only analyse presses with this outcome (e.g played)")
+    parser.add_argument("--slowest", type=int, default=5, help="number of the slowest presses over the target to show")
+    args = parser.parse_args()
+    traces = [trace for trace in load(args.files) if not args.outcome or trace["outcome"] == args.outcome]
+    if not traces:
+        print("No traces.")
+    else:
+        report(traces, args.target, args.slowest)
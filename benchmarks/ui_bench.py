@@ -0,0 +1,232 @@
+"""Headless benchmark of the jukebox interface.
+
+Runs MainWindow offscreen, with a fake pigpio and the local fake spotify server (tests/fake_spotify.py), so no
+Pi, display, network or credentials are needed. A script of button presses (page flips, song picks and
+pause/play) is played through the GPIO callbacks a number of times, reporting how long each kind of action
+takes to complete (until the page is shown, or the fake server has finished sending its response to the play or
+pause request), how regularly the GUI thread manages to draw frames, and memory use. Run from this directory:
+
+    python ui_bench.py [--rounds 5] [--tracks 500] [--latency 0.05] [--json results.json]
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import resource
+import importlib
+import threading
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+REPO_DIR = os.path.abspath("../")
+sys.path.append(REPO_DIR)  # Allows for below imports
+sys.path.append(os.path.join(REPO_DIR, "tests"))
+import fake_pigpio
+sys.modules["pigpio"] = fake_pigpio  # Must be in place before app.run is imported
+from PySide6 import QtWidgets, QtCore
+from fake_spotify import FakeSpotify
+from common import make_sandbox, percentile, PLAYLIST_ID, DEVICE_NAME
+
+# Keys pressed in each round, in order (song picks avoid the last song on a page)
+SCRIPT = ["forward", "forward", "forward", "02", "backward", "00", "05", "backward", "backward", "backward", "00", "forward"]
+# Time (in s) between pressing the keys of a two-digit number, and between actions
+KEY_GAP = 0.15
+ACTION_GAP = 0.3
+# Interval (in ms) of the timer measuring frame times (60fps)
+FRAME_INTERVAL = 16
+TIMEOUT = 10
+
+def rss() -> float:
+    """
+    :return: current resident memory (in MB)
+    :rtype: float
+    """
+    with open("/proc/self/statm", encoding="utf-8") as f:
+        return int(f.read().split()[1])*os.sysconf("SC_PAGE_SIZE")/1e6
+
+class Benchmark(QtCore.QObject):
+    """Plays the script of button presses against a MainWindow, timing each action.
+    """
+    measure_frames = QtCore.Signal(bool)
+    finished = QtCore.Signal()
+
+    def __init__(self, run, spotify : FakeSpotify, rounds : int):
+        """Must be created on the GUI thread.
+
+        :param run: the app.run module
+        :type run: module
+        :param spotify: the fake server the window is talking to
+        :type spotify: FakeSpotify
+        :param rounds: number of times to play the script
+        :type rounds: int
+        """
+        super().__init__()
+        self.rounds = rounds
+        self.pins = {str(name): pin for pin, name in run.BUTTONS.items()}
+        self.completions = queue.SimpleQueue()
+        spotify.add_listener(lambda answered, method, path: self.completions.put((answered, f"{method} {path}")))
+        self.latencies = {}
+        self.frames = []
+        self.last_frame = None
+        self.memory = {}
+        # Frames are measured by how regularly a 60fps timer manages to fire on the GUI thread
+        self.frame_timer = QtCore.QTimer(self)
+        self.frame_timer.setTimerType(QtCore.Qt.TimerType.PreciseTimer)
+        self.frame_timer.setInterval(FRAME_INTERVAL)
+        self.frame_timer.timeout.connect(self.frame)
+        self.measure_frames.connect(self.set_measuring)
+        self.start = time.perf_counter()
+        self.window = run.MainWindow()
+        self.window.page_load = self.timed_page_load(self.window.page_load)
+        self.pi = run.setup_gpio(self.window)
+        self.window.show()
+        self.finished.connect(QtWidgets.QApplication.quit, QtCore.Qt.ConnectionType.QueuedConnection)
+        self.driver = threading.Thread(target=self.drive, name="benchmark-driver", daemon=True)
+        self.driver.start()
+
+    def set_measuring(self, measuring : bool):
+        if measuring:
+            self.frame_timer.start()
+        else:
+            self.frame_timer.stop()
+
+    def timed_page_load(self, page_load):
+        def timed():
+            page_load()
+            self.completions.put((time.perf_counter(), "page"))
+        return timed
+
+    def frame(self):
+        now = time.perf_counter()
+        if self.last_frame is not None:
+            self.frames.append((now - self.last_frame)*1000)
+        self.last_frame = now
+
+    def wait_for(self, match) -> float:
+        """Waits until the window has shown a page, or the fake server has finished answering a request.
+
+        :param match: "page", or the method and path of the request (e.g "PUT /v1/me/player/pause")
+        :type match: str
+        :raises TimeoutError: if it doesn't happen in time
+        :return: when it happened (from time.perf_counter)
+        :rtype: float
+        """
+        deadline = time.monotonic() + TIMEOUT
+        while True:
+            try:
+                when, what = self.completions.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty as e:
+                raise TimeoutError(f"timed out waiting for {match}") from e
+            if what.startswith(match):
+                return when
+
+    def press(self, keys : str) -> float:
+        """Presses the buttons for an action.
+
+        :param keys: "forward", "backward", or a two-digit number
+        :type keys: str
+        :return: when the last button was pressed (from time.perf_counter)
+        :rtype: float
+        """
+        if keys in self.pins:
+            pressed = time.perf_counter()
+            self.pi.press(self.pins[keys])
+            return pressed
+        for i, digit in enumerate(keys):
+            if i:
+                time.sleep(KEY_GAP)
+            pressed = time.perf_counter()
+            self.pi.press(self.pins[digit])
+        return pressed
+
+    def action(self, keys : str) -> tuple:
+        """Works out what pressing some keys should do, based on what the window is showing.
+
+        :param keys: "forward", "backward", or a two-digit number
+        :type keys: str
+        :return: name of the action, and what to wait for
+        :rtype: tuple
+        """
+        if keys == "00":
+            # The window flips self.playing when the key is pressed, so look before pressing
+            return "pause/play", "PUT /v1/me/player/pause" if self.window.playing else "PUT /v1/me/player/play"
+        if keys.isdigit():
+            return "pick song", "PUT /v1/me/player/play?device_id="
+        step = 1 if keys == "forward" else -1
+        wraps = not 0 <= self.window.active_page + step < len(self.window.pages)
+        return "page wrap" if wraps else "page flip", "page"
+
+    def drive(self):
+        """Plays the script (runs on its own thread, pressing buttons like pigpio's callback thread).
+        """
+        try:
+            boot = self.wait_for("page")
+            self.latencies["boot to first page"] = [(boot - self.start)*1000]
+            self.memory["after boot"] = rss()
+            self.measure_frames.emit(True)
+            for _ in range(self.rounds):
+                for keys in SCRIPT:
+                    time.sleep(ACTION_GAP)
+                    name, match = self.action(keys)
+                    while not self.completions.empty():
+                        self.completions.get()
+                    pressed = self.press(keys)
+                    done = self.wait_for(match)
+                    self.latencies.setdefault(name, []).append((done - pressed)*1000)
+            self.memory["at end"] = rss()
+        except TimeoutError as e:
+            print(str(e))
+        finally:
+            self.measure_frames.emit(False)
+            self.finished.emit()
+
+    def results(self) -> dict:
+        """
+        :return: percentiles (in ms) of each kind of action and of frame intervals, and memory use (in MB)
+        :rtype: dict
+        """
+        results = {"actions": {}, "memory": dict(self.memory)}
+        for name, times in self.latencies.items():
+            results["actions"][name] = {"count": len(times), "p50": percentile(times, 50), "p90": percentile(times, 90),
+                                        "p99": percentile(times, 99), "max": max(times)}
+        if self.frames:
+            results["frames"] = {"count": len(self.frames), "p50": percentile(self.frames, 50), "p95": percentile(self.frames, 95),
+                                 "p99": percentile(self.frames, 99), "max": max(self.frames),
+                                 "late": sum(interval > 2*FRAME_INTERVAL for interval in self.frames)}
+        results["memory"]["peak"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss*1024/1e6  # ru_maxrss is in KiB
+        return results
+
+def report(results : dict):
+    print(f"{'action':<20}{'count':>6}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}  (ms)")
+    for name, stats in results["actions"].items():
+        print(f"{name:<20}{stats['count']:>6}{stats['p50']:>9.1f}{stats['p90']:>9.1f}{stats['p99']:>9.1f}{stats['max']:>9.1f}")
+    if "frames" in results:
+        frames = results["frames"]
+        print(f"{'frame interval':<20}{'count':>6}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)")
+        print(f"{f'{FRAME_INTERVAL}ms timer':<20}{frames['count']:>6}{frames['p50']:>9.1f}{frames['p95']:>9.1f}{frames['p99']:>9.1f}{frames['max']:>9.1f}"
+              f"  {frames['late']} late by a frame or more")
+    memory = results["memory"]
+    print("memory (MB): " + ", ".join(f"{name} {value:.1f}" for name, value in memory.items()))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=5, help="number of times to play the script of button presses")
+    parser.add_argument("--tracks", type=int, default=500, help="number of tracks in the playlist")
+    parser.add_argument("--songs", type=int, default=20, help="number of songs per page")
+    parser.add_argument("--latency", type=float, default=0.05, help="time (in s) the fake server takes to answer each request")
+    parser.add_argument("--json", help="file to also write the results to")
+    args = parser.parse_args()
+    json_file = os.path.abspath(args.json) if args.json else None
+    spotify = FakeSpotify(playlists={PLAYLIST_ID: args.tracks}, devices=[DEVICE_NAME], latency=args.latency).start()
+    os.chdir(make_sandbox(spotify, args.songs))
+    app = QtWidgets.QApplication(sys.argv)
+    benchmark = Benchmark(importlib.import_module("app.run"), spotify, args.rounds)
+    app.exec()
+    spotify.stop()
+    results = benchmark.results()
+    print(f"{args.rounds} rounds of {len(SCRIPT)} actions, {args.tracks} tracks, {args.latency*1000:g}ms server latency")
+    report(results)
+    if json_file:
+        with open(json_file, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,171 @@
+"""Boot timeline for the jukebox software.
+
+Records when each phase of booting the jukebox (importing the heavy modules, connecting to pigpio, setting up
+the interface, reading the config and secrets, fetching and showing the first page...) starts and ends, timed
+from when the process started. Once the first page has been shown, the timeline is written to a JSON file
+(BOOT_LOG_FILE, or the JUKEBOX_BOOT_LOG environment variable) and the slowest phases are printed.
+
+If the JUKEBOX_PROFILE environment variable is set, the main thread is also profiled with cProfile from when
+the timeline is created until boot finishes, and the stats written to the file it names (read them with pstats,
+or a viewer such as snakeviz).
+
+The timeline is created on first use (see get_timeline), so importing this module does no I/O; app/run.py gets
+it before importing anything else. Only the standard library is imported here, so this module can be imported
+before anything else is.
+"""
+
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+# Where the timeline is written, relative to the working directory
+BOOT_LOG_FILE = os.environ.get("JUKEBOX_BOOT_LOG") or "../src/boot_timeline.json"
+PROFILE_FILE = os.environ.get("JUKEBOX_PROFILE")
+# Number of phases printed once boot has finished
+SLOWEST_PHASES = 5
+
+def process_age() -> float:
+    """
+    :return: time (in s) since the process started (to the nearest clock tick), 0 if it can't be found (i.e. not on linux)
+    :rtype: float
+    """
+    try:
+        with open("/proc/self/stat", encoding="utf-8") as f:
+            # The command name (field 2) may contain spaces, so count fields from after it
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime", encoding="utf-8") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, IndexError, ValueError):
+        return 0
+    return max(uptime - start_ticks/os.sysconf("SC_CLK_TCK"), 0)
+
+class BootTimeline:
+    """Timestamped record of the phases of booting, each recorded once (the first time it happens).
+    """
+    def __init__(self, log_file : str = None, profile_file : str = None):
+        """
+        :param log_file: file to write the timeline to once boot has finished, defaults to None (not written)
+        :type log_file: str, optional
+        :param profile_file: file to write cProfile stats of the boot to, defaults to None (not profiled)
+        :type profile_file: str, optional
+        """
+        self.origin = time.perf_counter() - process_age()
+        self.started_at = time.time() - process_age()
+        self.log_file = log_file
+        self.phases = []
+        self.open = {}
+        self.lock = threading.Lock()
+        self.finished = False
+        self.profiler = None
+        self.profile_file = profile_file
+        if profile_file:
+            import cProfile  # Only needed when profiling
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        # Everything from the process starting up to here is the interpreter (and whatever imported this)
+        self.record("python startup", 0, self.now())
+
+    def now(self) -> float:
+        """
+        :return: time (in s) since the process started
+        :rtype: float
+        """
+        return time.perf_counter() - self.origin
+
+    def record(self, name : str, start : float, end : float):
+        """Adds a phase to the timeline, unless it has already been recorded or boot has finished.
+
+        :param name: name of the phase
+        :type name: str
+        :param start: when the phase started (in s since the process started)
+        :type start: float
+        :param end: when the phase ended (in s since the process started)
+        :type end: float
+        """
+        with self.lock:
+            if self.finished or any(phase["name"] == name for phase in self.phases):
+                return
+            self.phases.append({"name": name, "start": start, "end": end, "duration": end - start,
+                                "thread": threading.current_thread().name})
+
+    @contextmanager
+    def phase(self, name : str):
+        """Records the time taken by the enclosed block as a phase (if it ends without raising).
+
+        :param name: name of the phase
+        :type name: str
+        """
+        start = self.now()
+        yield
+        self.record(name, start, self.now())
+
+    def begin(self, name : str):
+        """Starts a phase that ends somewhere else (e.g in a callback), see end.
+
+        :param name: name of the phase
+        :type name: str
+        """
+        with self.lock:
+            self.open.setdefault(name, self.now())
+
+    def end(self, name : str):
+        """Ends a phase started with begin.
+
+        :param name: name of the phase
+        :type name: str
+        """
+        with self.lock:
+            start = self.open.pop(name, None)
+        if start is not None:
+            self.record(name, start, self.now())
+
+    def finish(self):
+        """Marks boot as finished (a usable screen), writing out the timeline and any profile, and printing
+        the slowest phases. Only the first call does anything.
+        """
+        self.record("usable", self.now(), self.now())
+        with self.lock:
+            if self.finished:
+                return
+            self.finished = True
+        if self.profiler:
+            self.profiler.disable()
+            try:
+                self.profiler.dump_stats(self.profile_file)
+            except OSError as e:
+                print(str(e))
+        if self.log_file:
+            try:
+                with open(self.log_file, "w", encoding="utf-8") as f:
+                    json.dump(self.to_dict(), f, indent=2)
+            except OSError as e:
+                print(str(e))
+        slowest = sorted(self.phases, key=lambda phase: phase["duration"], reverse=True)[:SLOWEST_PHASES]
+        print(f"Booted in {self.now():.2f}s (slowest: " + ", ".join(f"{phase['name']} {phase['duration']:.2f}s" for phase in slowest) + ")")
+
+    def to_dict(self) -> dict:
+        """
+        :return: the timeline, with phases in the order they started
+        :rtype: dict
+        """
+        with self.lock:
+            phases = sorted(self.phases, key=lambda phase: phase["start"])
+        return {"started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)), "total": self.now(), "phases": phases}
+
+# Timeline of this process's boot
+timeline = None
+timeline_lock = threading.Lock()
+
+def get_timeline() -> BootTimeline:
+    """Retrieves the timeline of this process's boot, creating it (and starting any profiling) on first use.
+
+    :return: the boot timeline
+    :rtype: BootTimeline
+    """
+    global timeline
+    with timeline_lock:
+        if timeline is None:
+            timeline = BootTimeline(BOOT_LOG_FILE, PROFILE_FILE)
+        return timeline
@@ -0,0 +1,87 @@
+"""Persistent on-disk cache of playlists for the jukebox software.
+
+Stores the title, artist and uri of every track in a playlist (along with the playlist's snapshot_id) in a
+small SQLite database, so that the jukebox can show songs immediately on boot, and even while offline,
+before the playlist has been checked against the spotify web API.
+"""
+
+import sqlite3
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS playlists (
+    playlist_id TEXT PRIMARY KEY,
+    snapshot_id TEXT NOT NULL,
+    saved_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tracks (
+    playlist_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    artist TEXT NOT NULL,
+    uri TEXT NOT NULL,
+    PRIMARY KEY (playlist_id, position)
+) WITHOUT ROWID;
+"""
+
+class PlaylistCache:
+    """Cache holding the most recent snapshot of each playlist.
+    """
+    def __init__(self, filepath : str):
+        """
+        :param filepath: location of the cache database
+        :type filepath: str
+        """
+        self.filepath = filepath
+
+    def connect(self) -> sqlite3.Connection:
+        """Opens a connection to the cache database, creating the tables if needed.
+
+        :return: the connection
+        :rtype: sqlite3.Connection
+        """
+        connection = sqlite3.connect(self.filepath)
+        connection.executescript(SCHEMA)
+        return connection
+
+    def load(self, playlist_id : str) -> tuple:
+        """Retrieves the cached snapshot of a playlist.
+
+        :param playlist_id: ID of the playlist
+        :type playlist_id: str
+        :return: (snapshot_id, tracks) where tracks is a list of (title, artist, uri), or None if the playlist isn't cached
+        :rtype: tuple
+        """
+        try:
+            connection = self.connect()
+        except sqlite3.Error:
+            return None
+        try:
+            row = connection.execute("SELECT snapshot_id FROM playlists WHERE playlist_id=?", (playlist_id,)).fetchone()
+            if row is None:
+                return None
+            tracks = connection.execute("SELECT title, artist, uri FROM tracks WHERE playlist_id=? ORDER BY position", (playlist_id,)).fetchall()
+            return row[0], tracks
+        except sqlite3.Error:
+            return None  # A damaged cache just means downloading the playlist as normal
+        finally:
+            connection.close()
+
+    def save(self, playlist_id : str, snapshot_id : str, tracks : list):
+        """Replaces the cached snapshot of a playlist.
+
+        :param playlist_id: ID of the playlist
+        :type playlist_id: str
+        :param snapshot_id: snapshot_id of the playlist
+        :type snapshot_id: str
+        :param tracks: (title, artist, uri) of each track
+        :type tracks: list
+        """
+        connection = self.connect()
+        try:
+            with connection:  # Single transaction, so the cache is never left half-written
+                connection.execute("DELETE FROM tracks WHERE playlist_id=?", (playlist_id,))
+                connection.executemany("INSERT INTO tracks VALUES (?, ?, ?, ?, ?)", ((playlist_id, i, *track) for i, track in enumerate(tracks)))
+                connection.execute("INSERT OR REPLACE INTO playlists VALUES (?, ?, ?)", (playlist_id, snapshot_id, time.time()))
+        finally:
+            connection.close()
@@ -0,0 +1,169 @@
+"""Asyncio client for the spotify web API.
+
+Exposes the operations used by the jukebox (getting a playlist, getting a page of tracks, playing a song,
+pausing/resuming and listing devices) as coroutines, so that many requests can be in flight at once and
+callers such as the interface can await them without blocking.
+
+Requests are sent through the same pooled sessions and credential store as utils.request, which remains
+the blocking entry point (e.g for the command-line interface in jukebox.py). Each request is run on a
+worker thread from a pool sized to match the connection pool. The timeout applies to each http attempt,
+not to time spent waiting for a worker or for the rate limiter; cancelling the awaiting task before the
+request has started means it's never sent, though one already being sent is seen through.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+if __package__:
+    from src import utils
+else:
+    import utils
+
+class SpotifyClient:
+    """Asynchronous spotify web API client.
+    """
+    def __init__(self, secrets_file : str = "../src/secrets.json", max_concurrency : int = None, timeout : float = 5):
+        """
+        :param secrets_file: location of secrets file, defaults to "../src/secrets.json"
+        :type secrets_file: str, optional
+        :param max_concurrency: maximum number of requests in flight at once, defaults to the connection pool size
+        :type max_concurrency: int, optional
+        :param timeout: default time (in s) to wait for a response to each http attempt before giving up, defaults to 5
+        :type timeout: float, optional
+        """
+        self.secrets_file = secrets_file
+        self.timeout = timeout
+        if not max_concurrency:
+            max_concurrency = utils.config.get("pool_size") or utils.DEFAULT_POOL_SIZE
+        self.max_concurrency = max_concurrency
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="spotify-client")
+
+    async def request(self, request_type : str, url : str, headers : dict = None, data : str = None, timeout : float = None) -> dict:
+        """Makes an authorised http request without blocking the event loop.
+
+        :param request_type: type of http request to make (GET, POST or PUT)
+        :type request_type: str
+        :param url: url to request
+        :type url: str
+        :param headers: any headers required for the http request (EXCLUDING authorization header), defaults to None
+        :type headers: dict, optional
+        :param data: any data required for the http request, defaults to None
+        :type data: str, optional
+        :param timeout: how long to wait (in s) for a response to each http attempt before giving up, defaults to the client's timeout
+        :type timeout: float, optional
+        :raises requests.exceptions.Timeout: if no response is received in time
+        :return: the json response
+        :rtype: dict
+        """
+        if timeout is None:
+            timeout = self.timeout
+        cancelled = threading.Event()
+        call = partial(self.send, cancelled, request_type, url, headers, data, timeout)
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.executor, call)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    def send(self, cancelled : threading.Event, request_type : str, url : str, headers : dict, data : str, timeout : float) -> dict:
+        """Makes a request on a worker thread, unless it was cancelled while waiting for one.
+
+        :param cancelled: set if the awaiting task was cancelled
+        :type cancelled: threading.Event
+        :raises asyncio.CancelledError: if the request was cancelled before it started
+        :return: the json response
+        :rtype: dict
+        """
+        if cancelled.is_set():
+            raise asyncio.CancelledError()
+        return utils.request(request_type, url, secrets_file=self.secrets_file, headers=headers, data=data, timeout=timeout)
+
+    async def get_playlist(self, playlist_id : str, fields : str = None) -> dict:
+        """Retrieves a playlist.
+
+        :param playlist_id: ID of the playlist
+        :type playlist_id: str
+        :param fields: comma-separated list of the fields to return (e.g "snapshot_id"), defaults to all fields
+        :type fields: str, optional
+        :return: the playlist object
+        :rtype: dict
+        """
+        url = utils.api_url(f"/playlists/{playlist_id}")
+        if fields:
+            url += f"?fields={fields}"
+        return await self.request("GET", url)
+
+    async def get_tracks(self, playlist_id : str, offset : int = 0, limit : int = 100, fields : str = None) -> dict:
+        """Retrieves a page of tracks from a playlist.
+
+        :param playlist_id: ID of the playlist
+        :type playlist_id: str
+        :param offset: index of the first track to get, defaults to 0
+        :type offset: int, optional
+        :param limit: number of tracks to get (at most 100), defaults to 100
+        :type limit: int, optional
+        :param fields: fields to return (e.g "items(track(name))"), defaults to all fields
+        :type fields: str, optional
+        :return: the paging object containing the tracks
+        :rtype: dict
+        """
+        url = utils.api_url(f"/playlists/{playlist_id}/tracks?limit={limit}&offset={offset}")
+        if fields:
+            url += f"&fields={fields}"
+        return await self.request("GET", url)
+
+    async def play(self, uri : str, device_id : str = None):
+        """Plays a song.
+
+        :param uri: spotify uri of the song
+        :type uri: str
+        :param device_id: device to play the song on, defaults to the currently active device
+        :type device_id: str, optional
+        """
+        headers = {"Content-Type": "application/json"}
+        data = f'{{"uris": ["{uri}"],"position_ms": 0}}'
+        url = utils.api_url("/me/player/play")
+        if device_id:
+            url += f"?device_id={device_id}"
+        return await self.request("PUT", url, headers=headers, data=data)
+
+    async def pause(self):
+        """Pauses playback.
+        """
+        return await self.request("PUT", utils.api_url("/me/player/pause"))
+
+    async def resume(self):
+        """Resumes playback.
+        """
+        return await self.request("PUT", utils.api_url("/me/player/play"))
+
+    async def get_devices(self) -> list:
+        """Lists the devices available for playback.
+
+        :return: the device objects
+        :rtype: list
+        """
+        return (await self.request("GET", utils.api_url("/me/player/devices")))["devices"]
+
+    def close(self):
+        """Shuts down the client's worker threads.
+        """
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+# Client shared by the whole application
+shared_client = None
+client_lock = threading.Lock()
+
+def get_client() -> SpotifyClient:
+    """Retrieves the client shared by the whole application, creating it on first use.
+
+    :return: the shared client
+    :rtype: SpotifyClient
+    """
+    global shared_client
+    with client_lock:
+        if shared_client is None:
+            shared_client = SpotifyClient()
+        return shared_client
@@ -0,0 +1,130 @@
+"""Application context for the jukebox software.
+
+Brings together everything the jukebox needs from outside the process: the user-provided config, the api
+credentials, the client for the spotify web API, the registry of devices to play on and the request metrics.
+Each of these is created on first use rather than when its module is imported, so importing the jukebox does
+no I/O, and start can get them ready in the background while the interface is shown.
+"""
+
+import threading
+if __package__:
+    from src import utils
+    from src.boot import get_timeline
+    from src.client import get_client, SpotifyClient
+    from src.credentials import CredentialStore
+    from src.devices import get_devices, DeviceRegistry
+    from src.metrics import get_metrics, serve, RequestMetrics
+    from src.scheduler import RequestScheduler
+else:
+    import utils
+    from boot import get_timeline
+    from client import get_client, SpotifyClient
+    from credentials import CredentialStore
+    from devices import get_devices, DeviceRegistry
+    from metrics import get_metrics, serve, RequestMetrics
+    from scheduler import RequestScheduler
+
+class AppContext:
+    """Lazily-created application state, shared by the whole jukebox.
+    """
+    def __init__(self, secrets_file : str = "../src/secrets.json"):
+        """
+        :param secrets_file: location of secrets file, defaults to "../src/secrets.json"
+        :type secrets_file: str, optional
+        """
+        self.secrets_file = secrets_file
+        self.started = threading.Event()
+        self.metrics_server = None
+
+    @property
+    def config(self) -> dict:
+        """
+        :return: the user-provided config, read from config.yaml on first use
+        :rtype: dict
+        """
+        return utils.get_config()
+
+    @property
+    def credentials(self) -> CredentialStore:
+        """
+        :return: the api credentials, read from the secrets file on first use
+        :rtype: CredentialStore
+        """
+        return utils.get_credentials(self.secrets_file)
+
+    @property
+    def scheduler(self) -> RequestScheduler:
+        """
+        :return: the scheduler every request is sent through
+        :rtype: RequestScheduler
+        """
+        return utils.get_scheduler()
+
+    @property
+    def client(self) -> SpotifyClient:
+        """
+        :return: the client for the spotify web API
+        :rtype: SpotifyClient
+        """
+        return get_client()
+
+    @property
+    def devices(self) -> DeviceRegistry:
+        """
+        :return: the registry of devices to play songs on
+        :rtype: DeviceRegistry
+        """
+        return get_devices()
+
+    @property
+    def metrics(self) -> RequestMetrics:
+        """
+        :return: the metrics of every request made
+        :rtype: RequestMetrics
+        """
+        return get_metrics()
+
+    def start(self):
+        """Gets the config, credentials and device ready on a background thread (once only), so that the first
+        button press doesn't have to wait for them. The device is then looked up again every DEVICE_CHECK_INTERVAL.
+        """
+        if self.started.is_set():
+            return
+        self.started.set()
+        threading.Thread(target=self.prepare, name="context-prepare", daemon=True).start()
+
+    def prepare(self):
+        """Reads the config and credentials, then starts looking up the device (runs on a background thread).
+        Also starts serving the request metrics, if a metrics_port is set in config.yaml.
+        """
+        if utils.METRICS_PORT and not self.metrics_server:
+            try:
+                self.metrics_server = serve(self.metrics, utils.METRICS_PORT)
+            except OSError as e:
+                print(str(e))
+        try:
+            with get_timeline().phase("credentials"):
+                self.credentials.get()
+        except Exception as e:
+            print(str(e))
+            return
+        if utils.DEVICE_CHECK_INTERVAL:
+            self.devices.watch(utils.DEVICE_CHECK_INTERVAL)
+        else:
+            self.devices.refresh_in_background()
+
+# Context shared by the whole application
+context = None
+context_lock = threading.Lock()
+
+def get_context() -> AppContext:
+    """Retrieves the context shared by the whole application, creating it on first use.
+
+    :return: the shared context
+    :rtype: AppContext
+    """
+    global context
+    with context_lock:
+        if context is None:
+            context = AppContext()
+        return context
@@ -0,0 +1,248 @@
+"""In-memory credential store for the jukebox software.
+
+Keeps the contents of the secrets file (api key and refresh token) in memory so that requests
+don't have to touch the disk. Updates are written back to the file atomically on a background thread,
+and the file is only re-read if it has been changed by something else (i.e. its mtime has changed).
+
+Also keeps track of when the api key expires (using the expires_in value from the token endpoint) and
+refreshes it on a background timer shortly before then, so that requests never have to wait on a refresh.
+"""
+
+import os
+import json
+import time
+import tempfile
+import threading
+from collections.abc import Callable
+
+class CredentialStore:
+    """Process-wide cache of the secrets held in a single secrets file.
+    """
+    def __init__(self, filepath : str, loader : Callable, refresher : Callable = None, check_interval : float = 5, refresh_margin : float = 300, retry_interval : float = 30):
+        """
+        :param filepath: location of secrets file (usually secrets.json)
+        :type filepath: str
+        :param loader: function used to (re)load the secrets from the file, e.g utils.get_secrets
+        :type loader: Callable
+        :param refresher: function taking the current secrets and returning the token endpoint's json response,
+            defaults to None (no proactive refreshing)
+        :type refresher: Callable, optional
+        :param check_interval: minimum time (in s) between checks of the file's mtime, defaults to 5
+        :type check_interval: float, optional
+        :param refresh_margin: how long (in s) before expiry to refresh the api key, defaults to 300
+        :type refresh_margin: float, optional
+        :param retry_interval: how long (in s) to wait before retrying a failed background refresh, defaults to 30
+        :type retry_interval: float, optional
+        """
+        self.filepath = filepath
+        self.loader = loader
+        self.refresher = refresher
+        self.check_interval = check_interval
+        self.refresh_margin = refresh_margin
+        self.retry_interval = retry_interval
+        self.refresh_lock = threading.Lock()
+        self.timer = None
+        self.secrets = None
+        self.mtime = None
+        self.last_check = 0
+        self.lock = threading.Lock()
+        self.pending = None
+        self.write_event = threading.Event()
+        self.idle = threading.Event()
+        self.idle.set()
+        self.writer = None
+
+    def get(self) -> dict:
+        """Retrieves the secrets, only reading the file if it hasn't been read yet or has changed on disk.
+
+        :return: a copy of the secrets as a dictionary
+        :rtype: dict
+        """
+        with self.lock:
+            now = time.monotonic()
+            if self.secrets is None:
+                self.load()
+            elif self.pending is None and now - self.last_check >= self.check_interval:
+                self.last_check = now
+                if self.file_mtime() != self.mtime:
+                    self.load()
+            secrets = dict(self.secrets)
+        # Only happens if the background refresh couldn't keep up (e.g after the system was suspended)
+        if self.refresher and self.expired(secrets):
+            secrets = self.refresh(secrets["access_token"])
+        return secrets
+
+    def expired(self, secrets : dict) -> bool:
+        """Checks whether the api key in the given secrets has expired.
+
+        :param secrets: secrets to check
+        :type secrets: dict
+        :return: True if the api key is known to have expired
+        :rtype: bool
+        """
+        expires_at = secrets.get("expires_at")
+        return expires_at is not None and expires_at <= time.time()
+
+    def refresh(self, stale_token : str = None) -> dict:
+        """Obtains a new api key using the refresher.
+
+        Only one refresh happens at a time: callers that were waiting on another thread's refresh
+        get its result rather than refreshing again.
+
+        :param stale_token: the api key the caller found to be expired, defaults to None (always refresh)
+        :type stale_token: str, optional
+        :return: a copy of the secrets with the new api key
+        :rtype: dict
+        """
+        with self.refresh_lock:
+            with self.lock:
+                if self.secrets is None:
+                    self.load()
+                secrets = dict(self.secrets)
+            if stale_token is not None and secrets.get("access_token") != stale_token:
+                return secrets  # Someone else already refreshed it
+            token = self.refresher(secrets)
+            changes = {"access_token": token["access_token"]}
+            if "expires_in" in token:
+                changes["expires_at"] = int(time.time()) + int(token["expires_in"])
+            if token.get("refresh_token"):
+                changes["refresh_token"] = token["refresh_token"]
+            return self.update(**changes)
+
+    def schedule_refresh(self):
+        """Sets a timer to refresh the api key shortly before it expires. Must be called with the lock held.
+        """
+        if not self.refresher:
+            return
+        if self.timer:
+            self.timer.cancel()
+        expires_at = self.secrets.get("expires_at")
+        # Unknown expiry (e.g secrets written by an older version) means refreshing straight away
+        delay = 0 if expires_at is None else max(0, expires_at - self.refresh_margin - time.time())
+        self.start_timer(delay, self.secrets.get("access_token"))
+
+    def start_timer(self, delay : float, token : str):
+        """Starts the background refresh timer.
+
+        :param delay: how long (in s) to wait before refreshing
+        :type delay: float
+        :param token: the api key to replace
+        :type token: str
+        """
+        self.timer = threading.Timer(delay, self.background_refresh, args=(token,))
+        self.timer.daemon = True
+        self.timer.start()
+
+    def background_refresh(self, token : str):
+        """Refreshes the api key from the timer thread, trying again later if it fails (e.g no network).
+
+        :param token: the api key to replace (nothing happens if it has already been replaced)
+        :type token: str
+        """
+        try:
+            self.refresh(token)
+        except Exception as e:
+            print(str(e))
+            with self.lock:
+                self.start_timer(self.retry_interval, token)
+
+    def stop(self):
+        """Stops the background refresh timer.
+        """
+        with self.lock:
+            if self.timer:
+                self.timer.cancel()
+                self.timer = None
+
+    def update(self, **changes) -> dict:
+        """Updates the secrets in memory and schedules them to be written to the secrets file.
+
+        :return: a copy of the updated secrets
+        :rtype: dict
+        """
+        with self.lock:
+            if self.secrets is None:
+                self.load()
+            self.secrets.update(changes)
+            if "expires_at" in changes:
+                self.schedule_refresh()
+            self.pending = dict(self.secrets)
+            self.idle.clear()
+            self.start_writer()
+            self.write_event.set()
+            return dict(self.secrets)
+
+    def flush(self, timeout : float = None) -> bool:
+        """Waits for any pending write to reach the disk.
+
+        :param timeout: how long to wait (in s) before giving up, defaults to waiting forever
+        :type timeout: float, optional
+        :return: whether there are no writes left pending
+        :rtype: bool
+        """
+        return self.idle.wait(timeout)
+
+    def load(self):
+        """Reads the secrets file into memory. Must be called with the lock held.
+        """
+        self.secrets = self.loader(self.filepath)
+        self.mtime = self.file_mtime()
+        self.last_check = time.monotonic()
+        self.schedule_refresh()
+
+    def file_mtime(self) -> int:
+        """Retrieves the modification time of the secrets file.
+
+        :return: mtime in ns, or None if the file doesn't exist
+        :rtype: int
+        """
+        try:
+            return os.stat(self.filepath).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def start_writer(self):
+        """Starts the background writer thread if it isn't already running. Must be called with the lock held.
+        """
+        if self.writer is None or not self.writer.is_alive():
+            self.writer = threading.Thread(target=self.write_loop, name="credential-writer", daemon=True)
+            self.writer.start()
+
+    def write_loop(self):
+        """Writes pending secrets to disk whenever they are updated. Several quick updates result in a single write.
+        """
+        while True:
+            self.write_event.wait()
+            with self.lock:
+                self.write_event.clear()
+                secrets = self.pending
+            if secrets is not None:
+                try:
+                    write_atomic(self.filepath, secrets)
+                except OSError as e:
+                    print(str(e))
+            with self.lock:
+                if self.pending is secrets:
+                    self.pending = None
+                    self.mtime = self.file_mtime()
+                    self.idle.set()
+
+def write_atomic(filepath : str, data : dict):
+    """Writes json data to a file such that readers only ever see the old or new file, never a partial one.
+
+    :param filepath: file to write to
+    :type filepath: str
+    :param data: data to write
+    :type data: dict
+    """
+    directory = os.path.dirname(os.path.abspath(filepath))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".secrets-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
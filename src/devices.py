@@ -0,0 +1,149 @@
+"""Device registry for the jukebox software.
+
+Finding the device to play songs on means listing every device on the account, so the ID of the chosen
+device is looked up once and cached. Playing a song then just uses the cached ID; it is only looked up
+again in the background (see DeviceRegistry.watch), or when playing fails because the device wasn't found.
+
+Devices can be temporarily absent (e.g a speaker that has gone to sleep). The last known ID is kept until
+another device is found, and if none of the preferred devices (device_name, then any fallback_devices in
+config.yaml) are available, a DeviceNotFoundError is raised rather than the jukebox crashing.
+"""
+
+import threading
+import time
+from collections.abc import Callable
+if __package__:
+    from src import utils
+else:
+    import utils
+
+class DeviceNotFoundError(LookupError):
+    """Raised when none of the preferred devices are available, and no device has been found before.
+    """
+
+def list_devices() -> list:
+    """
+    :return: the devices available on the account (device objects returned by the spotify web API)
+    :rtype: list
+    """
+    return utils.request("GET", utils.api_url("/me/player/devices"))["devices"]
+
+class DeviceRegistry:
+    """Cache of the ID of the device to play songs on.
+    """
+    def __init__(self, names : list, lister : Callable = list_devices):
+        """
+        :param names: names of the devices to play on, most preferred first
+        :type names: list
+        :param lister: returns the available devices, defaults to list_devices
+        :type lister: Callable, optional
+        """
+        self.names = names
+        self.lister = lister
+        self.device_id = None
+        self.device_name = None
+        self.last_refresh = None
+        self.lock = threading.Lock()
+        self.watcher = None
+        self.watching = threading.Event()
+
+    def get(self) -> str:
+        """Retrieves the ID of the device to play on, only looking it up if it has never been found.
+
+        :raises DeviceNotFoundError: if no device has been found before, and none are available now
+        :return: the device ID
+        :rtype: str
+        """
+        return self.device_id or self.refresh()
+
+    def refresh(self, stale_id : str = None) -> str:
+        """Looks up the device to play on again, keeping the last known device if none are available.
+
+        :param stale_id: ID that failed, so that if several callers find it failing, it's only looked up once, defaults to None
+        :type stale_id: str, optional
+        :raises DeviceNotFoundError: if no device has been found before, and none are available now
+        :return: the device ID
+        :rtype: str
+        """
+        with self.lock:
+            if stale_id is not None and self.device_id != stale_id:
+                return self.device_id  # Already looked up again since the caller's attempt
+            device = choose_device(self.lister(), self.names)
+            self.last_refresh = time.monotonic()
+            if device:
+                self.device_id = device["id"]
+                self.device_name = device["name"]
+            elif not self.device_id:
+                raise DeviceNotFoundError(f"none of the devices {', '.join(map(str, self.names))} are available.")
+            return self.device_id
+
+    def refresh_in_background(self):
+        """Runs refresh once on a background thread. If it fails, the last known device is kept.
+        """
+        def refresh():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(str(e))
+        threading.Thread(target=refresh, name="device-refresh", daemon=True).start()
+
+    def watch(self, interval : float):
+        """Starts looking up the device in the background, straight away and then every interval.
+
+        :param interval: time (in s) between lookups
+        :type interval: float
+        """
+        if self.watching.is_set():
+            return
+        self.watching.set()
+        self.watcher = threading.Thread(target=self.watch_loop, args=(interval,), name="device-watcher", daemon=True)
+        self.watcher.start()
+
+    def watch_loop(self, interval : float):
+        """Looks up the device every interval until stop_watching is called.
+
+        :param interval: time (in s) between lookups
+        :type interval: float
+        """
+        while self.watching.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(str(e))
+            time.sleep(interval)
+
+    def stop_watching(self):
+        """Stops looking up the device in the background.
+        """
+        self.watching.clear()
+
+def choose_device(devices : list, names : list) -> dict:
+    """
+    :param devices: the available devices
+    :type devices: list
+    :param names: names of the devices to play on, most preferred first
+    :type names: list
+    :return: the available device that is most preferred, None if none of them are available
+    :rtype: dict
+    """
+    by_name = {device["name"]: device for device in devices if device.get("id")}
+    for name in names:
+        if name in by_name:
+            return by_name[name]
+    return None
+
+# One registry, shared by every song
+registry = None
+registry_lock = threading.Lock()
+
+def get_devices() -> DeviceRegistry:
+    """Retrieves the shared device registry, preferring the devices given in config.yaml.
+
+    :return: the device registry
+    :rtype: DeviceRegistry
+    """
+    global registry
+    with registry_lock:
+        if registry is None:
+            registry = DeviceRegistry([utils.DEVICE_NAME, *utils.FALLBACK_DEVICES])
+        return registry
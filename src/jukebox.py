@@ -3,51 +3,95 @@
 Uses spotify web API to obtain the contents of a playlist (set in config.yaml). Presents
 user with the songs of the playlist split into pages of a set length (set in config.yaml). Upon user inputting
 the number of the desired song on the page, the web API is used to play the song on a chosen device (set in config.yaml).
+Songs can also be found by name (see search.py), with '/' and the name, or by running with --search NAME.
 
 """
 
-from math import ceil
 if __name__=="__main__":
-    from utils import request, SONGS_PER_PAGE, PLAYLIST_ID, refresh_device_id
+    import utils
+    from utils import request, api_url
+    from devices import get_devices, DeviceNotFoundError
+    from playlist import get_playlist
+    from prefetch import get_prefetcher
+    from retry import RetryPolicy, is_transient, error_status
+    from tracing import Trace
 else:
-    from src.utils import request, SONGS_PER_PAGE, PLAYLIST_ID, refresh_device_id
+    from src import utils
+    from src.utils import request, api_url
+    from src.devices import get_devices, DeviceNotFoundError
+    from src.playlist import get_playlist
+    from src.prefetch import get_prefetcher
+    from src.retry import RetryPolicy, is_transient, error_status
+    from src.tracing import Trace
 
-device_id = refresh_device_id()
+def device_lost(error : Exception) -> bool:
+    """
+    :param error: why playing a song failed
+    :type error: Exception
+    :return: whether an error from playing a song is worth retrying (no network, or the device wasn't found)
+    :rtype: bool
+    """
+    return is_transient(error) or error_status(error) == 404 or isinstance(error, DeviceNotFoundError)
+
+# Playing a song is retried briefly (the user is waiting), finding the device again if it wasn't found
+PLAY_RETRY = RetryPolicy(max_attempts=3, deadline=5, retryable=device_lost)
+# Fetching a page is retried for a little longer, as the loading state is shown meanwhile
+PAGE_RETRY = RetryPolicy(max_attempts=4, deadline=10)
 
 class Song:
     """General song class.
     """
+    __slots__ = ("title", "artist", "uri")  # Songs are created on every page refresh, so avoid a __dict__ each
+
     def __init__(self, title : str, artist : str, uri : str):
         self.title = title
         self.artist = artist
         self.uri = uri
 
-    def play(self):
-        global device_id
-        """Plays the song on a given device.
+    def play(self, trace : Trace = None):
+        """Plays the song on the chosen device, retrying (see PLAY_RETRY) if it can't be reached.
+
+        The device ID is cached (see devices.DeviceRegistry), so it's only looked up again if the device wasn't found.
+
+        :param trace: trace of the press that picked the song, marked at each stage and finished once played, defaults to None
+        :type trace: Trace, optional
         """
+        if trace:
+            trace.mark("worker started")
         headers = {"Content-Type": "application/json"}
         data = f'{{"uris": ["{self.uri}"],"position_ms": 0}}'
-        url=f"https://api.spotify.com/v1/me/player/play?device_id={device_id}"
+        devices = get_devices()
+        device_id = None
+
+        def play_on_device():
+            nonlocal device_id
+            device_id = devices.get()
+            if trace:
+                trace.mark("device found")
+            return request("PUT", api_url(f"/me/player/play?device_id={device_id}"), headers=headers, data=data)
+
+        def find_device(error : Exception):
+            # Looks up the device again before retrying, in case it has a new ID (e.g after restarting)
+            if error_status(error) == 404:
+                devices.refresh(stale_id=device_id)
+
+        outcome = "failed"
         try:
-            request("PUT", url, headers=headers, data=data)
-        except ConnectionAbortedError as e:
-            if str(e) == "{'error': {'status': 404, 'message': 'Not found.'}}":
-                self.play()
-            new_id = refresh_device_id()
-            if device_id==new_id:
-                print(str(e))
-            else:
-                device_id = new_id
-                self.play()
+            PLAY_RETRY.call(play_on_device, on_retry=find_device)
+            outcome = "played"
+        except (ConnectionAbortedError, DeviceNotFoundError) as e:
+            print(str(e))
+        finally:
+            if trace:
+                trace.finish(outcome)
 
 class Page:
-    """Class for a page of songs.
+    """Class for a page of songs (a view onto the shared snapshot of the playlist).
     """
     def __init__(self, playlist_id : str, page_num : int):
         self.playlist_id = playlist_id
         self.page_num = page_num
-        self.refresh()
+        self.tracks = []  # Filled in by refresh, so only pages that are actually shown get fetched
 
     def display(self):
         """Displays the contents of the page (ONLY IF THIS FILE IS RUN).
@@ -57,39 +101,53 @@ class Page:
             print(f"{i+1:02}:\t{self.tracks[i].title} - {self.tracks[i].artist}")
 
     def refresh(self):
-        """Refreshes the page songs by querying the spotify web API.
+        """Refreshes the page songs from the playlist snapshot (see playlist.Playlist.load to re-download it).
 
-        :param playlist_id: ID of playlist to get tracks from
-        :type playlist_id: str
-        :param offset: offset from the start from which to get the tracks (e.g offset of 5 will get the 6th track onwards)
-        :type offset: int
+        If the snapshot hasn't finished downloading, the page is fetched on its own (and its neighbours prefetched),
+        retrying (see PAGE_RETRY) if it can't be reached.
         """
-        self.tracks = []
-        try:
-            response = request("GET", f"https://api.spotify.com/v1/playlists/{self.playlist_id}/tracks?limit={SONGS_PER_PAGE}&offset={(self.page_num)*SONGS_PER_PAGE}")
-        except ConnectionAbortedError:
-            print(str(e))
-            self.refresh()
-        items = response["items"]
-        for item in items:
-            name = item["track"]["name"]
-            artist = item["track"]["artists"][0]["name"]
-            uri = item["track"]["uri"]
-            self.tracks.append(Song(name, artist, uri))
+        tracks = PAGE_RETRY.call(get_prefetcher(self.playlist_id).get, self.page_num)
+        self.tracks = [Song(name, artist, uri) for name, artist, uri in tracks]
 
 # Basic interface for when this file is run
+def display_matches(matches : list):
+    """Displays songs found by a search, with the page and song numbers to pick them by (ONLY IF THIS FILE IS RUN).
+
+    :param matches: the songs found (see search.SearchIndex.search)
+    :type matches: list
+    """
+    if not matches:
+        print("\nNO SONGS FOUND.")
+    for match in matches:
+        page, song = match.number(utils.SONGS_PER_PAGE)
+        print(f"PAGE {page} SONG {song:02}:\t{match.title} - {match.artist}")
+
 if __name__ == "__main__":
-    num_songs = request("GET", f"https://api.spotify.com/v1/playlists/{PLAYLIST_ID}")["tracks"]["total"]
-    num_pages = ceil(num_songs/SONGS_PER_PAGE)
-    pages = [Page(PLAYLIST_ID, i) for i in range(num_pages)]
+    import argparse
+    from search import get_index
+    parser = argparse.ArgumentParser(description="Pick songs from the playlist to play.")
+    parser.add_argument("--search", metavar="QUERY", help="list the songs best matching a name (or song number), then exit")
+    parser.add_argument("--limit", type=int, default=10, help="maximum number of songs listed by --search")
+    args = parser.parse_args()
+    if args.search is not None:
+        display_matches(get_index(utils.PLAYLIST_ID).search(args.search, args.limit))
+        raise SystemExit
+    num_pages = get_playlist(utils.PLAYLIST_ID).num_pages(utils.SONGS_PER_PAGE)
+    pages = [Page(utils.PLAYLIST_ID, i) for i in range(num_pages)]
     active_page = 0
     while True:
         pages[active_page].refresh()
         pages[active_page].display()
-        user_input = input("\nPick A Song\n'<' To Go Back\n'>' To Go Forwards\n")
+        user_input = input("\nPick A Song\n'<' To Go Back\n'>' To Go Forwards\n'/' And A Name To Search\n")
         # Parsing user input
         if user_input=="q":
             break
+        elif user_input.startswith("/"):
+            matches = get_index(utils.PLAYLIST_ID).search(user_input[1:], args.limit)
+            display_matches(matches)
+            if matches:
+                # Go to the page of the best match (the playlist may have grown since the pages were made)
+                active_page = min(matches[0].number(utils.SONGS_PER_PAGE)[0] - 1, num_pages - 1)
         elif user_input == "<":
             active_page -=1
             if active_page<0:
@@ -0,0 +1,231 @@
+"""Request metrics for the jukebox software.
+
+Every http request to the spotify web API and accounts service is recorded (see utils.send): how long it took,
+by endpoint (e.g "GET /v1/playlists/{id}/tracks", so requests for different playlists are counted together),
+the bytes sent and received, and any error. Retries and api key refreshes are counted too. Together these show
+whether slow song starts come from the network, the token flow or looking up the device.
+
+The metrics can be read in-process (get_metrics().snapshot()), or served in the Prometheus text format on a
+local port (set metrics_port in config.yaml) to be scraped or just viewed with curl.
+"""
+
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+# Upper bounds (in s) of the latency histogram buckets (the Prometheus defaults)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Path segments followed by an ID, which is replaced with {id} in endpoint names
+ID_COLLECTIONS = {"playlists", "tracks", "albums", "artists", "users", "episodes", "shows"}
+
+def endpoint(method : str, url : str) -> str:
+    """Names the endpoint a request is made to, without the IDs or query in its url.
+
+    :param method: http method (e.g GET)
+    :type method: str
+    :param url: url requested
+    :type url: str
+    :return: the endpoint (e.g "GET /v1/playlists/{id}/tracks")
+    :rtype: str
+    """
+    parts = urlsplit(url).path.rstrip("/").split("/")
+    for i in range(1, len(parts)):
+        if parts[i-1] in ID_COLLECTIONS and parts[i]:
+            parts[i] = "{id}"
+    return f"{method} {'/'.join(parts)}"
+
+class Histogram:
+    """Counts of observed values in fixed buckets, as in a Prometheus histogram (but not cumulative).
+    """
+    def __init__(self, buckets : tuple = BUCKETS):
+        """
+        :param buckets: upper bounds of the buckets, in increasing order, defaults to BUCKETS
+        :type buckets: tuple, optional
+        """
+        self.buckets = buckets
+        self.counts = [0]*(len(buckets) + 1)  # The last bucket has no upper bound
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value : float):
+        """
+        :param value: value to add
+        :type value: float
+        """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def percentile(self, p : float) -> float:
+        """Estimates a percentile, as the upper bound of the bucket it falls in.
+
+        :param p: percentile (0-100)
+        :type p: float
+        :return: the estimate, None if nothing has been observed (or inf if it's past the last bucket)
+        :rtype: float
+        """
+        if not self.count:
+            return None
+        rank = p/100*self.count
+        seen = 0
+        for bound, count in zip((*self.buckets, float("inf")), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+class EndpointMetrics:
+    """Metrics of the requests made to a single endpoint.
+    """
+    __slots__ = ("latency", "bytes_sent", "bytes_received", "errors")
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.errors = {}
+
+class RequestMetrics:
+    """Process-wide record of requests, retries and api key refreshes.
+    """
+    def __init__(self):
+        self.endpoints = {}
+        self.retries = 0
+        self.token_refreshes = 0
+        self.lock = threading.Lock()
+
+    def observe(self, name : str, duration : float, sent : int = 0, received : int = 0, error : str = None):
+        """Records a request.
+
+        :param name: endpoint requested (see endpoint)
+        :type name: str
+        :param duration: time (in s) until the response arrived (or the request failed)
+        :type duration: float
+        :param sent: bytes of data sent, defaults to 0
+        :type sent: int, optional
+        :param received: bytes of content received, defaults to 0
+        :type received: int, optional
+        :param error: class of error (e.g "http 404", or "ReadTimeout"), defaults to None (succeeded)
+        :type error: str, optional
+        """
+        with self.lock:
+            if name not in self.endpoints:
+                self.endpoints[name] = EndpointMetrics()
+            metrics = self.endpoints[name]
+            metrics.latency.observe(duration)
+            metrics.bytes_sent += sent
+            metrics.bytes_received += received
+            if error:
+                metrics.errors[error] = metrics.errors.get(error, 0) + 1
+
+    def count_retries(self, retries : int = 1):
+        """
+        :param retries: number of retries made, defaults to 1
+        :type retries: int, optional
+        """
+        with self.lock:
+            self.retries += retries
+
+    def count_token_refresh(self):
+        """Records the api key being refreshed.
+        """
+        with self.lock:
+            self.token_refreshes += 1
+
+    def snapshot(self) -> dict:
+        """
+        :return: the metrics so far, with estimated latency percentiles (in s) for each endpoint
+        :rtype: dict
+        """
+        with self.lock:
+            endpoints = {name: {"count": metrics.latency.count, "total_time": metrics.latency.sum,
+                                "p50": metrics.latency.percentile(50), "p90": metrics.latency.percentile(90),
+                                "p99": metrics.latency.percentile(99), "bytes_sent": metrics.bytes_sent,
+                                "bytes_received": metrics.bytes_received, "errors": dict(metrics.errors)}
+                         for name, metrics in self.endpoints.items()}
+            return {"endpoints": endpoints, "retries": self.retries, "token_refreshes": self.token_refreshes}
+
+    def render(self) -> str:
+        """
+        :return: the metrics in the Prometheus text exposition format
+        :rtype: str
+        """
+        lines = ["# HELP jukebox_request_duration_seconds Time taken by requests to the spotify web API.",
+                 "# TYPE jukebox_request_duration_seconds histogram"]
+        with self.lock:
+            endpoints = sorted(self.endpoints.items())
+            for name, metrics in endpoints:
+                label = f'endpoint="{escape(name)}"'
+                cumulative = 0
+                for bound, count in zip((*metrics.latency.buckets, "+Inf"), metrics.latency.counts):
+                    cumulative += count
+                    lines.append(f'jukebox_request_duration_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+                lines.append(f"jukebox_request_duration_seconds_sum{{{label}}} {metrics.latency.sum}")
+                lines.append(f"jukebox_request_duration_seconds_count{{{label}}} {metrics.latency.count}")
+            for metric, attribute, description in (("jukebox_request_sent_bytes_total", "bytes_sent", "Bytes of data sent in requests."),
+                                                   ("jukebox_request_received_bytes_total", "bytes_received", "Bytes of content received in responses.")):
+                lines += [f"# HELP {metric} {description}", f"# TYPE {metric} counter"]
+                lines += [f'{metric}{{endpoint="{escape(name)}"}} {getattr(metrics, attribute)}' for name, metrics in endpoints]
+            lines += ["# HELP jukebox_request_errors_total Requests that failed, by class of error.", "# TYPE jukebox_request_errors_total counter"]
+            lines += [f'jukebox_request_errors_total{{endpoint="{escape(name)}",error="{escape(error)}"}} {count}'
+                      for name, metrics in endpoints for error, count in sorted(metrics.errors.items())]
+            lines += ["# HELP jukebox_request_retries_total Requests retried after being refused by the server.",
+                      "# TYPE jukebox_request_retries_total counter", f"jukebox_request_retries_total {self.retries}",
+                      "# HELP jukebox_token_refreshes_total Times the api key was refreshed.",
+                      "# TYPE jukebox_token_refreshes_total counter", f"jukebox_token_refreshes_total {self.token_refreshes}"]
+        return "\n".join(lines) + "\n"
+
+def escape(value : str) -> str:
+    """
+    :param value: value of a label
+    :type value: str
+    :return: the value, escaped for the Prometheus text format
+    :rtype: str
+    """
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serves the metrics of the server's RequestMetrics at /metrics.
+    """
+    def do_GET(self):
+        if urlsplit(self.path).path != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes aren't worth printing
+
+def serve(metrics : RequestMetrics, port : int, host : str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serves metrics in the Prometheus text format on a background thread.
+
+    :param metrics: the metrics to serve
+    :type metrics: RequestMetrics
+    :param port: port to listen on (0 for any free port)
+    :type port: int
+    :param host: address to listen on, defaults to "127.0.0.1" (only this machine)
+    :type host: str, optional
+    :return: the server (server_address gives the port, shutdown stops it)
+    :rtype: ThreadingHTTPServer
+    """
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    server.metrics = metrics
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+# Metrics shared by every request
+metrics = RequestMetrics()
+
+def get_metrics() -> RequestMetrics:
+    """
+    :return: the metrics shared by every request
+    :rtype: RequestMetrics
+    """
+    return metrics
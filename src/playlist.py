@@ -0,0 +1,275 @@
+"""Playlist loader for the jukebox software.
+
+Downloads the whole of a playlist using the API maximum of 100 tracks per request (once the first has given
+the total number of tracks, the rest are made concurrently, as many at a time as the client has workers) and
+keeps it in memory as a single snapshot. Pages of songs are then just slices of this snapshot.
+
+The playlist's snapshot_id is recorded alongside the tracks, so checking whether the playlist has changed
+only needs a tiny request; the tracks are only downloaded again if it has.
+
+Snapshots can also be saved to a persistent cache (see cache.py) so that they are available immediately on
+boot, before being checked against the spotify web API in the background.
+"""
+
+import asyncio
+import threading
+import time
+from math import ceil
+if __package__:
+    from src import utils
+    from src.cache import PlaylistCache
+    from src.client import get_client, SpotifyClient
+    from src.tracks import TrackTable
+else:
+    import utils
+    from cache import PlaylistCache
+    from client import get_client, SpotifyClient
+    from tracks import TrackTable
+
+# Maximum number of tracks the API returns per request
+TRACKS_PER_REQUEST = 100
+
+# Fields requested from the API, limited to those the jukebox actually uses (see parse_tracks).
+# Without these, every track comes with its full album, images, available markets etc.
+TRACK_FIELDS = "total,items(track(name,uri,artists(name)))"
+SNAPSHOT_FIELDS = "snapshot_id"
+TOTAL_FIELDS = "tracks.total"
+
+class Playlist:
+    """In-memory snapshot of the tracks in a playlist.
+    """
+    def __init__(self, playlist_id : str, client : SpotifyClient = None, cache : PlaylistCache = None):
+        """
+        :param playlist_id: ID of the playlist
+        :type playlist_id: str
+        :param client: client used to query the spotify web API, defaults to the shared client
+        :type client: SpotifyClient, optional
+        :param cache: persistent cache to save snapshots to, defaults to None (no caching)
+        :type cache: PlaylistCache, optional
+        """
+        self.playlist_id = playlist_id
+        self.client = client
+        self.cache = cache
+        self.tracks = TrackTable()
+        self.loaded = False
+        self.total = None
+        self.snapshot_id = None
+        self.last_check = None
+        self.watcher = None
+        self.watching = threading.Event()
+
+    def load(self):
+        """Downloads the whole playlist, replacing the current snapshot.
+        """
+        asyncio.run(self.load_async())
+
+    async def load_async(self):
+        """Downloads the whole playlist, replacing the current snapshot (coroutine version of load).
+        """
+        client = self.client or get_client()
+        # Fetched before any tracks, so that if the playlist changes while loading, the snapshot_id saved is the
+        # older one and the next refresh downloads it again (rather than never noticing the tracks are stale)
+        snapshot_id = await self.fetch_snapshot_id(client)
+        in_flight = asyncio.Semaphore(client.max_concurrency)
+        async def get_page(offset):
+            # Requests not yet sent would otherwise pile up waiting for a worker
+            async with in_flight:
+                return await client.get_tracks(self.playlist_id, offset=offset, limit=TRACKS_PER_REQUEST, fields=TRACK_FIELDS)
+        first = await get_page(0)
+        offsets = range(TRACKS_PER_REQUEST, first["total"], TRACKS_PER_REQUEST)
+        rest = await asyncio.gather(*[get_page(offset) for offset in offsets])
+        tracks = TrackTable(track for response in [first, *rest] for track in parse_tracks(response["items"]))
+        # Swapping in the complete snapshot at once means readers never see a half-loaded playlist
+        self.tracks = tracks
+        self.total = len(tracks)
+        self.snapshot_id = snapshot_id
+        self.last_check = time.monotonic()
+        self.loaded = True
+        if self.cache:
+            try:
+                self.cache.save(self.playlist_id, snapshot_id, tracks)
+            except Exception as e:
+                print(str(e))
+
+    def load_cached(self) -> bool:
+        """Loads the snapshot saved in the persistent cache, if there is one. It should then be checked
+        with refresh (e.g using refresh_in_background).
+
+        :return: True if a cached snapshot was loaded
+        :rtype: bool
+        """
+        cached = self.cache.load(self.playlist_id) if self.cache else None
+        if cached is None:
+            return False
+        self.snapshot_id, tracks = cached
+        self.tracks = TrackTable(tracks)
+        self.total = len(self.tracks)
+        self.loaded = True
+        return True
+
+    def fetch_total(self) -> int:
+        """Retrieves the number of tracks in the playlist without downloading them, so that pages can be
+        shown (using fetch_page) before the whole playlist has been downloaded.
+
+        :return: the number of tracks
+        :rtype: int
+        """
+        client = self.client or get_client()
+        self.total = asyncio.run(client.get_playlist(self.playlist_id, fields=TOTAL_FIELDS))["tracks"]["total"]
+        return self.total
+
+    def fetch_page(self, page_num : int, songs_per_page : int) -> list:
+        """Retrieves the tracks on a given page, downloading just that page if the snapshot isn't loaded yet.
+
+        :param page_num: index of the page
+        :type page_num: int
+        :param songs_per_page: number of songs on each page
+        :type songs_per_page: int
+        :return: (title, artist, uri) of each track on the page
+        :rtype: list
+        """
+        if self.loaded:
+            return self.page(page_num, songs_per_page)
+        client = self.client or get_client()
+        response = asyncio.run(client.get_tracks(self.playlist_id, offset=page_num*songs_per_page, limit=songs_per_page, fields=TRACK_FIELDS))
+        return parse_tracks(response["items"])
+
+    async def fetch_snapshot_id(self, client : SpotifyClient) -> str:
+        """Retrieves the current snapshot_id (i.e. version) of the playlist.
+
+        :param client: client used to query the spotify web API
+        :type client: SpotifyClient
+        :return: the playlist's snapshot_id
+        :rtype: str
+        """
+        return (await client.get_playlist(self.playlist_id, fields=SNAPSHOT_FIELDS))["snapshot_id"]
+
+    def refresh(self) -> bool:
+        """Checks whether the playlist has changed, and downloads it again only if it has.
+
+        :return: True if the snapshot was replaced
+        :rtype: bool
+        """
+        return asyncio.run(self.refresh_async())
+
+    async def refresh_async(self) -> bool:
+        """Checks whether the playlist has changed, and downloads it again only if it has (coroutine version of refresh).
+
+        :return: True if the snapshot was replaced
+        :rtype: bool
+        """
+        if not self.loaded:
+            await self.load_async()
+            return True
+        snapshot_id = await self.fetch_snapshot_id(self.client or get_client())
+        self.last_check = time.monotonic()
+        if snapshot_id == self.snapshot_id:
+            return False
+        await self.load_async()
+        return True
+
+    def refresh_in_background(self):
+        """Runs refresh once on a background thread. If it fails (e.g no network), the current snapshot is kept.
+        """
+        def refresh():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(str(e))
+        threading.Thread(target=refresh, name="playlist-refresh", daemon=True).start()
+
+    def watch(self, interval : float):
+        """Starts checking for changes to the playlist in the background.
+
+        :param interval: time (in s) between checks
+        :type interval: float
+        """
+        if self.watching.is_set():
+            return
+        self.watching.set()
+        self.watcher = threading.Thread(target=self.watch_loop, args=(interval,), name="playlist-watcher", daemon=True)
+        self.watcher.start()
+
+    def watch_loop(self, interval : float):
+        """Checks for changes to the playlist every interval until stop_watching is called.
+
+        :param interval: time (in s) between checks
+        :type interval: float
+        """
+        while self.watching.is_set():
+            time.sleep(interval)
+            if not self.watching.is_set():
+                break
+            try:
+                self.refresh()
+            except Exception as e:
+                print(str(e))
+
+    def stop_watching(self):
+        """Stops checking for changes to the playlist in the background.
+        """
+        self.watching.clear()
+
+    def page(self, page_num : int, songs_per_page : int) -> list:
+        """Retrieves the tracks on a given page.
+
+        :param page_num: index of the page
+        :type page_num: int
+        :param songs_per_page: number of songs on each page
+        :type songs_per_page: int
+        :return: (title, artist, uri) of each track on the page
+        :rtype: list
+        """
+        return self.tracks[page_num*songs_per_page:(page_num+1)*songs_per_page]
+
+    def num_pages(self, songs_per_page : int) -> int:
+        """Calculates how many pages the playlist is split into.
+
+        :param songs_per_page: number of songs on each page
+        :type songs_per_page: int
+        :return: number of pages
+        :rtype: int
+        """
+        return ceil((len(self.tracks) if self.loaded else self.total or 0)/songs_per_page)
+
+def parse_tracks(items : list) -> list:
+    """Extracts the information the jukebox uses from a list of playlist items.
+
+    Items without a track (e.g. tracks that have been removed from spotify) are skipped.
+
+    :param items: playlist track objects returned by the spotify web API
+    :type items: list
+    :return: (title, artist, uri) of each track
+    :rtype: list
+    """
+    tracks = []
+    for item in items:
+        track = item["track"]
+        if not track:
+            continue
+        tracks.append((track["name"], track["artists"][0]["name"], track["uri"]))
+    return tracks
+
+# One snapshot per playlist, shared by every page
+playlists = {}
+playlists_lock = threading.Lock()
+
+def get_playlist(playlist_id : str, load : bool = True) -> Playlist:
+    """Retrieves the shared snapshot of a playlist, downloading it on first use.
+
+    Snapshots are saved to the persistent cache given in config.yaml.
+
+    :param playlist_id: ID of the playlist
+    :type playlist_id: str
+    :param load: whether to download the playlist if it hasn't been already, defaults to True
+    :type load: bool, optional
+    :return: the playlist snapshot
+    :rtype: Playlist
+    """
+    with playlists_lock:
+        if playlist_id not in playlists:
+            playlists[playlist_id] = Playlist(playlist_id, cache=PlaylistCache(utils.PLAYLIST_CACHE_FILE))
+        playlist = playlists[playlist_id]
+    if load and not playlist.loaded:
+        playlist.load()
+    return playlist
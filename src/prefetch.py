@@ -0,0 +1,194 @@
+"""Page prefetching for the jukebox software.
+
+Whenever a page is shown, the pages either side of it are fetched in the background into a bounded LRU
+cache, so that flipping to them doesn't have to wait for the spotify web API. This matters until the
+whole playlist has been downloaded (e.g on a cold start without a cached snapshot, or for very large
+playlists); once it has, pages are served straight from the playlist snapshot.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+if __package__:
+    from src import utils
+    from src.playlist import Playlist, get_playlist
+else:
+    import utils
+    from playlist import Playlist, get_playlist
+
+class PageCache:
+    """Bounded cache of pages, evicting the least recently used page when full.
+    """
+    def __init__(self, max_size : int, max_age : float = None):
+        """
+        :param max_size: maximum number of pages to hold
+        :type max_size: int
+        :param max_age: time (in s) after which a page is considered stale, defaults to None (never)
+        :type max_age: float, optional
+        """
+        self.max_size = max_size
+        self.max_age = max_age
+        self.pages = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, page_num : int, snapshot_id : str = None) -> list:
+        """Retrieves a page, if it is cached and not stale.
+
+        :param page_num: index of the page
+        :type page_num: int
+        :param snapshot_id: current snapshot_id of the playlist (pages fetched from another snapshot are stale), defaults to None
+        :type snapshot_id: str, optional
+        :return: the tracks on the page, or None
+        :rtype: list
+        """
+        with self.lock:
+            entry = self.pages.get(page_num)
+            if entry is None:
+                return None
+            if self.stale(entry, snapshot_id):
+                del self.pages[page_num]
+                return None
+            self.pages.move_to_end(page_num)
+            return entry[0]
+
+    def put(self, page_num : int, tracks : list, snapshot_id : str = None):
+        """Adds a page to the cache, evicting the least recently used page if full.
+
+        :param page_num: index of the page
+        :type page_num: int
+        :param tracks: the tracks on the page
+        :type tracks: list
+        :param snapshot_id: snapshot_id of the playlist the page was fetched from, defaults to None
+        :type snapshot_id: str, optional
+        """
+        with self.lock:
+            self.pages[page_num] = (tracks, snapshot_id, time.monotonic())
+            self.pages.move_to_end(page_num)
+            while len(self.pages) > self.max_size:
+                self.pages.popitem(last=False)
+
+    def stale(self, entry : tuple, snapshot_id : str) -> bool:
+        """Checks whether a cache entry is out of date.
+
+        :param entry: (tracks, snapshot_id, fetch time) of the cached page
+        :type entry: tuple
+        :param snapshot_id: current snapshot_id of the playlist
+        :type snapshot_id: str
+        :return: True if the entry should not be used
+        :rtype: bool
+        """
+        _, entry_snapshot_id, fetched_at = entry
+        if snapshot_id is not None and entry_snapshot_id is not None and entry_snapshot_id != snapshot_id:
+            return True
+        return self.max_age is not None and time.monotonic() - fetched_at > self.max_age
+
+    def clear(self):
+        """Empties the cache.
+        """
+        with self.lock:
+            self.pages.clear()
+
+class Prefetcher:
+    """Fetches pages of a playlist, prefetching the pages either side in the background.
+    """
+    def __init__(self, playlist : Playlist, songs_per_page : int, radius : int = 1, cache : PageCache = None):
+        """
+        :param playlist: playlist to fetch pages from
+        :type playlist: Playlist
+        :param songs_per_page: number of songs on each page
+        :type songs_per_page: int
+        :param radius: number of pages either side of the shown page to prefetch, defaults to 1
+        :type radius: int, optional
+        :param cache: cache to hold fetched pages, defaults to a cache with room for the prefetched pages
+        :type cache: PageCache, optional
+        """
+        self.playlist = playlist
+        self.songs_per_page = songs_per_page
+        self.radius = radius
+        self.cache = cache or PageCache(2*radius + 1)
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="prefetch")
+        self.in_flight = {}
+        self.lock = threading.Lock()
+
+    def get(self, page_num : int) -> list:
+        """Retrieves the tracks on a page (waiting for it if it isn't cached) and prefetches its neighbours.
+
+        :param page_num: index of the page
+        :type page_num: int
+        :return: (title, artist, uri) of each track on the page
+        :rtype: list
+        """
+        if self.playlist.loaded:
+            # Whole playlist is in memory, so the cache is no longer needed
+            self.cache.clear()
+            return self.playlist.page(page_num, self.songs_per_page)
+        tracks = self.cache.get(page_num, self.playlist.snapshot_id)
+        if tracks is None:
+            tracks = self.fetch(page_num).result()
+        self.prefetch(page_num)
+        return tracks
+
+    def prefetch(self, page_num : int):
+        """Fetches the pages either side of a given page in the background (wrapping around at either end).
+
+        :param page_num: index of the page being shown
+        :type page_num: int
+        """
+        num_pages = self.playlist.num_pages(self.songs_per_page)
+        if not num_pages:
+            return
+        for distance in range(1, self.radius+1):
+            for neighbour in ((page_num+distance) % num_pages, (page_num-distance) % num_pages):
+                if self.cache.get(neighbour, self.playlist.snapshot_id) is None:
+                    self.fetch(neighbour)
+
+    def fetch(self, page_num : int):
+        """Starts fetching a page into the cache, unless it is already being fetched.
+
+        :param page_num: index of the page
+        :type page_num: int
+        :return: future resolving to the tracks on the page
+        :rtype: concurrent.futures.Future
+        """
+        with self.lock:
+            if page_num in self.in_flight:
+                return self.in_flight[page_num]
+            future = self.executor.submit(self.fetch_page, page_num)
+            self.in_flight[page_num] = future
+            return future
+
+    def fetch_page(self, page_num : int) -> list:
+        """Downloads a page and adds it to the cache (runs on a worker thread).
+
+        :param page_num: index of the page
+        :type page_num: int
+        :return: the tracks on the page
+        :rtype: list
+        """
+        try:
+            snapshot_id = self.playlist.snapshot_id
+            tracks = self.playlist.fetch_page(page_num, self.songs_per_page)
+            self.cache.put(page_num, tracks, snapshot_id)
+            return tracks
+        finally:
+            with self.lock:
+                del self.in_flight[page_num]
+
+# One prefetcher per playlist
+prefetchers = {}
+prefetchers_lock = threading.Lock()
+
+def get_prefetcher(playlist_id : str) -> Prefetcher:
+    """Retrieves the shared prefetcher for a playlist, configured from config.yaml.
+
+    :param playlist_id: ID of the playlist
+    :type playlist_id: str
+    :return: the prefetcher
+    :rtype: Prefetcher
+    """
+    with prefetchers_lock:
+        if playlist_id not in prefetchers:
+            cache = PageCache(utils.PAGE_CACHE_SIZE, utils.PAGE_CACHE_MAX_AGE)
+            prefetchers[playlist_id] = Prefetcher(get_playlist(playlist_id, load=False), utils.SONGS_PER_PAGE, utils.PREFETCH_PAGES, cache)
+        return prefetchers[playlist_id]
@@ -0,0 +1,111 @@
+"""Retrying of operations that can fail temporarily (e.g while the Wi-Fi drops out).
+
+Retries are made in a loop, never by recursion, and are bounded by both a number of attempts and a deadline,
+with a growing, jittered delay between them.
+"""
+
+import time
+import random
+from collections.abc import Callable
+import requests
+
+# Errors that are likely to go away by themselves (no network, or a slow response)
+TRANSIENT_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout, TimeoutError)
+
+def error_status(error : Exception) -> int:
+    """Finds the http status of a web API error raised by utils.request.
+
+    :param error: the error
+    :type error: Exception
+    :return: the status, None if the error isn't an error response from the web API
+    :rtype: int
+    """
+    if not isinstance(error, ConnectionAbortedError) or not error.args:
+        return None
+    response = error.args[0]
+    if isinstance(response, dict) and isinstance(response.get("error"), dict):
+        return response["error"].get("status")
+    return None
+
+def backoff(retries : int, base_delay : float, max_delay : float) -> float:
+    """Picks how long to wait before retrying, growing exponentially with the number of retries.
+
+    Used for every retry in the jukebox (see RetryPolicy and scheduler.RequestScheduler), so they all back off alike.
+
+    :param retries: number of retries already made
+    :type retries: int
+    :param base_delay: delay (in s) before the first retry, doubling for each retry after
+    :type base_delay: float
+    :param max_delay: longest delay (in s)
+    :type max_delay: float
+    :return: time (in s) to wait, between half and all of the exponentially increasing limit ("equal jitter")
+    :rtype: float
+    """
+    limit = min(base_delay*2**retries, max_delay)
+    return limit/2 + random.uniform(0, limit/2)
+
+def is_transient(error : Exception) -> bool:
+    """
+    :param error: the error
+    :type error: Exception
+    :return: whether the error is likely to go away by itself
+    :rtype: bool
+    """
+    return isinstance(error, TRANSIENT_ERRORS)
+
+class RetryPolicy:
+    """How to retry an operation: which errors to retry, how many times, for how long and how far apart.
+    """
+    def __init__(self, max_attempts : int = 3, deadline : float = 10, base_delay : float = 0.5, max_delay : float = 5, retryable : Callable = is_transient):
+        """
+        :param max_attempts: maximum number of attempts (including the first), defaults to 3
+        :type max_attempts: int, optional
+        :param deadline: time (in s) after the first attempt after which no more attempts are started, defaults to 10
+        :type deadline: float, optional
+        :param base_delay: delay (in s) before the first retry, doubling for each retry after, defaults to 0.5
+        :type base_delay: float, optional
+        :param max_delay: longest delay (in s) between attempts, defaults to 5
+        :type max_delay: float, optional
+        :param retryable: given an error, returns whether it's worth retrying, defaults to is_transient
+        :type retryable: Callable, optional
+        """
+        self.max_attempts = max_attempts
+        self.deadline = deadline
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retryable = retryable
+
+    def delay(self, attempt : int) -> float:
+        """
+        :param attempt: number of failed attempts so far
+        :type attempt: int
+        :return: time (in s) to wait before the next attempt (see backoff)
+        :rtype: float
+        """
+        return backoff(max(attempt-1, 0), self.base_delay, self.max_delay)
+
+    def call(self, fn : Callable, *args, on_retry : Callable = None, **kwargs):
+        """Calls a function, retrying it while it raises retryable errors and attempts and time remain.
+
+        :param fn: function to call
+        :type fn: Callable
+        :param on_retry: called with the error before each retry (e.g to pick a different device), defaults to None
+        :type on_retry: Callable, optional
+        :raises Exception: the last error, if it wasn't retryable or the retries ran out
+        :return: what the function returns
+        """
+        give_up_at = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                attempt += 1
+                if attempt >= self.max_attempts or not self.retryable(e):
+                    raise
+                delay = self.delay(attempt)
+                if time.monotonic() + delay > give_up_at:
+                    raise
+                if on_retry:
+                    on_retry(e)
+                time.sleep(delay)
@@ -0,0 +1,219 @@
+"""Scheduling of requests to the spotify web API.
+
+Every request made through utils.request goes through a single RequestScheduler, which:
+
+- limits how fast requests are sent with a token bucket, so bursts (e.g button mashing, or loading a large
+  playlist) are smoothed out rather than getting the jukebox rate limited.
+- honours the Retry-After header of 429 (rate limited) responses for every request, not just the one that
+  was refused, and gives up straight away rather than waiting if that would take too long.
+- retries 429s and temporary server errors after a jittered, exponentially increasing delay, limited by a
+  retry budget so retries can never make up more than a fraction of the requests sent.
+"""
+
+import time
+import threading
+from collections.abc import Callable
+if __package__:
+    from src.retry import backoff
+else:
+    from retry import backoff
+
+# Responses worth retrying, as the server may well answer the same request next time
+RETRY_STATUSES = {429, 502, 503, 504}
+
+class RateLimitedError(ConnectionAbortedError):
+    """Raised when the web API is refusing requests, and it would take too long to wait until it stops.
+    """
+    def __init__(self, message, retry_after : float):
+        """
+        :param message: the error response, or a description of the error
+        :param retry_after: time (in s) until requests should be sent again
+        :type retry_after: float
+        """
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """Rate limiter allowing short bursts, but a limited average rate.
+    """
+    def __init__(self, rate : float, capacity : int):
+        """
+        :param rate: tokens added per second (the average number of requests per second)
+        :type rate: float
+        :param capacity: maximum number of tokens kept (the largest burst of requests)
+        :type capacity: int
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_update = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Takes a token, going into debt if there isn't one.
+
+        :return: time (in s) to wait before using the token
+        :rtype: float
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.tokens + (now - self.last_update)*self.rate, self.capacity)
+            self.last_update = now
+            self.tokens -= 1
+            return max(-self.tokens/self.rate, 0)
+
+    def acquire(self):
+        """Takes a token, waiting for one if there aren't any left.
+        """
+        wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+
+class RetryBudget:
+    """Limits retries to a fraction of requests, so a struggling server isn't flooded with them.
+    """
+    def __init__(self, ratio : float = 0.2, capacity : float = 10):
+        """
+        :param ratio: retries earned per request sent, defaults to 0.2
+        :type ratio: float, optional
+        :param capacity: maximum retries that can be saved up, defaults to 10
+        :type capacity: float, optional
+        """
+        self.ratio = ratio
+        self.capacity = capacity
+        self.balance = capacity
+        self.lock = threading.Lock()
+
+    def deposit(self):
+        """Records a request being sent.
+        """
+        with self.lock:
+            self.balance = min(self.balance + self.ratio, self.capacity)
+
+    def withdraw(self) -> bool:
+        """Uses up a retry, if there are any left.
+
+        :return: whether a retry can be made
+        :rtype: bool
+        """
+        with self.lock:
+            if self.balance < 1:
+                return False
+            self.balance -= 1
+            return True
+
+class RequestScheduler:
+    """Sends requests at a limited rate, retrying those refused by the server.
+    """
+    def __init__(self, rate : float = 10, burst : int = 20, max_retries : int = 3, base_delay : float = 0.5, max_delay : float = 8,
+                 max_wait : float = 10, budget : RetryBudget = None):
+        """
+        :param rate: average number of requests to send per second, defaults to 10
+        :type rate: float, optional
+        :param burst: number of requests that can be sent at once, defaults to 20
+        :type burst: int, optional
+        :param max_retries: maximum times to retry a single request, defaults to 3
+        :type max_retries: int, optional
+        :param base_delay: delay (in s) before the first retry, doubling for each retry after, defaults to 0.5
+        :type base_delay: float, optional
+        :param max_delay: longest delay (in s) between retries, defaults to 8
+        :type max_delay: float, optional
+        :param max_wait: longest time (in s) to hold back a request because of a Retry-After, defaults to 10
+        :type max_wait: float, optional
+        :param budget: limits retries across every request, defaults to None (a new RetryBudget)
+        :type budget: RetryBudget, optional
+        """
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_wait = max_wait
+        self.budget = budget or RetryBudget()
+        self.blocked_until = 0
+        self.lock = threading.Lock()
+
+    def send(self, send_request : Callable):
+        """Sends a request when allowed to, retrying it if the server asks.
+
+        :param send_request: sends the request, returning the response (a requests.Response)
+        :type send_request: Callable
+        :raises RateLimitedError: if the server is rate limiting the jukebox, and waiting would take too long
+        :return: the response, which may still be an error if retrying didn't help
+        :rtype: requests.Response
+        """
+        attempt = 0
+        while True:
+            self.wait_until_unblocked()
+            self.bucket.acquire()
+            self.budget.deposit()
+            response = send_request()
+            if response.status_code not in RETRY_STATUSES:
+                return response
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if response.status_code == 429:
+                # Every request is held back, not just this one
+                self.block(retry_after if retry_after is not None else backoff(attempt, self.base_delay, self.max_delay))
+            if attempt >= self.max_retries or not self.budget.withdraw():
+                if response.status_code == 429:
+                    raise RateLimitedError(error_message(response), self.blocked_for())
+                return response
+            delay = backoff(attempt, self.base_delay, self.max_delay)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+            if delay > self.max_wait:
+                if response.status_code == 429:
+                    raise RateLimitedError(error_message(response), delay)
+                return response
+            time.sleep(delay)
+            attempt += 1
+
+    def block(self, duration : float):
+        """Holds back every request for a time.
+
+        :param duration: how long (in s)
+        :type duration: float
+        """
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + duration)
+
+    def blocked_for(self) -> float:
+        """
+        :return: time (in s) until requests can be sent again
+        :rtype: float
+        """
+        with self.lock:
+            return max(self.blocked_until - time.monotonic(), 0)
+
+    def wait_until_unblocked(self):
+        """Waits out a Retry-After, or gives up if it's too long to wait.
+
+        :raises RateLimitedError: if requests are held back for longer than max_wait
+        """
+        wait = self.blocked_for()
+        if wait > self.max_wait:
+            raise RateLimitedError(f"rate limited for another {wait:.0f}s.", wait)
+        if wait:
+            time.sleep(wait)
+
+def parse_retry_after(value : str) -> float:
+    """
+    :param value: value of a Retry-After header (a number of seconds)
+    :type value: str
+    :return: the number of seconds, None if there isn't one
+    :rtype: float
+    """
+    try:
+        return max(float(value), 0)
+    except (TypeError, ValueError):
+        return None
+
+def error_message(response):
+    """
+    :param response: an error response
+    :type response: requests.Response
+    :return: its json body, or the status code if it doesn't have one
+    """
+    try:
+        return response.json()
+    except ValueError:
+        return f"http error {response.status_code}"
@@ -0,0 +1,406 @@
+"""Search index for the jukebox software.
+
+Finds songs in the playlist by name (words from the title or artist, matched by prefix as they are typed, so
+"lov sto" finds "Love Story") or by number (a song's position in the whole playlist, from 1). Words are folded
+to lower case without accents or apostrophes, so "beyonce" finds "Beyoncé" and "dont" finds "Don't".
+
+The index maps each word to the tracks it is in (by position in the playlist), split by how well placed the
+word is in them, each array kept in playlist order. Short prefixes are indexed in the same way, as they'd
+otherwise have to be expanded into hundreds of words; longer ones are expanded into the indexed words they
+start, using a sorted list of them. Matches are ranked by how well each query word matches (exact words above
+prefixes, titles above artists, first words above later ones), then by position in the playlist, so for a
+single word only the start of each array is needed. Several words are combined with bitsets of the tracks
+(Python ints, of one bit per track in the playlist), kept for the long arrays, so that words shared by much of
+the playlist cost little more than rare ones.
+
+When the playlist snapshot changes by tracks being added to the end (the usual change), only the new tracks
+are indexed; any other change rebuilds the index.
+"""
+
+import re
+import bisect
+import operator
+import functools
+import itertools
+import threading
+import unicodedata
+from array import array
+from collections.abc import Iterable
+if __package__:
+    from src.playlist import get_playlist
+    from src.tracks import TrackTable
+else:
+    from playlist import get_playlist
+    from tracks import TrackTable
+
+# Weights of the ways a query word can match a word in a track
+EXACT = 4  # The whole word
+PREFIX = 2  # The start of the word
+IN_TITLE = 2  # In the title, rather than the artist
+FIRST_WORD = 1  # The first word of the title or artist
+# Query words shorter than this only match whole words (a single letter would match most of the playlist)
+MIN_PREFIX = 2
+# Prefixes up to this long are indexed themselves, rather than expanded into the words they start
+SHORT_PREFIX = 3
+# Bitsets of arrays of positions are kept if they're at most this many times the size of the array
+MAX_BITSET_SIZE = 4
+
+WORD = re.compile(r"\w+")
+APOSTROPHES = re.compile(r"['’`]")
+
+def fold(text : str) -> str:
+    """Normalises text so that it matches however it was typed.
+
+    :param text: text to fold
+    :type text: str
+    :return: the text in lower case, without accents or apostrophes
+    :rtype: str
+    """
+    text = text.casefold()
+    if not text.isascii():  # Most titles are, and have no accents to remove
+        text = "".join(char for char in unicodedata.normalize("NFKD", text) if not unicodedata.combining(char))
+    return APOSTROPHES.sub("", text)
+
+def tokenise(text : str) -> list:
+    """Splits text into the words it is searched by.
+
+    :param text: text to split into words
+    :type text: str
+    :return: the folded words of the text, in order
+    :rtype: list
+    """
+    return WORD.findall(fold(text))
+
+def to_bits(positions : Iterable, last : int) -> int:
+    """Converts positions of tracks to a bitset.
+
+    :param positions: positions of tracks
+    :type positions: Iterable
+    :param last: the last (highest) position
+    :type last: int
+    :return: bitset of the positions (bit n set if n is one of them)
+    :rtype: int
+    """
+    bits = bytearray((last >> 3) + 1)
+    for position in positions:
+        bits[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(bits, "little")
+
+def cacheable(positions : array) -> bool:
+    """Works out whether the bitset of an array of positions is worth keeping.
+
+    :param positions: sorted array of positions of tracks
+    :type positions: array
+    :return: whether the bitset of the positions is small enough to keep (see MAX_BITSET_SIZE)
+    :rtype: bool
+    """
+    return positions[-1] <= len(positions)*positions.itemsize*8*MAX_BITSET_SIZE
+
+def lowest(bits : int, count : int) -> list:
+    """Finds the earliest tracks in a bitset.
+
+    :param bits: bitset of positions of tracks
+    :type bits: int
+    :param count: maximum number of positions
+    :type count: int
+    :return: the lowest positions in the bitset, in order
+    :rtype: list
+    """
+    positions = []
+    while bits and len(positions) < count:
+        low = bits & -bits
+        positions.append(low.bit_length() - 1)
+        bits ^= low
+    return positions
+
+class Match:
+    """A track found by a search.
+    """
+    __slots__ = ("position", "title", "artist", "uri", "score")
+
+    def __init__(self, position : int, title : str, artist : str, uri : str, score : int):
+        self.position = position
+        self.title = title
+        self.artist = artist
+        self.uri = uri
+        self.score = score
+
+    def number(self, songs_per_page : int) -> tuple:
+        """Works out where the track is shown.
+
+        :param songs_per_page: number of songs on each page
+        :type songs_per_page: int
+        :return: (page, song) numbers of the track, as shown to the user (both from 1)
+        :rtype: tuple
+        """
+        page, song = divmod(self.position, songs_per_page)
+        return page + 1, song + 1
+
+class SearchIndex:
+    """In-memory index of the titles and artists of a playlist's tracks.
+    """
+    def __init__(self, tracks : Iterable = ()):
+        """
+        :param tracks: (title, artist, uri) of each track (e.g a TrackTable), defaults to () (empty)
+        :type tracks: Iterable, optional
+        """
+        self.tracks = TrackTable()
+        self.postings = {}  # Word -> {how well placed it is (see add): array of the positions of the tracks it's placed so in}
+        self.prefixes = {}  # Short prefix of longer words -> {how well placed: array of positions}, as for postings
+        self.vocabulary = []  # Every word, sorted for prefix lookups
+        self.sorted = True
+        self.bitsets = {}  # id of an array -> (array, its length, bitset), for long arrays
+        self.lock = threading.Lock()
+        self.update(tracks)
+
+    def add(self, position : int, title : str, artist : str):
+        """Adds the words of a track, and their short prefixes, to the index, each where it's best placed
+        (IN_TITLE and FIRST_WORD).
+
+        :param position: position of the track in the playlist (after any already added)
+        :type position: int
+        :param title: title of the track
+        :type title: str
+        :param artist: artist of the track
+        :type artist: str
+        """
+        placements = {}
+        for words, field in ((tokenise(title), IN_TITLE), (tokenise(artist), 0)):
+            for i, word in enumerate(words):
+                placement = field + (FIRST_WORD if i == 0 else 0)
+                if placement > placements.get(word, -1):
+                    placements[word] = placement
+        prefixes = {}
+        for word, placement in placements.items():
+            if word not in self.postings:
+                self.postings[word] = {}
+                self.sorted = False
+            self.postings[word].setdefault(placement, array("I")).append(position)
+            for length in range(MIN_PREFIX, min(SHORT_PREFIX + 1, len(word))):
+                if placement > prefixes.get(word[:length], -1):
+                    prefixes[word[:length]] = placement
+        for prefix, placement in prefixes.items():
+            self.prefixes.setdefault(prefix, {}).setdefault(placement, array("I")).append(position)
+
+    def update(self, tracks : Iterable) -> int:
+        """Brings the index up to date with a new snapshot of the playlist.
+
+        If tracks have only been added to the end (the usual change), just those are indexed; otherwise the
+        index is rebuilt.
+
+        :param tracks: (title, artist, uri) of each track (e.g a TrackTable)
+        :type tracks: Iterable
+        :return: number of tracks indexed
+        :rtype: int
+        """
+        with self.lock:
+            if tracks is self.tracks:
+                return 0
+            tracks = tracks if isinstance(tracks, TrackTable) else TrackTable(tracks)
+            start = len(self.tracks)
+            if not tracks.uris.startswith(self.tracks.uris):
+                start = 0
+                self.postings = {}
+                self.prefixes = {}
+                self.vocabulary = []
+                self.bitsets = {}
+            for position in range(start, len(tracks)):
+                self.add(position, tracks.titles[position], tracks.artists[position])
+            self.tracks = tracks
+            if not self.bitsets:
+                # Bitsets of the long arrays are made now, so the first search for a common word isn't slow
+                for by_placement in itertools.chain(self.postings.values(), self.prefixes.values()):
+                    for positions in by_placement.values():
+                        if cacheable(positions):
+                            self.bits([positions])
+            return len(tracks) - start
+
+    def expand(self, word : str) -> list:
+        """Finds the indexed words a (long) query word starts.
+
+        :param word: folded query word, longer than SHORT_PREFIX
+        :type word: str
+        :return: the indexed words starting with the query word, including the word itself
+        :rtype: list
+        """
+        if not self.sorted:
+            self.vocabulary = sorted(self.postings)
+            self.sorted = True
+        matches = []
+        for i in range(bisect.bisect_left(self.vocabulary, word), len(self.vocabulary)):
+            if not self.vocabulary[i].startswith(word):
+                break
+            matches.append(self.vocabulary[i])
+        return matches
+
+    def levels(self, word : str) -> dict:
+        """Finds the tracks matching a query word, by how well they match.
+
+        :param word: folded query word
+        :type word: str
+        :return: arrays of the positions of tracks matching the query word, by the score of the match
+        :rtype: dict
+        """
+        if len(word) > SHORT_PREFIX:
+            sources = [(self.postings[indexed_word], EXACT if indexed_word == word else PREFIX) for indexed_word in self.expand(word)]
+        else:
+            sources = [(self.postings.get(word, {}), EXACT)]
+            if len(word) >= MIN_PREFIX:
+                sources.append((self.prefixes.get(word, {}), PREFIX))
+        levels = {}
+        for by_placement, base in sources:
+            for placement, positions in by_placement.items():
+                levels.setdefault(base + placement, []).append(positions)
+        return levels
+
+    def best(self, levels : dict, limit : int) -> list:
+        """Ranks the tracks matching a single query word, a score at a time from the highest.
+
+        Only the earliest tracks of each list are needed: a score's lists are only looked at once those of
+        the higher scores have given fewer matches than the limit, so no more tracks than that can have been
+        matched already.
+
+        :param levels: positions of the tracks matching the word, by score (see levels)
+        :type levels: dict
+        :param limit: maximum number of matches
+        :type limit: int
+        :return: (position, score) of the matches, best first
+        :rtype: list
+        """
+        ranked = []
+        matched = set()
+        for score in sorted(levels, reverse=True):
+            needed = limit - len(ranked)
+            earliest = set().union(*(positions[:needed + len(matched)] for positions in levels[score]))
+            positions = sorted(earliest - matched)[:needed]
+            ranked += [(position, score) for position in positions]
+            if len(ranked) >= limit:
+                break
+            matched.update(positions)
+        return ranked
+
+    def bits(self, level : list) -> int:
+        """Converts arrays of positions to a single bitset, using the bitsets kept for long arrays.
+
+        :param level: sorted arrays of positions (from the index)
+        :type level: list
+        :return: bitset of the positions in any of the arrays (bit n set if n is in one)
+        :rtype: int
+        """
+        bits = 0
+        uncached = []
+        for positions in level:
+            cached = self.bitsets.get(id(positions))
+            if cached and cached[0] is positions:
+                _, length, array_bits = cached
+                if length < len(positions):  # Tracks have been added since
+                    array_bits |= to_bits(positions[length:], positions[-1])
+                    self.bitsets[id(positions)] = (positions, len(positions), array_bits)
+                bits |= array_bits
+            elif cacheable(positions):
+                array_bits = to_bits(positions, positions[-1])
+                self.bitsets[id(positions)] = (positions, len(positions), array_bits)
+                bits |= array_bits
+            else:
+                uncached.append(positions)
+        if uncached:  # All at once, as there can be many short arrays
+            bits |= to_bits(itertools.chain.from_iterable(uncached), max(positions[-1] for positions in uncached))
+        return bits
+
+    def combine(self, levels : list) -> dict:
+        """Works out the total score of the tracks matching every query word, with bitsets of the tracks
+        (so many tracks are combined at once).
+
+        :param levels: positions of the tracks matching each word, by score (see levels)
+        :type levels: list
+        :return: bitset of the tracks matching every word, by total score
+        :rtype: dict
+        """
+        totals = None
+        for word_levels in levels:
+            remaining = -1 if totals is None else functools.reduce(operator.or_, totals.values())  # -1 is every track
+            scores = {}  # Best score for this word -> bitset
+            for score in sorted(word_levels, reverse=True):
+                bits = self.bits(word_levels[score]) & remaining
+                if bits:
+                    scores[score] = bits
+                    remaining &= ~bits
+            if totals is None:
+                totals = scores
+            else:
+                combined = {}
+                for total, bits in totals.items():
+                    for score, matched in scores.items():
+                        if bits & matched:
+                            combined[total + score] = combined.get(total + score, 0) | (bits & matched)
+                totals = combined
+            if not totals:
+                break
+        return totals
+
+    def search(self, query : str, limit : int = 10) -> list:
+        """Finds the tracks best matching a query.
+
+        Every word of the query must match (as a prefix) a word in the title or artist. If the query is a
+        number, the track with that number (see lookup) comes first.
+
+        :param query: words to search for, or a song number
+        :type query: str
+        :param limit: maximum number of matches, defaults to 10
+        :type limit: int, optional
+        :return: the matches, best first
+        :rtype: list
+        """
+        words = list(dict.fromkeys(tokenise(query)))
+        with self.lock:
+            # isdecimal rather than isdigit, which is also true of characters int can't parse (e.g "²")
+            by_number = self.lookup(int(query.strip())) if query.strip().isdecimal() else None
+            ranked = []
+            if len(words) == 1:
+                ranked = self.best(self.levels(words[0]), limit)
+            elif words:
+                totals = self.combine([self.levels(word) for word in words])
+                for total in sorted(totals, reverse=True):
+                    ranked += [(position, total) for position in lowest(totals[total], limit - len(ranked))]
+                    if len(ranked) >= limit:
+                        break
+            matches = [Match(position, *self.tracks.row(position), score) for position, score in ranked]
+        if by_number:
+            matches = [by_number] + [match for match in matches if match.position != by_number.position][:limit-1]
+        return matches
+
+    def lookup(self, number : int) -> Match:
+        """Finds a track by its number.
+
+        :param number: number of the track in the whole playlist (from 1)
+        :type number: int
+        :return: the track, None if there isn't one with that number
+        :rtype: Match
+        """
+        if not 1 <= number <= len(self.tracks):
+            return None
+        return Match(number - 1, *self.tracks.row(number - 1), EXACT)
+
+    def __len__(self) -> int:
+        return len(self.tracks)
+
+# One index per playlist
+indexes = {}
+indexes_lock = threading.Lock()
+
+def get_index(playlist_id : str) -> SearchIndex:
+    """Retrieves the search index of a playlist, building it on first use (downloading the playlist if it
+    hasn't been already) and updating it whenever the playlist's snapshot has changed.
+
+    :param playlist_id: ID of the playlist
+    :type playlist_id: str
+    :return: the search index
+    :rtype: SearchIndex
+    """
+    playlist = get_playlist(playlist_id)
+    with indexes_lock:
+        if playlist_id not in indexes:
+            indexes[playlist_id] = SearchIndex()
+        index = indexes[playlist_id]
+    index.update(playlist.tracks)
+    return index
@@ -0,0 +1,163 @@
+"""Tracing of button presses for the jukebox software.
+
+Each button press is given a trace, which records when it reaches each stage of being handled: pigpio's
+callback thread, the GUI thread, button_click, a two-digit number being entered, the worker thread, the device
+being found and the play request completing. The stages cross several threads, so the trace is handed along
+with the press rather than looked up.
+
+Finished traces are kept in a ring buffer of the most recent ones (the oldest are dropped), which can be
+written out on demand (see Tracer.dump, and the secret dump code in app/run.py), then analysed offline with
+benchmarks/traces.py to find which stages take the time between a press and the music starting.
+"""
+
+import json
+import time
+import threading
+import itertools
+from collections import deque
+from collections.abc import Callable
+
+# Number of finished traces kept
+TRACE_BUFFER_SIZE = 200
+# Where traces are written to by dump, relative to the working directory
+TRACE_FILE = "../src/traces.jsonl"
+
+class Trace:
+    """Timestamps of the stages of handling a single button press.
+    """
+    __slots__ = ("id", "name", "started_at", "stages", "outcome", "tracer")
+
+    def __init__(self, tracer : "Tracer", trace_id : int, name : str):
+        """
+        :param tracer: the tracer to record the trace in once finished
+        :type tracer: Tracer
+        :param trace_id: unique ID of the trace
+        :type trace_id: int
+        :param name: what started the trace (e.g "press")
+        :type name: str
+        """
+        self.tracer = tracer
+        self.id = trace_id
+        self.name = name
+        self.started_at = time.time()
+        self.stages = []
+        self.outcome = None
+
+    def mark(self, stage : str):
+        """Records reaching a stage, on the current thread.
+
+        :param stage: name of the stage
+        :type stage: str
+        """
+        self.stages.append((stage, time.perf_counter(), threading.current_thread().name))
+
+    def finish(self, outcome : str):
+        """Records the end of the trace, adding it to the tracer's buffer. Only the first call does anything.
+
+        :param outcome: how handling the press ended (e.g "played", or "digit" if it was the first of two)
+        :type outcome: str
+        """
+        if self.outcome is not None:
+            return
+        self.outcome = outcome
+        self.mark("finished")
+        self.tracer.record(self)
+
+    def to_dict(self) -> dict:
+        """
+        :return: the trace, with the time of each stage (in ms) since the first
+        :rtype: dict
+        """
+        start = self.stages[0][1] if self.stages else 0
+        return {"id": self.id, "name": self.name, "outcome": self.outcome,
+                "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+                "duration": (self.stages[-1][1] - start)*1000 if self.stages else 0,
+                "stages": [{"stage": stage, "at": (at - start)*1000, "thread": thread} for stage, at, thread in self.stages]}
+
+class Tracer:
+    """Creates traces, keeping the most recent finished ones.
+    """
+    def __init__(self, size : int = TRACE_BUFFER_SIZE):
+        """
+        :param size: number of finished traces to keep, defaults to TRACE_BUFFER_SIZE
+        :type size: int, optional
+        """
+        self.traces = deque(maxlen=size)
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def start(self, name : str, stage : str) -> Trace:
+        """Starts a trace.
+
+        :param name: what started the trace (e.g "press")
+        :type name: str
+        :param stage: name of the first stage (e.g "gpio callback")
+        :type stage: str
+        :return: the trace
+        :rtype: Trace
+        """
+        trace = Trace(self, next(self.ids), name)
+        trace.mark(stage)
+        return trace
+
+    def record(self, trace : Trace):
+        """Adds a finished trace to the buffer (see Trace.finish).
+
+        :param trace: the trace
+        :type trace: Trace
+        """
+        with self.lock:
+            self.traces.append(trace)
+
+    def recent(self) -> list:
+        """
+        :return: the finished traces in the buffer (as dicts, see Trace.to_dict), oldest first
+        :rtype: list
+        """
+        with self.lock:
+            traces = list(self.traces)
+        return [trace.to_dict() for trace in traces]
+
+    def dump(self, filepath : str = TRACE_FILE) -> int:
+        """Writes the finished traces in the buffer to a file, one JSON object per line.
+
+        :param filepath: file to write to (replacing it), defaults to TRACE_FILE
+        :type filepath: str, optional
+        :return: the number of traces written
+        :rtype: int
+        """
+        traces = self.recent()
+        with open(filepath, "w", encoding="utf-8") as f:
+            for trace in traces:
+                f.write(json.dumps(trace) + "\n")
+        return len(traces)
+
+def run_traced(trace : Trace, outcome : str, fn : Callable, *args, **kwargs):
+    """Calls a function (e.g on a worker thread), then finishes the trace.
+
+    :param trace: the trace
+    :type trace: Trace
+    :param outcome: outcome to finish the trace with, if the function returns
+    :type outcome: str
+    :param fn: function to call
+    :type fn: Callable
+    :return: what the function returns
+    """
+    trace.mark("worker started")
+    try:
+        result = fn(*args, **kwargs)
+    except Exception:
+        trace.finish("failed")
+        raise
+    trace.finish(outcome)
+    return result
+
+# Tracer shared by the whole application
+tracer = Tracer()
+
+def get_tracer() -> Tracer:
+    """
+    :return: the tracer shared by the whole application
+    :rtype: Tracer
+    """
+    return tracer
@@ -0,0 +1,109 @@
+"""Compact storage of playlist tracks for the jukebox software.
+
+Rather than one Python object per track (or per title/artist/uri string), a TrackTable stores each column
+packed into a single buffer: titles and uris as UTF-8 bytes with an array of offsets, and artists as an
+array of indices into a list of the distinct artist names. Rows are only turned into Python objects when
+they are read, so even playlists with tens of thousands of tracks take up little memory.
+"""
+
+from array import array
+from collections.abc import Iterable
+
+class StringColumn:
+    """Column of strings packed into a single UTF-8 buffer.
+    """
+    __slots__ = ("buffer", "offsets")
+
+    def __init__(self, strings : Iterable):
+        """
+        :param strings: the strings to store
+        :type strings: Iterable
+        """
+        buffer = bytearray()
+        offsets = array("L", [0])
+        for string in strings:
+            buffer += string.encode("utf-8")
+            offsets.append(len(buffer))
+        self.buffer = bytes(buffer)
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index : int) -> str:
+        return self.buffer[self.offsets[index]:self.offsets[index+1]].decode("utf-8")
+
+    def startswith(self, other : "StringColumn") -> bool:
+        """
+        :param other: another column
+        :type other: StringColumn
+        :return: whether this column starts with all the strings of the other, in order
+        :rtype: bool
+        """
+        return self.offsets[:len(other.offsets)] == other.offsets and self.buffer.startswith(other.buffer)
+
+class IndexedColumn:
+    """Column of strings with many repeats, stored as indices into a list of the distinct values.
+    """
+    __slots__ = ("values", "indices")
+
+    def __init__(self, strings : Iterable):
+        """
+        :param strings: the strings to store
+        :type strings: Iterable
+        """
+        lookup = {}
+        self.values = []
+        self.indices = array("L")
+        for string in strings:
+            if string not in lookup:
+                lookup[string] = len(self.values)
+                self.values.append(string)
+            self.indices.append(lookup[string])
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def __getitem__(self, index : int) -> str:
+        return self.values[self.indices[index]]
+
+class TrackTable:
+    """Read-only table of tracks, behaving like a list of (title, artist, uri) tuples.
+    """
+    __slots__ = ("titles", "artists", "uris")
+
+    def __init__(self, tracks : Iterable = ()):
+        """
+        :param tracks: (title, artist, uri) of each track
+        :type tracks: Iterable
+        """
+        tracks = list(tracks)
+        self.titles = StringColumn(title for title,_,_ in tracks)
+        self.artists = IndexedColumn(artist for _,artist,_ in tracks)
+        self.uris = StringColumn(uri for _,_,uri in tracks)
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.row(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("track index out of range.")
+        return self.row(index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.row(i)
+
+    def row(self, index : int) -> tuple:
+        """Retrieves a single track.
+
+        :param index: index of the track
+        :type index: int
+        :return: (title, artist, uri) of the track
+        :rtype: tuple
+        """
+        return self.titles[index], self.artists[index], self.uris[index]
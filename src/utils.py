@@ -3,21 +3,173 @@
 Includes a wrapper for the python requests module which automatically adds api credentials 
 and generates a new api key if the old one has expired.
 
-Also responsible for reading the user-provided config data (e.g playlist ID).
+Also responsible for reading the user-provided config data (e.g playlist ID). The config is only read on
+first use (see get_config), so importing this module does no I/O.
 """
 
 import os
 import json
+import time
+import threading
+from functools import partial
+from collections.abc import Callable
+from urllib.parse import urlsplit
 import requests
-import yaml
+from requests.adapters import HTTPAdapter
+if __package__:
+    from src.credentials import CredentialStore
+    from src.metrics import get_metrics, endpoint
+    from src.scheduler import RequestScheduler
+else:
+    from credentials import CredentialStore
+    from metrics import get_metrics, endpoint
+    from scheduler import RequestScheduler
 
 # Request type variables
 TYPES = {
-    "GET": lambda url,headers,data,timeout : requests.get(url=url,headers=headers,data=data,timeout=timeout),
-    "POST": lambda url,headers,data,timeout : requests.post(url=url,headers=headers,data=data,timeout=timeout),
-    "PUT": lambda url,headers,data,timeout : requests.put(url=url,headers=headers,data=data,timeout=timeout)
+    "GET": lambda url,headers,data,timeout : send("GET",url,headers,data,timeout),
+    "POST": lambda url,headers,data,timeout : send("POST",url,headers,data,timeout),
+    "PUT": lambda url,headers,data,timeout : send("PUT",url,headers,data,timeout)
 }
 
+# Base urls of the spotify web API and accounts service (overridable in config.yaml, e.g to use a local test server)
+API_URL = "https://api.spotify.com/v1"
+ACCOUNTS_URL = "https://accounts.spotify.com"
+
+# Connection pool defaults (overridable in config.yaml)
+DEFAULT_POOL_SIZE = 4
+DEFAULT_KEEP_ALIVE = True
+
+# Request scheduling defaults (overridable in config.yaml)
+DEFAULT_REQUESTS_PER_SECOND = 10
+DEFAULT_REQUEST_BURST = 20
+DEFAULT_MAX_RETRIES = 3
+
+# Config file, relative to the working directory (read on first use, see get_config)
+CONFIG_FILE = "../config.yaml"
+loaded_config = None
+settings = {}
+config_lock = threading.Lock()
+
+# One credential store per secrets file
+credential_stores = {}
+credentials_lock = threading.Lock()
+
+# One long-lived session per host, shared by every request
+sessions = {}
+sessions_lock = threading.Lock()
+
+# Single scheduler shared by every request, so they are all rate limited together
+scheduler = None
+scheduler_lock = threading.Lock()
+
+def api_url(path : str) -> str:
+    """Builds the url of a web API endpoint.
+
+    :param path: path of the endpoint, after the API version (e.g "/me/player/play")
+    :type path: str
+    :return: the full url
+    :rtype: str
+    """
+    get_config()  # The config may point requests at a different server
+    return API_URL + path
+
+def set_base_urls(api : str = None, accounts : str = None):
+    """Points every request at different servers (e.g a local fake of the spotify web API).
+
+    :param api: base url of the web API, including the version (e.g "http://127.0.0.1:8000/v1"), defaults to None (unchanged)
+    :type api: str, optional
+    :param accounts: base url of the accounts service, defaults to None (unchanged)
+    :type accounts: str, optional
+    """
+    global API_URL, ACCOUNTS_URL
+    if api:
+        API_URL = api.rstrip("/")
+    if accounts:
+        ACCOUNTS_URL = accounts.rstrip("/")
+
+def get_session(url : str) -> requests.Session:
+    """Retrieves the pooled, keep-alive session for the host of the given url, creating it on first use.
+
+    Reusing a session means only the first request to each host pays for the TCP and TLS handshake.
+
+    :param url: url that is about to be requested
+    :type url: str
+    :return: the session for the url's host
+    :rtype: requests.Session
+    """
+    parts = urlsplit(url)
+    host = f"{parts.scheme}://{parts.netloc}"
+    with sessions_lock:
+        if host not in sessions:
+            config = get_config()
+            pool_size = config.get("pool_size") or DEFAULT_POOL_SIZE
+            keep_alive = config.get("keep_alive")
+            if keep_alive is None:
+                keep_alive = DEFAULT_KEEP_ALIVE
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount(host, adapter)
+            if not keep_alive:
+                session.headers["Connection"] = "close"
+            sessions[host] = session
+        return sessions[host]
+
+def send(method : str, url : str, headers : dict = None, data : str = None, timeout : float = None) -> requests.Response:
+    """Sends a single http request on the pooled session for the url's host, recording it in the request metrics
+    (see metrics.RequestMetrics).
+
+    :param method: http method (GET, POST or PUT)
+    :type method: str
+    :param url: url to request
+    :type url: str
+    :param headers: headers to send, defaults to None
+    :type headers: dict, optional
+    :param data: data to send, defaults to None
+    :type data: str, optional
+    :param timeout: how long to wait (in s) for a response before giving up, defaults to None (forever)
+    :type timeout: float, optional
+    :raises requests.exceptions.RequestException: if no response was received
+    :return: the response
+    :rtype: requests.Response
+    """
+    name = endpoint(method, url)
+    sent = len(data.encode("utf-8") if isinstance(data, str) else data or b"")
+    start = time.perf_counter()
+    try:
+        response = get_session(url).request(method, url=url, headers=headers, data=data, timeout=timeout)
+    except requests.exceptions.RequestException as e:
+        get_metrics().observe(name, time.perf_counter() - start, sent, error=type(e).__name__)
+        raise
+    error = f"http {response.status_code}" if response.status_code >= 400 else None
+    get_metrics().observe(name, time.perf_counter() - start, sent, len(response.content), error)
+    return response
+
+def get_scheduler() -> RequestScheduler:
+    """Retrieves the process-wide request scheduler, creating it on first use.
+
+    :return: the request scheduler
+    :rtype: RequestScheduler
+    """
+    global scheduler
+    with scheduler_lock:
+        if scheduler is None:
+            config = get_config()
+            max_retries = config.get("max_retries")
+            if max_retries is None:
+                max_retries = DEFAULT_MAX_RETRIES
+            scheduler = RequestScheduler(rate=config.get("requests_per_second") or DEFAULT_REQUESTS_PER_SECOND,
+                                         burst=config.get("request_burst") or DEFAULT_REQUEST_BURST, max_retries=max_retries)
+        return scheduler
+
+def close_sessions():
+    """Closes every pooled session (and so every kept-alive connection).
+    """
+    with sessions_lock:
+        for session in sessions.values():
+            session.close()
+        sessions.clear()
+
 def get_secrets(filepath : str) -> dict:
     """Retrieves secrets (api key and refresh token) from given file.
 
@@ -36,9 +188,46 @@ def get_secrets(filepath : str) -> dict:
         get_secrets(filepath)
     return secrets
 
+def get_credentials(filepath : str) -> CredentialStore:
+    """Retrieves the process-wide credential store for the given secrets file, creating it on first use.
+
+    :param filepath: location of secrets file (usually secrets.json)
+    :type filepath: str
+    :return: the credential store for that file
+    :rtype: CredentialStore
+    """
+    key = os.path.abspath(filepath)
+    with credentials_lock:
+        if key not in credential_stores:
+            credential_stores[key] = CredentialStore(filepath, get_secrets, refresher=fetch_new_token)
+        return credential_stores[key]
+
+def fetch_new_token(secrets: dict) -> dict:
+    """Requests a new api key from the token endpoint using a given refresh token.
+
+    :param secrets: existing secrets dictionary containing the refresh token
+    :type secrets: dict
+    :raises ConnectionAbortedError: if the response is an error message
+    :return: the token endpoint's json response (access_token, expires_in, ...)
+    :rtype: dict
+    """
+    config = get_config()
+    headers={"Content-Type": "application/x-www-form-urlencoded"}
+    data=f'grant_type=refresh_token&refresh_token={secrets["refresh_token"]}&client_id={config["client_id"]}&client_secret={config["client_secret"]}'
+    url = f"{ACCOUNTS_URL}/api/token"
+    get_metrics().count_token_refresh()
+    response = send("POST", url, headers, data, timeout=10)
+    token = json.loads(response.content)
+    if "access_token" not in token:
+        raise ConnectionAbortedError(token)
+    return token
+
 def get_new_token(secrets: dict, filepath: str) -> dict:
-    """Retrieves a new api key using a given refresh token, and writes
-    to desired secrets file.
+    """Retrieves a new api key using a given refresh token, and stores it in
+    the credential store for the desired secrets file (written to disk in the background).
+
+    If another thread has already replaced the given api key, its new key is returned instead
+    of refreshing again.
 
     :param secrets: existing secrets dictionary obtained from existing secrets file
     :type secrets: dict
@@ -47,19 +236,13 @@ def get_new_token(secrets: dict, filepath: str) -> dict:
     :return: new secrets dictionary with new api key
     :rtype: dict
     """
-    headers={"Content-Type": "application/x-www-form-urlencoded"}
-    data=f'grant_type=refresh_token&refresh_token={secrets["refresh_token"]}&client_id={config["client_id"]}&client_secret={config["client_secret"]}'
-    response = requests.post(url="https://accounts.spotify.com/api/token", data=data, headers=headers, timeout=1000)
-    secrets["access_token"] = json.loads(response.content)["access_token"]
-    # Write new key to file
-    with open(filepath, "w", encoding="utf-8") as f:
-        json.dump(secrets, f)
-    return secrets
+    return get_credentials(filepath).refresh(stale_token=secrets.get("access_token"))
 
 def request(request_type: str, url: str, secrets_file: str = "../src/secrets.json", headers: dict = None, data: str = None, timeout: int = 1) -> dict:
     """Wrapper for the python requests module which automatically incorporates api credentials into the http request. 
     
-    Automatically obtains new api key if the current one has expired.
+    Automatically obtains new api key if the current one has expired. Requests are rate limited, and retried if
+    the server is temporarily refusing them (see scheduler.RequestScheduler).
 
     Can be used to make 3 types of http request: GET, POST and PUT.
 
@@ -77,6 +260,7 @@ def request(request_type: str, url: str, secrets_file: str = "../src/secrets.jso
     :param timeout: how long to wait (in s) for response before giving up, defaults to 1000
     :type timeout: int, optional
     :raises ValueError: if an invalid request type is parsed
+    :raises scheduler.RateLimitedError: if the web API is rate limiting the jukebox
     :raises ConnectionAbortedError: if the response is an error message
     :return: the json response
     :rtype: dict
@@ -85,11 +269,16 @@ def request(request_type: str, url: str, secrets_file: str = "../src/secrets.jso
         raise ValueError("invalid request type.")
     if not headers:
         headers = {}
-    secrets = get_secrets(secrets_file)
+    secrets = get_credentials(secrets_file).get()
     failure = True
     while failure:
         headers["Authorization"] = "Bearer "+ secrets['access_token']
-        response = TYPES[request_type](url, headers, data, timeout)
+        attempts = []
+        try:
+            response = get_scheduler().send(partial(count_attempt, attempts, TYPES[request_type], url, headers, data, timeout))
+        finally:
+            if len(attempts) > 1:
+                get_metrics().count_retries(len(attempts) - 1)
         try:
             json_response = json.loads(response.content)
         except json.decoder.JSONDecodeError:
@@ -103,6 +292,19 @@ def request(request_type: str, url: str, secrets_file: str = "../src/secrets.jso
             failure = False
     return json_response
 
+def count_attempt(attempts : list, send_request : Callable, *args) -> requests.Response:
+    """Sends a request, counting the attempt (the scheduler may make several, see scheduler.RequestScheduler.send).
+
+    :param attempts: list of attempts so far, added to
+    :type attempts: list
+    :param send_request: sends the request, one of TYPES
+    :type send_request: Callable
+    :return: the response
+    :rtype: requests.Response
+    """
+    attempts.append(time.perf_counter())
+    return send_request(*args)
+
 def get_api_credentials(filepath : str):
     """Generates brand new api credentials (api token and refresh token) if not present on system.
 
@@ -112,25 +314,95 @@ def get_api_credentials(filepath : str):
     import spotipy
     from spotipy.oauth2 import SpotifyOAuth, CacheFileHandler
 
+    config = get_config()
     scope = "playlist-read-private playlist-read-collaborative user-modify-playback-state"
 
     sp = spotipy.Spotify(auth_manager=SpotifyOAuth(cache_handler=CacheFileHandler(cache_path=filepath), client_id=config["client_id"], client_secret=config["client_secret"], redirect_uri="http://127.0.0.1:4321", scope=scope))
     sp.current_user_playlists()  # Needed to actually obtain the api credentials
 
-def refresh_device_id():
-    devs = request("GET", "https://api.spotify.com/v1/me/player/devices")["devices"]
-    chosen_device = [dev for dev in devs if dev["name"]==device_name][0]
-    return chosen_device["id"]
+def load_config(filepath : str) -> dict:
+    """Reads and checks the user-provided config file.
+
+    :param filepath: location of the config file (usually config.yaml)
+    :type filepath: str
+    :raises KeyError: if the config file does not have a client id or client secret
+    :return: the config as a dictionary
+    :rtype: dict
+    """
+    import yaml  # Only needed here, so not imported until the config is read
 
-# Reading config vars
-with open("../config.yaml", encoding="utf-8") as config_file:
-    config = yaml.safe_load(config_file)
+    with open(filepath, encoding="utf-8") as config_file:
+        config = yaml.safe_load(config_file) or {}
     # Error handling
-    if not config["client_id"]:
+    if not config.get("client_id"):
         raise KeyError("config file does not have a client id.")
-    elif not config["client_secret"]:
+    elif not config.get("client_secret"):
         raise KeyError("config file does not have a client secret.")
+    return config
+
+def read_settings(config : dict) -> dict:
+    """Works out the settings used around the jukebox from the config, filling in defaults for optional ones.
+
+    :param config: the config, as returned by load_config
+    :type config: dict
+    :return: the settings, by the name they are accessed from this module with (e.g SONGS_PER_PAGE)
+    :rtype: dict
+    """
+    settings = {
+        "DEVICE_NAME": config.get("device_name"),
+        # Devices to play on if device_name isn't available, most preferred first
+        "FALLBACK_DEVICES": config.get("fallback_devices") or [],
+        # Time (in s) between background lookups of the device to play on (0 disables them)
+        "DEVICE_CHECK_INTERVAL": config.get("device_check_interval"),
+        "SONGS_PER_PAGE": config.get("songs_per_page"),
+        "PLAYLIST_ID": config.get("playlist_id"),
+        # Time (in s) between background checks for changes to the playlist (0 disables them)
+        "PLAYLIST_CHECK_INTERVAL": config.get("playlist_check_interval"),
+        "PLAYLIST_CACHE_FILE": config.get("playlist_cache") or "../src/playlist_cache.db",
+        # Pages either side of the shown page to prefetch, and how many pages (for how long, in s) to keep
+        "PREFETCH_PAGES": config.get("prefetch_pages") or 1,
+        "PAGE_CACHE_SIZE": config.get("page_cache_size") or 16,
+        "PAGE_CACHE_MAX_AGE": config.get("page_cache_max_age") or 300,
+        # Frame rate of the scrolling song titles
+        "MARQUEE_FPS": config.get("marquee_fps") or 2,
+        # Local port to serve request metrics on (see metrics.py), None to not serve them
+        "METRICS_PORT": config.get("metrics_port")
+    }
+    # 0 is allowed for these, so only fill in missing ones
+    if settings["DEVICE_CHECK_INTERVAL"] is None:
+        settings["DEVICE_CHECK_INTERVAL"] = 300
+    if settings["PLAYLIST_CHECK_INTERVAL"] is None:
+        settings["PLAYLIST_CHECK_INTERVAL"] = 60
+    return settings
+
+def get_config() -> dict:
+    """Retrieves the user-provided config, reading CONFIG_FILE on first use (and pointing requests at any
+    api_url/accounts_url it gives).
+
+    :return: the config as a dictionary
+    :rtype: dict
+    """
+    global loaded_config, settings
+    with config_lock:
+        if loaded_config is None:
+            config = load_config(CONFIG_FILE)
+            settings = read_settings(config)
+            set_base_urls(config.get("api_url"), config.get("accounts_url"))
+            loaded_config = config
+        return loaded_config
 
-device_name = config["device_name"]
-SONGS_PER_PAGE = config["songs_per_page"]
-PLAYLIST_ID = config["playlist_id"]
+def __getattr__(name : str):
+    """Reads the config on first access to it, or to a setting from it (e.g utils.SONGS_PER_PAGE), rather
+    than on import.
+
+    :param name: name of the attribute
+    :type name: str
+    :raises AttributeError: if there is no such attribute or setting
+    """
+    if name == "config":
+        return get_config()
+    if name.isupper():
+        get_config()
+        if name in settings:
+            return settings[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,19 @@
+# Changing path for imports
+import sys
+import pytest
+sys.path.append("../")
+
+import json
+from src import utils
+
+@pytest.fixture
+def config(tmp_path_factory, monkeypatch):
+    """Points the jukebox at a throwaway config.yaml for the length of a test, so tests never read the real one.
+    """
+    config_file = tmp_path_factory.mktemp("config")/"config.yaml"
+    with open(config_file, "w", encoding="utf-8") as f:
+        json.dump({"client_id": "test", "client_secret": "test", "device_name": "Jukebox", "playlist_id": "abc"}, f)  # JSON is valid YAML
+    monkeypatch.setattr(utils, "CONFIG_FILE", str(config_file))
+    monkeypatch.setattr(utils, "loaded_config", None)
+    monkeypatch.setattr(utils, "settings", {})
+    return config_file
@@ -0,0 +1,435 @@
+"""Local stand-in for the parts of the spotify web API (and accounts service) used by the jukebox.
+
+Serves synthetic playlists of any size over http on 127.0.0.1, so the jukebox can be tested and benchmarked
+without network access or real credentials. Point the jukebox at it with utils.set_base_urls (or the api_url
+and accounts_url keys in config.yaml).
+
+    with FakeSpotify(playlists={"abc": 500}) as spotify:
+        utils.set_base_urls(spotify.api_url, spotify.url)
+
+Responses can be slowed down (latency, jitter) and made to fail: access tokens can be expired, requests beyond
+a rate limit are refused, and one-off faults (e.g a 404 for the device, a 429, or a response that takes too long)
+can be injected with fail. It can also be run on its own for load testing (python fake_spotify.py --help).
+"""
+
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+WORDS = ["Love", "Night", "Song", "Blue", "Heart", "Dancing", "Forever", "The", "Of", "In", "Midnight", "Summer", "Don't", "Stop", "Dreams", "Light"]
+MAX_LIMIT = 100
+
+# Injectable faults
+EXPIRED = "expired"  # 401, access token expired
+NOT_FOUND = "not found"  # 404, e.g the device has gone away
+RATE_LIMITED = "rate limited"  # 429, with a Retry-After header
+SERVER_ERROR = "server error"  # 500
+UNAVAILABLE = "unavailable"  # 503
+TIMEOUT = "timeout"  # Answers normally, but only after a long delay
+FAULTS = {
+    EXPIRED: (401, "The access token expired"),
+    NOT_FOUND: (404, "Device not found"),
+    RATE_LIMITED: (429, "API rate limit exceeded"),
+    SERVER_ERROR: (500, "Server error"),
+    UNAVAILABLE: (503, "Service unavailable")
+}
+
+class Fault:
+    """Fault to inject into matching requests.
+    """
+    __slots__ = ("kind", "method", "path", "times", "retry_after", "delay")
+
+    def __init__(self, kind : str, method : str, path : str, times : int, retry_after : int, delay : float):
+        self.kind = kind
+        self.method = method
+        self.path = path
+        self.times = times
+        self.retry_after = retry_after
+        self.delay = delay
+
+    def matches(self, method : str, path : str) -> bool:
+        return (self.method is None or self.method == method) and path.startswith(self.path)
+
+def parse_fields(fields : str) -> dict:
+    """Parses a web API fields filter (e.g "total,items(track(name,uri))") into a tree of field names.
+
+    :param fields: the fields filter
+    :type fields: str
+    :return: field names, mapped to the tree of their own fields (None to include all of them)
+    :rtype: dict
+    """
+    tree, _ = parse_field_list(fields, 0)
+    return tree
+
+def parse_field_list(fields : str, i : int) -> tuple:
+    tree = {}
+    name = ""
+    while i < len(fields):
+        char = fields[i]
+        if char == "(":
+            tree[name], i = parse_field_list(fields, i+1)
+            name = ""
+        elif char == ")":
+            break
+        elif char == ",":
+            if name:
+                tree[name] = None
+            name = ""
+        else:
+            name += char
+        i += 1
+    if name:
+        tree[name] = None
+    return tree, i
+
+def apply_fields(value, tree : dict):
+    """Keeps only the fields of a json value in a parsed fields filter (dotted names select nested fields).
+
+    :param value: json value
+    :param tree: parsed fields filter, None to keep everything
+    :type tree: dict
+    :return: the filtered value
+    """
+    if tree is None:
+        return value
+    if isinstance(value, list):
+        return [apply_fields(item, tree) for item in value]
+    if not isinstance(value, dict):
+        return value
+    filtered = {}
+    for name, subtree in tree.items():
+        first, _, rest = name.partition(".")
+        if first not in value:
+            continue
+        if rest:
+            subtree = {rest: subtree}
+        filtered[first] = apply_fields(value[first], subtree)
+    return filtered
+
+def synthetic_track(playlist_id : str, i : int) -> dict:
+    """Makes up a playlist item, with names long enough to need scrolling every so often.
+
+    :param playlist_id: ID of the playlist
+    :type playlist_id: str
+    :param i: position of the item in the playlist
+    :type i: int
+    :return: the playlist item (a track object, with the time it was added)
+    :rtype: dict
+    """
+    name = " ".join(WORDS[(i*7 + j*3) % len(WORDS)] for j in range(1 + i % 6))
+    artist = {"id": f"artist{i % 97}", "name": f"Artist {i % 97}", "type": "artist", "uri": f"spotify:artist:artist{i % 97}"}
+    album = {"id": f"album{i % 211}", "name": f"Album {i % 211}", "album_type": "album", "artists": [artist], "release_date": "2001-01-01",
+             "total_tracks": 12, "type": "album", "uri": f"spotify:album:album{i % 211}"}
+    track = {"id": f"{playlist_id}track{i}", "name": f"{name} {i}", "artists": [artist], "album": album, "duration_ms": 180000 + i % 60000,
+             "explicit": False, "popularity": i % 100, "track_number": 1 + i % 12, "type": "track", "uri": f"spotify:track:{playlist_id}track{i}"}
+    return {"added_at": "2024-01-01T00:00:00Z", "is_local": False, "track": track}
+
+class FakeSpotify:
+    """Fake spotify web API server, running on a background thread.
+    """
+    def __init__(self, playlists : dict = None, devices : list = None, latency : float = 0, jitter : float = 0, rate_limit : int = None, port : int = 0):
+        """
+        :param playlists: number of tracks in each playlist, by playlist ID, defaults to None (no playlists)
+        :type playlists: dict, optional
+        :param devices: names of the available playback devices, defaults to None (a single "Jukebox")
+        :type devices: list, optional
+        :param latency: time (in s) to wait before answering each request, defaults to 0
+        :type latency: float, optional
+        :param jitter: maximum extra time (in s) to wait, chosen at random for each request, defaults to 0
+        :type jitter: float, optional
+        :param rate_limit: maximum number of web API requests to answer in any second (429 after that), defaults to None (no limit)
+        :type rate_limit: int, optional
+        :param port: port to listen on, defaults to 0 (any free port)
+        :type port: int, optional
+        """
+        self.playlists = {}
+        for playlist_id, num_tracks in (playlists or {}).items():
+            self.set_playlist(playlist_id, num_tracks)
+        self.devices = [{"id": f"device{i}", "name": name, "is_active": i == 0, "type": "Computer", "volume_percent": 100}
+                        for i, name in enumerate(devices or ["Jukebox"])]
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.recent = []  # When recent web API requests were received, for the rate limit
+        self.expired = set()
+        self.faults = []
+        self.requests = []
+        self.listeners = []
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(self))
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        """Base url of the server (and of the fake accounts service).
+        """
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    @property
+    def api_url(self) -> str:
+        """Base url of the fake web API.
+        """
+        return f"{self.url}/v1"
+
+    def start(self) -> "FakeSpotify":
+        """Starts answering requests in the background.
+
+        :return: the server
+        :rtype: FakeSpotify
+        """
+        self.thread = threading.Thread(target=self.server.serve_forever, name="fake-spotify", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stops the server.
+        """
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *_):
+        self.stop()
+
+    def set_playlist(self, playlist_id : str, num_tracks : int):
+        """Creates (or changes the length of) a playlist, giving it a new snapshot ID.
+
+        :param playlist_id: ID of the playlist
+        :type playlist_id: str
+        :param num_tracks: number of tracks in the playlist
+        :type num_tracks: int
+        """
+        previous = self.playlists.get(playlist_id)
+        version = previous["version"] + 1 if previous else 0
+        self.playlists[playlist_id] = {"total": num_tracks, "version": version, "snapshot_id": f"{playlist_id}-{version}"}
+
+    def expire(self, token : str):
+        """Makes requests with an access token fail with 401 "The access token expired", like a real expired token.
+
+        Any other token is accepted, including ones never given out by the server.
+
+        :param token: the access token
+        :type token: str
+        """
+        with self.lock:
+            self.expired.add(token)
+
+    def fail(self, kind : str, path : str = "", method : str = None, times : int = 1, retry_after : int = 1, delay : float = 5):
+        """Makes matching requests fail.
+
+        :param kind: what should go wrong (EXPIRED, NOT_FOUND, RATE_LIMITED, SERVER_ERROR, UNAVAILABLE or TIMEOUT)
+        :type kind: str
+        :param path: only fail requests whose path starts with this (e.g "/v1/me/player/play"), defaults to "" (any)
+        :type path: str, optional
+        :param method: only fail requests with this http method, defaults to None (any)
+        :type method: str, optional
+        :param times: number of requests to fail, defaults to 1
+        :type times: int, optional
+        :param retry_after: time (in s) given in the Retry-After header of RATE_LIMITED responses, defaults to 1
+        :type retry_after: int, optional
+        :param delay: time (in s) TIMEOUT responses take, defaults to 5
+        :type delay: float, optional
+        :raises ValueError: if the kind of fault isn't known
+        """
+        if kind not in FAULTS and kind != TIMEOUT:
+            raise ValueError(f"unknown fault {kind}.")
+        with self.lock:
+            self.faults.append(Fault(kind, method, path, times, retry_after, delay))
+
+    def take_fault(self, method : str, path : str) -> Fault:
+        """Finds the first fault matching a request, using it up.
+
+        :return: the fault, None if there isn't one
+        :rtype: Fault
+        """
+        with self.lock:
+            for fault in self.faults:
+                if fault.matches(method, path):
+                    fault.times -= 1
+                    if fault.times <= 0:
+                        self.faults.remove(fault)
+                    return fault
+        return None
+
+    def rate_limited(self) -> bool:
+        """Records a web API request, checking whether it goes over the rate limit.
+
+        :return: whether the request should be refused
+        :rtype: bool
+        """
+        if not self.rate_limit:
+            return False
+        now = time.monotonic()
+        with self.lock:
+            self.recent = [received for received in self.recent if now - received < 1]
+            if len(self.recent) >= self.rate_limit:
+                return True
+            self.recent.append(now)
+        return False
+
+    def add_listener(self, listener):
+        """Calls a function with every request, once it has been answered (on the server's threads).
+
+        :param listener: called with the time the response finished being written (from time.perf_counter), method and path of each request
+        :type listener: Callable
+        """
+        self.listeners.append(listener)
+
+    def handle(self, method : str, path : str, query : dict, token : str = None) -> tuple:
+        """Answers a request.
+
+        :param method: http method
+        :type method: str
+        :param path: path of the request
+        :type path: str
+        :param query: query parameters
+        :type query: dict
+        :param token: access token the request was authorised with, defaults to None
+        :type token: str, optional
+        :return: http status and json body (None for no content)
+        :rtype: tuple
+        """
+        parts = path.strip("/").split("/")
+        if method == "POST" and path == "/api/token":
+            return 200, {"access_token": f"token{time.monotonic_ns()}", "token_type": "Bearer", "expires_in": 3600}
+        if parts[:1] != ["v1"]:
+            return error(404, "Service not found")
+        if not token:
+            return error(401, "No token provided")
+        if token in self.expired:
+            return error(*FAULTS[EXPIRED])
+        parts = parts[1:]
+        if method == "GET" and len(parts) in (2, 3) and parts[0] == "playlists":
+            playlist = self.playlists.get(parts[1])
+            if not playlist:
+                return error(404, "Not found.")
+            fields = parse_fields(query["fields"]) if "fields" in query else None
+            if len(parts) == 2:
+                return 200, apply_fields(self.playlist_object(parts[1], playlist), fields)
+            offset = int(query.get("offset", 0))
+            limit = int(query.get("limit", 100))
+            if limit > MAX_LIMIT:
+                return error(400, "Invalid limit")
+            return 200, apply_fields(self.tracks_page(parts[1], playlist, offset, limit), fields)
+        if parts[:2] == ["me", "player"] and len(parts) == 3:
+            if method == "GET" and parts[2] == "devices":
+                return 200, {"devices": self.devices}
+            if method == "PUT" and parts[2] in ("play", "pause"):
+                device_id = query.get("device_id")
+                if device_id and device_id not in [device["id"] for device in self.devices]:
+                    return error(404, "Device not found")
+                return 204, None
+        return error(404, "Service not found")
+
+    def playlist_object(self, playlist_id : str, playlist : dict) -> dict:
+        page = self.tracks_page(playlist_id, playlist, 0, MAX_LIMIT)
+        return {"id": playlist_id, "name": f"Playlist {playlist_id}", "public": True, "snapshot_id": playlist["snapshot_id"],
+                "type": "playlist", "uri": f"spotify:playlist:{playlist_id}", "tracks": page}
+
+    def tracks_page(self, playlist_id : str, playlist : dict, offset : int, limit : int) -> dict:
+        total = playlist["total"]
+        items = [synthetic_track(playlist_id, i) for i in range(offset, min(offset + limit, total))]
+        url = f"{self.api_url}/playlists/{playlist_id}/tracks"
+        return {"href": f"{url}?offset={offset}&limit={limit}", "items": items, "limit": limit, "offset": offset, "total": total,
+                "next": f"{url}?offset={offset+limit}&limit={limit}" if offset + limit < total else None,
+                "previous": f"{url}?offset={max(offset-limit, 0)}&limit={limit}" if offset > 0 else None}
+
+def error(status : int, message : str) -> tuple:
+    """
+    :return: http status and json body of a web API error
+    :rtype: tuple
+    """
+    return status, {"error": {"status": status, "message": message}}
+
+def make_handler(spotify : FakeSpotify) -> type:
+    """Makes a request handler class answering requests with the given server.
+
+    :param spotify: the fake server
+    :type spotify: FakeSpotify
+    :return: the request handler class
+    :rtype: type
+    """
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keeps connections alive, like the real API
+
+        def do_GET(self):
+            self.answer("GET")
+
+        def do_POST(self):
+            self.answer("POST")
+
+        def do_PUT(self):
+            self.answer("PUT")
+
+        def answer(self, method : str):
+            received = time.perf_counter()
+            length = int(self.headers.get("Content-Length") or 0)
+            if length:
+                self.rfile.read(length)
+            parts = urlsplit(self.path)
+            query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+            delay = spotify.latency + random.uniform(0, spotify.jitter)
+            headers = {}
+            fault = spotify.take_fault(method, parts.path)
+            if fault and fault.kind == TIMEOUT:
+                delay += fault.delay
+                fault = None
+            if delay:
+                time.sleep(delay)
+            if fault:
+                status, body = error(*FAULTS[fault.kind])
+                if fault.kind == RATE_LIMITED:
+                    headers["Retry-After"] = str(fault.retry_after)
+            elif parts.path.startswith("/v1/") and spotify.rate_limited():
+                status, body = error(*FAULTS[RATE_LIMITED])
+                headers["Retry-After"] = "1"
+            else:
+                authorization = self.headers.get("Authorization") or ""
+                token = authorization.removeprefix("Bearer ") if authorization.startswith("Bearer ") else None
+                status, body = spotify.handle(method, parts.path, query, token)
+            content = json.dumps(body).encode() if body is not None else b""
+            self.send_response(status)
+            if body is not None:
+                self.send_header("Content-Type", "application/json")
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+            self.wfile.flush()
+            answered = time.perf_counter()
+            with spotify.lock:
+                spotify.requests.append((received, method, self.path))
+            for listener in spotify.listeners:
+                listener(answered, method, self.path)
+
+        def log_message(self, *_):
+            pass  # Keeps test and benchmark output clean
+
+    return Handler
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs a fake spotify web API server until interrupted.")
+    parser.add_argument("--port", type=int, default=8000, help="port to listen on")
+    parser.add_argument("--playlist", default="fake", help="ID of the playlist to serve")
+    parser.add_argument("--tracks", type=int, default=1000, help="number of tracks in the playlist")
+    parser.add_argument("--device", default="Jukebox", help="name of the playback device")
+    parser.add_argument("--latency", type=float, default=0, help="time (in s) to wait before answering each request")
+    parser.add_argument("--jitter", type=float, default=0, help="maximum extra random time (in s) to wait")
+    parser.add_argument("--rate-limit", type=int, help="maximum web API requests per second")
+    args = parser.parse_args()
+    spotify = FakeSpotify(playlists={args.playlist: args.tracks}, devices=[args.device], latency=args.latency, jitter=args.jitter,
+                          rate_limit=args.rate_limit, port=args.port).start()
+    print(f"api_url: {spotify.api_url}\naccounts_url: {spotify.url}")
+    try:
+        spotify.thread.join()
+    except KeyboardInterrupt:
+        spotify.stop()
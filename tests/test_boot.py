@@ -0,0 +1,50 @@
+# Changing path for imports
+import sys
+sys.path.append("../")
+
+import json
+import time
+import pstats
+import threading
+import subprocess
+from src.boot import BootTimeline, get_timeline, process_age
+
+def test_phases():
+    timeline = BootTimeline()
+    with timeline.phase("setupUi"):
+        time.sleep(0.05)
+    with timeline.phase("setupUi"):  # Only the first time is recorded
+        pass
+    timeline.begin("create_pages")
+    thread = threading.Thread(target=timeline.end, args=("create_pages",), name="worker")
+    thread.start()
+    thread.join()
+    timeline.end("never begun")
+    phases = {phase["name"]: phase for phase in timeline.to_dict()["phases"]}
+    assert list(phases)==["python startup", "setupUi", "create_pages"]
+    assert phases["setupUi"]["duration"] >= 0.05
+    assert phases["setupUi"]["start"] >= phases["python startup"]["end"]
+    assert phases["create_pages"]["thread"]=="worker"
+
+def test_finish(tmp_path):
+    timeline = BootTimeline(log_file=tmp_path/"boot.json", profile_file=tmp_path/"boot.prof")
+    with timeline.phase("config"):
+        sum(range(1000))
+    timeline.finish()
+    with timeline.phase("after boot"):  # Ignored once boot has finished
+        pass
+    timeline.finish()
+    with open(tmp_path/"boot.json", encoding="utf-8") as f:
+        phases = [phase["name"] for phase in json.load(f)["phases"]]
+    assert phases==["python startup", "config", "usable"]
+    assert pstats.Stats(str(tmp_path/"boot.prof")).total_calls > 0
+
+def test_process_age():
+    # This process has been running for at least as long as it's been importing things
+    assert 0 <= process_age() < time.time()
+
+def test_get_timeline():
+    # Importing the jukebox doesn't create the timeline (which reads /proc and may start profiling), using it does
+    script = "import src.context, src.boot; print(src.boot.timeline)"
+    assert subprocess.run([sys.executable, "-c", script], cwd="../", capture_output=True, text=True, check=True).stdout.strip()=="None"
+    assert get_timeline() is get_timeline()
@@ -0,0 +1,21 @@
+# Changing path for imports
+import sys
+sys.path.append("../")
+
+from src.cache import PlaylistCache
+
+def test_cache(tmp_path):
+    cache = PlaylistCache(str(tmp_path / "cache.db"))
+    assert cache.load("abc") is None
+    tracks = [(f"song{i}", f"artist{i}", f"spotify:track:{i}") for i in range(250)]
+    cache.save("abc", "v1", tracks)
+    assert cache.load("abc")==("v1", tracks)
+    # Saving a new snapshot replaces the old one entirely
+    cache.save("abc", "v2", tracks[:10])
+    assert cache.load("abc")==("v2", tracks[:10])
+    assert cache.load("def") is None
+
+def test_damaged_cache(tmp_path):
+    with open(tmp_path / "cache.db", "w") as f:
+        f.write("not a database")
+    assert PlaylistCache(str(tmp_path / "cache.db")).load("abc") is None
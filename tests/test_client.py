@@ -0,0 +1,53 @@
+# Changing path for imports
+import sys
+import time
+import asyncio
+sys.path.append("../")
+
+from src import utils
+from src.client import SpotifyClient
+
+def fake_request(request_type, url, secrets_file, headers, data, timeout):
+    time.sleep(0.2)
+    return {"type": request_type, "url": url, "data": data, "timeout": timeout}
+
+def test_concurrent_requests(monkeypatch, config):
+    monkeypatch.setattr(utils, "request", fake_request)
+    client = SpotifyClient(max_concurrency=5)
+    async def main():
+        return await asyncio.gather(*[client.get_tracks("abc", offset=100*i) for i in range(5)])
+    start = time.perf_counter()
+    responses = asyncio.run(main())
+    # All five requests should have been in flight at once
+    assert time.perf_counter()-start < 0.5
+    assert [response["url"] for response in responses]==[utils.api_url(f"/playlists/abc/tracks?limit=100&offset={100*i}") for i in range(5)]
+    client.close()
+
+def test_timeout(monkeypatch, config):
+    monkeypatch.setattr(utils, "request", fake_request)
+    client = SpotifyClient(max_concurrency=1, timeout=0.3)
+    async def main():
+        return await asyncio.gather(*[client.pause() for _ in range(3)])
+    # The timeout is for each http attempt, so requests waiting for a worker don't time out
+    responses = asyncio.run(main())
+    assert [response["timeout"] for response in responses]==[0.3]*3
+    client.close()
+
+def test_cancel(monkeypatch, config):
+    urls = []
+    def recording_request(request_type, url, *args, **kwargs):
+        urls.append(url)
+        return fake_request(request_type, url, *args, **kwargs)
+    monkeypatch.setattr(utils, "request", recording_request)
+    client = SpotifyClient(max_concurrency=1)
+    async def main():
+        tasks = [asyncio.create_task(client.get_tracks("abc", offset=100*i)) for i in range(3)]
+        await asyncio.sleep(0.1)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.sleep(0.3)
+    asyncio.run(main())
+    # Only the request already being sent went through
+    assert urls==[utils.api_url("/playlists/abc/tracks?limit=100&offset=0")]
+    client.close()
@@ -0,0 +1,29 @@
+# Changing path for imports
+import sys
+import os
+sys.path.append("../")
+
+import subprocess
+from src.context import AppContext, get_context
+from src.credentials import CredentialStore
+from src.devices import DeviceRegistry
+
+def test_import_without_config(tmp_path):
+    # Nothing is read (or requested) until it's used, so the modules import from anywhere
+    root = os.path.abspath("../")
+    script = f"import sys; sys.path.insert(0, {root!r}); import src.utils, src.jukebox, src.context"
+    result = subprocess.run([sys.executable, "-c", script], cwd=tmp_path, capture_output=True, text=True, check=False)
+    assert result.returncode==0, result.stderr
+    # Until the config is actually needed
+    script += "; src.utils.PLAYLIST_ID"
+    result = subprocess.run([sys.executable, "-c", script], cwd=tmp_path, capture_output=True, text=True, check=False)
+    assert "FileNotFoundError" in result.stderr
+
+def test_context(config):
+    context = AppContext(secrets_file="fixtures/fake_secrets.json")
+    assert isinstance(context.credentials, CredentialStore)
+    assert context.credentials is context.credentials
+    assert isinstance(context.devices, DeviceRegistry)
+    # The config is read from utils.CONFIG_FILE when first used
+    assert context.config["client_id"]=="test"
+    assert get_context() is get_context()
@@ -0,0 +1,64 @@
+# Changing path for imports
+import sys
+import os
+sys.path.append("../")
+
+import json
+import time
+import threading
+from src.credentials import CredentialStore
+
+def load(filepath):
+    with open(filepath, encoding="utf-8") as f:
+        return json.load(f)
+
+def test_credential_store():
+    with open("fixtures/fake_secrets.json") as f:
+        fake_secrets = json.loads(f.read())
+    with open(".pyc", "w") as f:  # Writing to tmp file to protect fake_secrets.json
+        json.dump(fake_secrets, f)
+    reads = []
+    store = CredentialStore(".pyc", lambda filepath: reads.append(filepath) or load(filepath), check_interval=0)
+    assert store.get()==fake_secrets
+    assert store.get()==fake_secrets
+    assert len(reads)==1  # File only read once while unchanged
+    # Updates are visible immediately and reach the disk in the background
+    store.update(access_token="new_token")
+    assert store.get()["access_token"]=="new_token"
+    assert store.flush(timeout=5)
+    assert load(".pyc")["access_token"]=="new_token"
+    assert len(reads)==1  # Our own write doesn't trigger a re-read
+    # Changes made by something else are picked up via the mtime
+    with open(".pyc", "w") as f:
+        json.dump(dict(fake_secrets, access_token="external_token"), f)
+    os.utime(".pyc", ns=(0, 0))
+    assert store.get()["access_token"]=="external_token"
+    assert len(reads)==2
+
+def test_refresh():
+    with open("fixtures/fake_secrets.json") as f:
+        fake_secrets = json.loads(f.read())
+    with open(".pyc", "w") as f:  # Writing to tmp file to protect fake_secrets.json
+        json.dump(dict(fake_secrets, expires_at=int(time.time())+3600), f)
+    calls = []
+    def refresher(secrets):
+        calls.append(secrets["refresh_token"])
+        time.sleep(0.1)  # Gives the other threads time to pile up behind the refresh
+        return {"access_token": f"token{len(calls)}", "expires_in": 3600}
+    store = CredentialStore(".pyc", load, refresher=refresher)
+    stale_token = store.get()["access_token"]
+    # Several threads finding the same expired key should only cause one refresh
+    threads = [threading.Thread(target=store.refresh, args=(stale_token,)) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls==[fake_secrets["refresh_token"]]
+    secrets = store.get()
+    assert secrets["access_token"]=="token1"
+    assert secrets["expires_at"] > time.time() + 3000
+    # Expired keys are refreshed before being handed out
+    store.update(expires_at=int(time.time())-1)
+    assert store.get()["access_token"]=="token2"
+    store.stop()
+    assert store.flush(timeout=5)
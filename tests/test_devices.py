@@ -0,0 +1,72 @@
+# Changing path for imports
+import sys
+import os
+import pytest
+sys.path.append("../")
+
+import time
+from src.devices import DeviceRegistry, DeviceNotFoundError, choose_device
+
+def devices(*names):
+    return [{"id": f"{name}-id", "name": name} for name in names]
+
+def lister(*responses):
+    calls = []
+    def list_devices():
+        calls.append(time.monotonic())
+        response = responses[min(len(calls), len(responses))-1]
+        if isinstance(response, Exception):
+            raise response
+        return response
+    return list_devices, calls
+
+def test_choose_device():
+    available = devices("Kitchen", "Jukebox")
+    assert choose_device(available, ["Jukebox", "Kitchen"])["id"]=="Jukebox-id"
+    assert choose_device(available, ["Lounge", "Kitchen"])["id"]=="Kitchen-id"
+    assert choose_device(available, ["Lounge"]) is None
+    # Restricted devices are listed without an ID, and can't be played on
+    assert choose_device([{"id": None, "name": "Jukebox"}], ["Jukebox"]) is None
+
+def test_cached():
+    list_devices, calls = lister(devices("Jukebox"))
+    registry = DeviceRegistry(["Jukebox"], list_devices)
+    assert registry.get()=="Jukebox-id"
+    assert registry.get()=="Jukebox-id"
+    assert len(calls)==1
+
+def test_absent():
+    # Nothing found yet, so there is nothing to play on
+    list_devices, calls = lister([], devices("Jukebox"), [])
+    registry = DeviceRegistry(["Jukebox"], list_devices)
+    with pytest.raises(DeviceNotFoundError):
+        registry.get()
+    assert registry.get()=="Jukebox-id"
+    # The device going to sleep keeps the last known ID
+    assert registry.refresh()=="Jukebox-id"
+    assert len(calls)==3
+
+def test_fallback():
+    list_devices, _ = lister(devices("Kitchen"), devices("Kitchen", "Jukebox"))
+    registry = DeviceRegistry(["Jukebox", "Kitchen"], list_devices)
+    assert registry.get()=="Kitchen-id"
+    assert registry.refresh()=="Jukebox-id"
+    assert registry.device_name=="Jukebox"
+
+def test_stale_id():
+    list_devices, calls = lister(devices("Jukebox"), [{"id": "new-id", "name": "Jukebox"}])
+    registry = DeviceRegistry(["Jukebox"], list_devices)
+    assert registry.get()=="Jukebox-id"
+    assert registry.refresh(stale_id="Jukebox-id")=="new-id"
+    # Someone else already looked it up again
+    assert registry.refresh(stale_id="Jukebox-id")=="new-id"
+    assert len(calls)==2
+
+def test_watch():
+    list_devices, calls = lister(ConnectionAbortedError("no network"), devices("Jukebox"))
+    registry = DeviceRegistry(["Jukebox"], list_devices)
+    registry.watch(0.05)
+    time.sleep(0.2)
+    registry.stop_watching()
+    assert registry.device_id=="Jukebox-id"
+    assert len(calls) >= 2
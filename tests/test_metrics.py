@@ -0,0 +1,57 @@
+# Changing path for imports
+import sys
+import os
+import pytest
+sys.path.append("../")
+
+import requests
+from src.metrics import Histogram, RequestMetrics, endpoint, serve
+
+def test_endpoint():
+    assert endpoint("GET", "https://api.spotify.com/v1/playlists/abc/tracks?limit=100&offset=0")=="GET /v1/playlists/{id}/tracks"
+    assert endpoint("PUT", "https://api.spotify.com/v1/me/player/play?device_id=abc")=="PUT /v1/me/player/play"
+    assert endpoint("POST", "https://accounts.spotify.com/api/token")=="POST /api/token"
+
+def test_histogram():
+    histogram = Histogram(buckets=(0.1, 1))
+    assert histogram.percentile(50) is None
+    for value in (0.05, 0.1, 0.5, 0.5, 5):
+        histogram.observe(value)
+    assert histogram.counts==[2, 2, 1]
+    assert histogram.count==5
+    assert histogram.sum==pytest.approx(6.15)
+    assert histogram.percentile(40)==0.1
+    assert histogram.percentile(50)==1
+    assert histogram.percentile(99)==float("inf")
+
+def test_snapshot():
+    metrics = RequestMetrics()
+    metrics.observe("GET /v1/me/player/devices", 0.02, received=100)
+    metrics.observe("GET /v1/me/player/devices", 0.3, error="ReadTimeout")
+    metrics.count_retries(2)
+    metrics.count_token_refresh()
+    snapshot = metrics.snapshot()
+    assert snapshot["endpoints"]["GET /v1/me/player/devices"]=={"count": 2, "total_time": pytest.approx(0.32), "p50": 0.025, "p90": 0.5,
+                                                                "p99": 0.5, "bytes_sent": 0, "bytes_received": 100, "errors": {"ReadTimeout": 1}}
+    assert snapshot["retries"]==2
+    assert snapshot["token_refreshes"]==1
+
+def test_serve():
+    metrics = RequestMetrics()
+    metrics.observe('GET /v1/playlists/{id}', 0.02, sent=10, received=100, error="http 503")
+    server = serve(metrics, 0)
+    try:
+        response = requests.get(f"http://127.0.0.1:{server.server_address[1]}/metrics", timeout=5)
+        assert requests.get(f"http://127.0.0.1:{server.server_address[1]}/other", timeout=5).status_code==404
+    finally:
+        server.shutdown()
+    assert response.headers["Content-Type"].startswith("text/plain")
+    lines = response.text.splitlines()
+    assert 'jukebox_request_duration_seconds_bucket{endpoint="GET /v1/playlists/{id}",le="0.01"} 0' in lines
+    assert 'jukebox_request_duration_seconds_bucket{endpoint="GET /v1/playlists/{id}",le="0.025"} 1' in lines
+    assert 'jukebox_request_duration_seconds_bucket{endpoint="GET /v1/playlists/{id}",le="+Inf"} 1' in lines
+    assert 'jukebox_request_duration_seconds_count{endpoint="GET /v1/playlists/{id}"} 1' in lines
+    assert 'jukebox_request_sent_bytes_total{endpoint="GET /v1/playlists/{id}"} 10' in lines
+    assert 'jukebox_request_received_bytes_total{endpoint="GET /v1/playlists/{id}"} 100' in lines
+    assert 'jukebox_request_errors_total{endpoint="GET /v1/playlists/{id}",error="http 503"} 1' in lines
+    assert "jukebox_request_retries_total 0" in lines
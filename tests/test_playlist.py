@@ -0,0 +1,126 @@
+# Changing path for imports
+import sys
+import json
+import asyncio
+sys.path.append("../")
+
+from src import utils
+from src.cache import PlaylistCache
+from src.client import SpotifyClient
+from src.playlist import Playlist, TRACKS_PER_REQUEST, TRACK_FIELDS
+from src.scheduler import RequestScheduler
+from fake_spotify import FakeSpotify
+
+def fake_items(offset, limit, total):
+    return [{"track": {"name": f"song{i}", "artists": [{"name": f"artist{i}"}], "uri": f"spotify:track:{i}"}} for i in range(offset, min(offset+limit, total))]
+
+class FakeClient:
+    """Stands in for SpotifyClient, serving a playlist of a given length.
+    """
+    max_concurrency = 4
+
+    def __init__(self, total):
+        self.total = total
+        self.snapshot_id = "v1"
+        self.requests = []
+        self.in_flight = 0
+        self.most_in_flight = 0
+
+    async def get_playlist(self, playlist_id, fields=None):
+        self.requests.append(fields)
+        return {"snapshot_id": self.snapshot_id}
+
+    async def get_tracks(self, playlist_id, offset=0, limit=100, fields=None):
+        self.requests.append((offset, limit, fields))
+        self.in_flight += 1
+        self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        await asyncio.sleep(0.001)
+        self.in_flight -= 1
+        return {"total": self.total, "items": fake_items(offset, limit, self.total)}
+
+def test_load():
+    client = FakeClient(1000)
+    playlist = Playlist("abc", client=client)
+    playlist.load()
+    # Whole playlist downloaded in pages of the API maximum
+    track_requests = [request for request in client.requests if request!="snapshot_id"]
+    assert len(track_requests)==1000//TRACKS_PER_REQUEST
+    assert all(limit==TRACKS_PER_REQUEST for _,limit,_ in track_requests)
+    # Only the fields the jukebox uses are requested
+    assert all(fields==TRACK_FIELDS for _,_,fields in track_requests)
+    assert len(playlist.tracks)==1000
+    assert playlist.tracks[999]==("song999", "artist999", "spotify:track:999")
+    # Pages are slices of the snapshot
+    assert playlist.num_pages(7)==143
+    assert playlist.page(1, 7)==playlist.tracks[7:14]
+    assert len(playlist.page(142, 7))==6
+    # The snapshot_id is fetched before any tracks, and no more pages are requested at once than the client has workers
+    assert client.requests[0]=="snapshot_id"
+    assert client.most_in_flight==client.max_concurrency
+
+def test_load_rate_limited(tmp_path, config):
+    # Many more pages than the rate limit lets through at once: those held back mustn't time out waiting
+    with open("fixtures/fake_secrets.json") as f:
+        secrets = json.load(f)
+    secrets_file = str(tmp_path / "secrets.json")
+    with open(secrets_file, "w") as f:
+        json.dump(secrets, f)
+    api_url, accounts_url = utils.API_URL, utils.ACCOUNTS_URL
+    utils.scheduler = RequestScheduler(rate=100, burst=20)
+    client = SpotifyClient(secrets_file=secrets_file, max_concurrency=4, timeout=0.5)
+    try:
+        with FakeSpotify(playlists={"big": 12345}, latency=0.005) as spotify:
+            utils.set_base_urls(spotify.api_url, spotify.url)
+            playlist = Playlist("big", client=client)
+            playlist.load()
+    finally:
+        utils.set_base_urls(api_url, accounts_url)
+        utils.scheduler = None
+        client.close()
+    assert len(playlist.tracks)==12345
+    assert playlist.snapshot_id=="big-0"
+    assert sum(path.startswith("/v1/playlists/big/tracks") for _, _, path in spotify.requests)==124
+
+class GappyClient(FakeClient):
+    """Serves a playlist whose second track has been removed from spotify.
+    """
+    async def get_tracks(self, playlist_id, offset=0, limit=100, fields=None):
+        response = await super().get_tracks(playlist_id, offset, limit, fields)
+        response["items"][1]["track"] = None
+        return response
+
+def test_missing_tracks():
+    playlist = Playlist("abc", client=GappyClient(3))
+    playlist.load()
+    assert [title for title,_,_ in playlist.tracks]==["song0", "song2"]
+
+def test_refresh():
+    client = FakeClient(250)
+    playlist = Playlist("abc", client=client)
+    assert playlist.refresh()  # First refresh downloads the playlist
+    assert playlist.snapshot_id=="v1"
+    # Unchanged playlist only needs the snapshot_id to be checked
+    client.requests.clear()
+    assert not playlist.refresh()
+    assert client.requests==["snapshot_id"]
+    # Changed playlist is downloaded again
+    client.snapshot_id = "v2"
+    client.total = 300
+    assert playlist.refresh()
+    assert playlist.snapshot_id=="v2"
+    assert len(playlist.tracks)==300
+
+def test_cached(tmp_path):
+    cache = PlaylistCache(str(tmp_path / "cache.db"))
+    client = FakeClient(250)
+    Playlist("abc", client=client, cache=cache).load()
+    # A new playlist object (e.g after a reboot) is usable straight from the cache
+    client.requests.clear()
+    playlist = Playlist("abc", client=client, cache=cache)
+    assert playlist.load_cached()
+    assert client.requests==[]
+    assert playlist.snapshot_id=="v1"
+    assert playlist.page(0, 7)==[(f"song{i}", f"artist{i}", f"spotify:track:{i}") for i in range(7)]
+    # Checking it against the API only needs the snapshot_id if nothing has changed
+    assert not playlist.refresh()
+    assert client.requests==["snapshot_id"]
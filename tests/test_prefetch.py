@@ -0,0 +1,62 @@
+# Changing path for imports
+import sys
+import time
+sys.path.append("../")
+
+from src.prefetch import PageCache, Prefetcher
+
+class FakePlaylist:
+    """Stands in for Playlist before its snapshot has been downloaded, recording which pages are fetched.
+    """
+    def __init__(self, total):
+        self.total = total
+        self.loaded = False
+        self.snapshot_id = None
+        self.fetched = []
+
+    def num_pages(self, songs_per_page):
+        return -(-self.total//songs_per_page)
+
+    def fetch_page(self, page_num, songs_per_page):
+        self.fetched.append(page_num)
+        return [f"song{i}" for i in range(page_num*songs_per_page, min((page_num+1)*songs_per_page, self.total))]
+
+    def page(self, page_num, songs_per_page):
+        return [f"song{i}" for i in range(page_num*songs_per_page, min((page_num+1)*songs_per_page, self.total))]
+
+def wait_for_prefetch(prefetcher):
+    while prefetcher.in_flight:
+        time.sleep(0.01)
+
+def test_page_cache():
+    cache = PageCache(2)
+    cache.put(0, ["a"])
+    cache.put(1, ["b"])
+    assert cache.get(0)==["a"]  # Makes page 1 the least recently used
+    cache.put(2, ["c"])
+    assert cache.get(1) is None
+    assert cache.get(0)==["a"] and cache.get(2)==["c"]
+    # Pages from an older snapshot are stale
+    cache.put(3, ["d"], snapshot_id="v1")
+    assert cache.get(3, snapshot_id="v2") is None
+    # As are pages older than max_age
+    cache = PageCache(2, max_age=0)
+    cache.put(0, ["a"])
+    assert cache.get(0) is None
+
+def test_prefetch():
+    playlist = FakePlaylist(70)
+    prefetcher = Prefetcher(playlist, 7, radius=1, cache=PageCache(8))
+    assert prefetcher.get(0)==[f"song{i}" for i in range(7)]
+    wait_for_prefetch(prefetcher)
+    # Neighbours (wrapping around) are fetched in the background
+    assert sorted(playlist.fetched)==[0, 1, 9]
+    playlist.fetched.clear()
+    assert prefetcher.get(1)==[f"song{i}" for i in range(7, 14)]
+    wait_for_prefetch(prefetcher)
+    assert playlist.fetched==[2]  # Page 1 was already cached
+    # Once the whole playlist is loaded, pages come straight from it
+    playlist.loaded = True
+    playlist.fetched.clear()
+    assert prefetcher.get(5)==[f"song{i}" for i in range(35, 42)]
+    assert playlist.fetched==[]
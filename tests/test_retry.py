@@ -0,0 +1,66 @@
+# Changing path for imports
+import sys
+import os
+import pytest
+sys.path.append("../")
+
+import time
+import requests
+from src.retry import RetryPolicy, backoff, error_status, is_transient
+
+def failing(*errors, result="done"):
+    calls = []
+    def fn():
+        calls.append(time.monotonic())
+        if len(calls) <= len(errors):
+            raise errors[len(calls)-1]
+        return result
+    return fn, calls
+
+def test_retry():
+    policy = RetryPolicy(max_attempts=3, base_delay=0.01)
+    fn, calls = failing(requests.exceptions.ConnectionError(), requests.exceptions.ReadTimeout())
+    assert policy.call(fn)=="done"
+    assert len(calls)==3
+    # Gives up after max_attempts, with the last error
+    fn, calls = failing(*[requests.exceptions.ConnectionError("no wifi")]*5)
+    with pytest.raises(requests.exceptions.ConnectionError, match="no wifi"):
+        policy.call(fn)
+    assert len(calls)==3
+    # Only retryable errors are retried
+    fn, calls = failing(ConnectionAbortedError({"error": {"status": 403, "message": "Forbidden"}}))
+    with pytest.raises(ConnectionAbortedError):
+        policy.call(fn)
+    assert len(calls)==1
+
+def test_deadline():
+    policy = RetryPolicy(max_attempts=100, deadline=0.3, base_delay=0.1, max_delay=0.1)
+    fn, calls = failing(*[TimeoutError()]*100)
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        policy.call(fn)
+    assert time.monotonic() - start <= 0.3
+    assert 2 <= len(calls) < 10
+
+def test_on_retry():
+    not_found = ConnectionAbortedError({"error": {"status": 404, "message": "Device not found"}})
+    policy = RetryPolicy(base_delay=0.01, retryable=lambda e: error_status(e)==404)
+    fn, calls = failing(not_found)
+    retried = []
+    assert policy.call(fn, on_retry=retried.append)=="done"
+    assert retried==[not_found]
+
+def test_error_status():
+    assert error_status(ConnectionAbortedError({"error": {"status": 404, "message": "Not found."}}))==404
+    assert error_status(ConnectionAbortedError("something else")) is None
+    assert error_status(ValueError({"error": {"status": 404}})) is None
+    assert is_transient(requests.exceptions.ConnectTimeout())
+    assert not is_transient(ConnectionAbortedError())
+
+def test_delay():
+    policy = RetryPolicy(base_delay=1, max_delay=4)
+    for attempt, limit in ((1, 1), (2, 2), (3, 4), (10, 4)):
+        assert limit/2 <= policy.delay(attempt) <= limit
+    # The same delays as the request scheduler and the interface use, counted by retries made rather than failed attempts
+    for retries, limit in ((0, 0.5), (1, 1), (2, 2), (6, 5)):
+        assert limit/2 <= backoff(retries, 0.5, 5) <= limit
@@ -0,0 +1,79 @@
+# Changing path for imports
+import sys
+import os
+import pytest
+sys.path.append("../")
+
+import time
+from src.scheduler import TokenBucket, RetryBudget, RequestScheduler, RateLimitedError
+
+class FakeResponse:
+    def __init__(self, status_code, retry_after=None):
+        self.status_code = status_code
+        self.headers = {"Retry-After": str(retry_after)} if retry_after is not None else {}
+
+    def json(self):
+        return {"error": {"status": self.status_code, "message": "fake error"}}
+
+def responses(*status_codes, retry_after=None):
+    sent = []
+    def send():
+        sent.append(time.monotonic())
+        return FakeResponse(status_codes[min(len(sent), len(status_codes))-1], retry_after)
+    return send, sent
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=20, capacity=5)
+    start = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    assert time.monotonic() - start < 0.05  # Burst goes straight through
+    for _ in range(4):
+        bucket.acquire()
+    assert time.monotonic() - start >= 0.15  # Then limited to 20 per second
+
+def test_retry_budget():
+    budget = RetryBudget(ratio=0.5, capacity=2)
+    assert budget.withdraw()
+    assert budget.withdraw()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
+
+def test_retry():
+    scheduler = RequestScheduler(base_delay=0.01)
+    send, sent = responses(503, 502, 200)
+    assert scheduler.send(send).status_code==200
+    assert len(sent)==3
+    # Gives up after max_retries, returning the error
+    send, sent = responses(503)
+    assert scheduler.send(send).status_code==503
+    assert len(sent)==scheduler.max_retries+1
+    # Other errors aren't retried
+    send, sent = responses(404)
+    assert scheduler.send(send).status_code==404
+    assert len(sent)==1
+
+def test_retry_budget_limits_retries():
+    scheduler = RequestScheduler(base_delay=0.01, budget=RetryBudget(ratio=0, capacity=2))
+    send, sent = responses(503)
+    assert scheduler.send(send).status_code==503
+    assert len(sent)==3  # Only 2 retries in the budget
+
+def test_retry_after():
+    scheduler = RequestScheduler(base_delay=0.01)
+    send, sent = responses(429, 200, retry_after=0.3)
+    assert scheduler.send(send).status_code==200
+    assert sent[1] - sent[0] >= 0.3
+    # Too long to wait, so gives up straight away, holding back every request until then
+    send, sent = responses(429, retry_after=60)
+    with pytest.raises(RateLimitedError) as error:
+        scheduler.send(send)
+    assert error.value.retry_after==60
+    assert len(sent)==1
+    send, sent = responses(200)
+    with pytest.raises(RateLimitedError):
+        scheduler.send(send)
+    assert not sent
@@ -0,0 +1,120 @@
+# Changing path for imports
+import sys
+sys.path.append("../")
+
+from src import playlist
+from src.search import SearchIndex, fold, tokenise, get_index, EXACT, PREFIX, IN_TITLE, FIRST_WORD
+from src.tracks import TrackTable
+
+TRACKS = [("Love Story", "Taylor Swift", "spotify:track:0"),
+          ("Halo", "Beyoncé", "spotify:track:1"),
+          ("Don't Stop Me Now", "Queen", "spotify:track:2"),
+          ("Crazy In Love", "Beyoncé", "spotify:track:3"),
+          ("Lovely", "Billie Eilish", "spotify:track:4"),
+          ("Story of My Life", "One Direction", "spotify:track:5"),
+          ("Bohemian Rhapsody", "Queen", "spotify:track:6"),
+          ("Loving Love", "The Lovers", "spotify:track:7")]
+
+def titles(matches):
+    return [match.title for match in matches]
+
+def test_fold():
+    assert fold("Beyoncé")=="beyonce"
+    assert fold("DON’T Stop")=="dont stop"
+    assert fold("Straße")=="strasse"
+    assert tokenise("Sigur Rós – Hoppípolla 🎵")==["sigur", "ros", "hoppipolla"]
+    assert tokenise("Don't Stop Me Now")==["dont", "stop", "me", "now"]
+
+def test_search():
+    index = SearchIndex(TRACKS)
+    assert len(index)==8
+    # Accents and apostrophes don't matter
+    assert titles(index.search("beyonce halo"))==["Halo"]
+    assert titles(index.search("DONT"))==["Don't Stop Me Now"]
+    # Words are matched by prefix, and every word must match
+    assert titles(index.search("lov sto"))==["Love Story"]
+    assert titles(index.search("queen bo"))==["Bohemian Rhapsody"]
+    assert index.search("love zebra")==[]
+    assert index.search("")==[]
+    # A single letter only matches whole words
+    assert index.search("l")==[]
+    # Exact words first, then titles before artists, first words before later ones, then by position
+    assert titles(index.search("love"))==["Love Story", "Crazy In Love", "Loving Love", "Lovely"]
+    assert [match.score for match in index.search("love")]==[EXACT + IN_TITLE + FIRST_WORD, EXACT + IN_TITLE, EXACT + IN_TITLE,
+                                                             PREFIX + IN_TITLE + FIRST_WORD]
+    assert titles(index.search("lo"))[:2]==["Love Story", "Lovely"]
+    assert titles(index.search("story"))==["Story of My Life", "Love Story"]
+    assert titles(index.search("love", limit=2))==["Love Story", "Crazy In Love"]
+    # Several words add up
+    assert titles(index.search("lov lov"))==titles(index.search("lov"))
+    assert titles(index.search("love lovers"))==["Loving Love"]
+    assert [match.score for match in index.search("queen now")]==[EXACT + EXACT + IN_TITLE + FIRST_WORD]
+
+def test_number():
+    index = SearchIndex(TRACKS)
+    # Songs are numbered through the whole playlist, from 1
+    matches = index.search("5")
+    assert titles(matches)==["Lovely"]
+    assert matches[0].position==4
+    assert matches[0].number(3)==(2, 2)
+    assert matches[0].number(5)==(1, 5)
+    assert index.search("9")==[]
+    assert titles(index.search(" 2 "))==["Halo"]
+    # Digits that aren't decimal numbers are searched for as words
+    assert index.search("²")==[]
+    assert index.lookup(0) is None
+    assert index.lookup(8).title=="Loving Love"
+
+def test_update():
+    index = SearchIndex(TRACKS[:4])
+    assert index.update(TRACKS[:4])==0
+    # Tracks added to the end are just added to the index
+    assert index.update(TRACKS)==4
+    assert titles(index.search("love"))==["Love Story", "Crazy In Love", "Loving Love", "Lovely"]
+    # Tracks removed and moved: the index is rebuilt
+    tracks = [TRACKS[7], TRACKS[0], TRACKS[4], ("Love Me Do", "The Beatles", "spotify:track:8")]
+    assert index.update(tracks)==4
+    assert titles(index.search("love"))==["Love Story", "Love Me Do", "Loving Love", "Lovely"]
+    assert index.search("beyonce")==[]
+    assert index.search("love")[1].position==3
+    assert titles(index.search("beatl do"))==["Love Me Do"]
+    # The same snapshot isn't gone through again
+    table = TrackTable(TRACKS)
+    index.update(table)
+    assert index.update(table)==0
+    assert titles(index.search("4"))==["Crazy In Love"]
+
+def test_duplicates():
+    tracks = TRACKS[:2] + [TRACKS[0]]
+    index = SearchIndex(tracks)
+    assert [match.position for match in index.search("love story")]==[0, 2]
+    # Only the copy that was removed is dropped
+    index.update(TRACKS[1:2] + [TRACKS[0]])
+    assert [match.position for match in index.search("love story")]==[1]
+
+def test_many_tracks():
+    tracks = [(f"Song {i} {'Love' if i%3 else 'Hate'}", f"Band {i%7}", f"spotify:track:{i}") for i in range(3000)]
+    index = SearchIndex(tracks[:2000])
+    assert [match.position for match in index.search("band love", limit=3)]==[1, 2, 4]
+    assert [match.position for match in index.search("hate band 6")]==[6, 27, 48, 69, 90, 111, 132, 153, 174, 195]
+    assert id(index.postings["song"][IN_TITLE + FIRST_WORD]) in index.bitsets  # Kept for common words, and extended below
+    assert index.update(tracks)==1000
+    positions = [match.position for match in index.search("hat ban 6", limit=200)]
+    assert len(positions)==143 and positions[-1]==2988
+    assert len(index.search("song love", limit=3000))==2000
+
+class FakePlaylist:
+    loaded = True
+
+    def __init__(self, tracks):
+        self.tracks = TrackTable(tracks)
+
+def test_get_index():
+    playlist.playlists["search"] = FakePlaylist(TRACKS[:3])
+    index = get_index("search")
+    assert len(index)==3
+    # The same index, updated when the snapshot changes
+    playlist.playlists["search"].tracks = TrackTable(TRACKS)
+    assert get_index("search") is index
+    assert len(index)==8
+    del playlist.playlists["search"]
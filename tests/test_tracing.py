@@ -0,0 +1,55 @@
+# Changing path for imports
+import sys
+import os
+import pytest
+sys.path.append("../")
+
+import json
+import time
+import threading
+from src.tracing import Tracer, run_traced
+
+def test_trace():
+    tracer = Tracer()
+    trace = tracer.start("press", "gpio callback")
+    time.sleep(0.01)
+    thread = threading.Thread(target=trace.mark, args=("gui thread",), name="gui")
+    thread.start()
+    thread.join()
+    assert not tracer.recent()  # Only finished traces are kept
+    trace.finish("played")
+    trace.finish("failed")  # Already finished
+    traces = tracer.recent()
+    assert len(traces)==1
+    assert traces[0]["outcome"]=="played"
+    assert [stage["stage"] for stage in traces[0]["stages"]]==["gpio callback", "gui thread", "finished"]
+    assert traces[0]["stages"][0]["at"]==0
+    assert traces[0]["stages"][1]["at"] >= 10
+    assert traces[0]["stages"][1]["thread"]=="gui"
+    assert traces[0]["duration"]==traces[0]["stages"][-1]["at"]
+
+def test_ring_buffer():
+    tracer = Tracer(size=3)
+    for _ in range(5):
+        tracer.start("press", "gpio callback").finish("digit")
+    assert [trace["id"] for trace in tracer.recent()]==[3, 4, 5]
+
+def test_dump(tmp_path):
+    tracer = Tracer()
+    tracer.start("click", "button_click").finish("digit")
+    tracer.start("click", "button_click").finish("page shown")
+    assert tracer.dump(tmp_path/"traces.jsonl")==2
+    with open(tmp_path/"traces.jsonl", encoding="utf-8") as f:
+        assert [json.loads(line)["outcome"] for line in f]==["digit", "page shown"]
+
+def refused():
+    raise ConnectionAbortedError({"error": {"status": 404, "message": "Device not found"}})
+
+def test_run_traced():
+    tracer = Tracer()
+    assert run_traced(tracer.start("press", "gpio callback"), "paused", lambda: "done")=="done"
+    with pytest.raises(ConnectionAbortedError):
+        run_traced(tracer.start("press", "gpio callback"), "paused", refused)
+    traces = tracer.recent()
+    assert [trace["outcome"] for trace in traces]==["paused", "failed"]
+    assert [stage["stage"] for stage in traces[0]["stages"]]==["gpio callback", "worker started", "finished"]
@@ -0,0 +1,28 @@
+# Changing path for imports
+import sys
+import pytest
+sys.path.append("../")
+
+from src.tracks import TrackTable
+
+def test_track_table():
+    tracks = [(f"song{i}", f"artist{i%3}", f"spotify:track:{i}") for i in range(10)]
+    tracks.append(("Sigur Rós – Hoppípolla 🎵", "Sigur Rós", "spotify:track:unicode"))
+    table = TrackTable(tracks)
+    assert len(table)==11
+    assert list(table)==tracks
+    assert table[3]==tracks[3]
+    assert table[-1]==tracks[-1]
+    assert table[2:9]==tracks[2:9]
+    assert table[7:100]==tracks[7:]
+    # Repeated artists are only stored once
+    assert len(table.artists.values)==4
+    with pytest.raises(IndexError):
+        table[11]
+    assert len(TrackTable())==0
+    # Snapshots with tracks added to the end start with the earlier snapshot
+    assert TrackTable(tracks).uris.startswith(TrackTable(tracks[:4]).uris)
+    assert TrackTable(tracks).uris.startswith(TrackTable().uris)
+    assert not TrackTable(tracks[:4]).uris.startswith(TrackTable(tracks).uris)
+    assert not TrackTable(tracks[1:]).uris.startswith(TrackTable(tracks[:4]).uris)
+    assert not TrackTable(tracks[:2] + [("x", "y", "spotify:track:2x")]).uris.startswith(TrackTable(tracks[:3]).uris)
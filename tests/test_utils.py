@@ -5,7 +5,23 @@ import pytest
 sys.path.append("../")
 
 import json
+import requests
 from src import utils
+from src.scheduler import RateLimitedError
+from src.metrics import RequestMetrics
+from fake_spotify import FakeSpotify, NOT_FOUND, RATE_LIMITED, TIMEOUT, UNAVAILABLE
+
+@pytest.fixture
+def spotify(config):
+    """Points every request at a local fake of the web API for the length of a test.
+    """
+    api_url, accounts_url = utils.API_URL, utils.ACCOUNTS_URL
+    utils.scheduler = None  # Fresh rate limits
+    with FakeSpotify(playlists={"abc": 250}) as fake:
+        utils.set_base_urls(fake.api_url, fake.url)
+        yield fake
+    utils.set_base_urls(api_url, accounts_url)
+    utils.scheduler = None
 
 def test_get_secrets():
     with open("fixtures/fake_secrets.json") as f:
@@ -20,19 +36,106 @@ def test_get_secrets():
         json.dump(fake_secrets_refreshless, f)
     assert utils.get_secrets(".pyc")
 
-def test_request():
+def test_request(spotify):
     with open("fixtures/fake_secrets.json") as f:  # Includes OUTDATED KEY
         fake_secrets = json.loads(f.read())
     with open(".pyc", "w") as f:  # Writing to tmp file to protect fake_secrets.json
         json.dump(fake_secrets, f)
-    response = utils.request("GET", "https://api.spotify.com/v1/users/gsi6dp1hadnzqy5i3nv15rq37", secrets_file=".pyc")
-    expected_response ={"display_name": "JodbyBerundi","external_urls": {"spotify": "https://open.spotify.com/user/gsi6dp1hadnzqy5i3nv15rq37"},"followers": {"href": None,"total": 1},"href": "https://api.spotify.com/v1/users/gsi6dp1hadnzqy5i3nv15rq37","id": "gsi6dp1hadnzqy5i3nv15rq37","images": [],"type": "user","uri": "spotify:user:gsi6dp1hadnzqy5i3nv15rq37"}
-    assert response==expected_response
-    # Check a new key was definitely generated
+    spotify.expire(fake_secrets["access_token"])
+    response = utils.request("GET", utils.api_url("/me/player/devices"), secrets_file=".pyc")
+    assert response=={"devices": spotify.devices}
+    # A new key is fetched either before the request or once it's rejected
+    requests_made = [request[1:] for request in spotify.requests]
+    assert requests_made.count(("POST", "/api/token"))==1
+    assert requests_made[-1]==("GET", "/v1/me/player/devices")
+    # Check a new key was definitely generated (and written to disk in the background)
+    assert utils.get_credentials(".pyc").flush(timeout=5)
     with open(".pyc", "r") as f:  # Writing to tmp file to protect fake_secrets.json
         new_secrets = json.loads(f.read())
     assert fake_secrets["access_token"] != new_secrets["access_token"]
+    # A key expiring before it was expected to is replaced when it's rejected
+    spotify.expire(new_secrets["access_token"])
+    assert utils.request("GET", utils.api_url("/me/player/devices"), secrets_file=".pyc")=={"devices": spotify.devices}
+    assert [request[1:] for request in spotify.requests][-3:]==[("GET", "/v1/me/player/devices"), ("POST", "/api/token"), ("GET", "/v1/me/player/devices")]
     # Checking type error
     with pytest.raises(ValueError, match="invalid request type."):
-        assert utils.request("NOT_GET", "https://api.spotify.com/v1/artists/0TnOYISbd1XYRBk9myaseg", secrets_file=".pyc")
+        assert utils.request("NOT_GET", utils.api_url("/me/player/devices"), secrets_file=".pyc")
+
+def test_request_errors(spotify):
+    with open("fixtures/fake_secrets.json") as f:
+        fake_secrets = json.loads(f.read())
+    with open(".pyc", "w") as f:  # Writing to tmp file to protect fake_secrets.json
+        json.dump(fake_secrets, f)
+    # Only the failing requests fail
+    spotify.fail(NOT_FOUND, path="/v1/me/player/play")
+    with pytest.raises(ConnectionAbortedError, match="Device not found"):
+        utils.request("PUT", utils.api_url("/me/player/play?device_id=device0"), secrets_file=".pyc")
+    assert utils.request("PUT", utils.api_url("/me/player/play?device_id=device0"), secrets_file=".pyc")==""
+    # Rate limits are waited out if they're short
+    spotify.fail(RATE_LIMITED, retry_after=1)
+    assert utils.request("GET", utils.api_url("/playlists/abc?fields=snapshot_id"), secrets_file=".pyc")=={"snapshot_id": "abc-0"}
+    received = [request[0] for request in spotify.requests[-2:]]
+    assert received[1] - received[0] >= 1
+    # Otherwise the request fails, and so do others until the rate limit is over (without being sent)
+    spotify.fail(RATE_LIMITED, retry_after=60)
+    with pytest.raises(RateLimitedError, match="API rate limit exceeded"):
+        utils.request("GET", utils.api_url("/playlists/abc?fields=snapshot_id"), secrets_file=".pyc")
+    num_requests = len(spotify.requests)
+    with pytest.raises(RateLimitedError):
+        utils.request("GET", utils.api_url("/playlists/abc?fields=snapshot_id"), secrets_file=".pyc")
+    assert len(spotify.requests)==num_requests
+    utils.scheduler = None
+    spotify.fail(TIMEOUT, delay=2)
+    with pytest.raises(requests.exceptions.Timeout):
+        utils.request("GET", utils.api_url("/playlists/abc?fields=tracks.total"), secrets_file=".pyc", timeout=0.5)
+    assert utils.request("GET", utils.api_url("/playlists/abc?fields=tracks.total"), secrets_file=".pyc")=={"tracks": {"total": 250}}
+
+def test_request_metrics(spotify, monkeypatch):
+    metrics = RequestMetrics()
+    monkeypatch.setattr(utils, "get_metrics", lambda: metrics)
+    with open("fixtures/fake_secrets.json") as f:
+        fake_secrets = json.loads(f.read())
+    with open(".pyc", "w") as f:  # Writing to tmp file to protect fake_secrets.json
+        json.dump(fake_secrets, f)
+    spotify.fail(UNAVAILABLE, path="/v1/playlists")
+    utils.request("GET", utils.api_url("/playlists/abc?fields=snapshot_id"), secrets_file=".pyc")
+    spotify.fail(NOT_FOUND, path="/v1/me/player/play")
+    with pytest.raises(ConnectionAbortedError):
+        utils.request("PUT", utils.api_url("/me/player/play?device_id=device0"), secrets_file=".pyc", data='{"uris": []}')
+    spotify.expire(utils.get_credentials(".pyc").get()["access_token"])
+    utils.request("GET", utils.api_url("/playlists/abc?fields=snapshot_id"), secrets_file=".pyc")
+    snapshot = metrics.snapshot()
+    playlist = snapshot["endpoints"]["GET /v1/playlists/{id}"]
+    assert playlist["count"]==len([request for request in spotify.requests if request[2].startswith("/v1/playlists/abc")])
+    assert playlist["errors"]=={"http 503": 1, "http 401": 1}  # Retried, then refreshed the expired key
+    assert playlist["bytes_received"] > 0
+    play = snapshot["endpoints"]["PUT /v1/me/player/play"]
+    assert play["errors"]=={"http 404": 1}
+    assert play["bytes_sent"]==len('{"uris": []}')
+    assert snapshot["retries"]==1
+    assert snapshot["token_refreshes"] >= 1
+    assert snapshot["endpoints"]["POST /api/token"]["count"]==snapshot["token_refreshes"]
+
+def test_get_session(config):
+    session = utils.get_session("https://api.spotify.com/v1/me/player/devices")
+    # Same host should always reuse the same pooled session
+    assert utils.get_session("https://api.spotify.com/v1/playlists/abc") is session
+    assert utils.get_session("https://accounts.spotify.com/api/token") is not session
+    utils.close_sessions()
+    assert utils.get_session("https://api.spotify.com/v1/me") is not session
 
+def test_settings(tmp_path, config):
+    config_file = tmp_path/"config.yaml"
+    config_file.write_text("client_id: abc\nclient_secret: def\nplaylist_id: pl1\nplaylist_check_interval: 0\n")
+    settings = utils.read_settings(utils.load_config(config_file))
+    assert settings["PLAYLIST_ID"]=="pl1"
+    assert settings["PLAYLIST_CHECK_INTERVAL"]==0  # 0 is kept, missing settings get defaults
+    assert settings["DEVICE_CHECK_INTERVAL"]==300
+    assert settings["FALLBACK_DEVICES"]==[]
+    config_file.write_text("client_id: abc\n")
+    with pytest.raises(KeyError, match="client secret"):
+        utils.load_config(config_file)
+    # Settings are read through the module, from config.yaml
+    assert utils.PLAYLIST_ID==utils.get_config()["playlist_id"]
+    with pytest.raises(AttributeError):
+        utils.NOT_A_SETTING